@@ -17,6 +17,39 @@ class Settings:
     # Token fixo para Custom GPT / Actions (Bearer ou X-Api-Key)
     GPT_API_TOKEN: str | None = os.getenv("GPT_API_TOKEN") or None
 
+    # Cache em disco dos arquivos exportados (xlsx/csv)
+    EXPORT_CACHE_DIR: str = os.getenv("EXPORT_CACHE_DIR", "cache/exports")
+
+    # Jobs de exportação em segundo plano
+    EXPORT_JOBS_DIR: str = os.getenv("EXPORT_JOBS_DIR", "cache/jobs")
+    EXPORT_JOB_WORKERS: int = int(os.getenv("EXPORT_JOB_WORKERS", "2"))
+    EXPORT_JOB_MAX_PENDING: int = int(os.getenv("EXPORT_JOB_MAX_PENDING", "20"))
+    EXPORT_JOB_TTL_MINUTES: int = int(os.getenv("EXPORT_JOB_TTL_MINUTES", "60"))
+
+    # Compressão de respostas (gzip/brotli/zstd)
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1000"))
+    COMPRESSION_CACHE_MB: int = int(os.getenv("COMPRESSION_CACHE_MB", "64"))
+
+    # ETag / GET condicional: por quantos segundos o watermark de uma tabela é reaproveitado
+    HTTP_CACHE_WATERMARK_TTL: float = float(os.getenv("HTTP_CACHE_WATERMARK_TTL", "5"))
+    HTTP_CACHE_FOLLOWED_TTL: float = float(os.getenv("HTTP_CACHE_FOLLOWED_TTL", "600"))  # tabelas do monitor
+
+    # Monitor de alterações das tabelas (invalida caches por tabela)
+    CHANGE_POLLER_ENABLED: bool = os.getenv("CHANGE_POLLER_ENABLED", "true").lower() == "true"
+    CHANGE_POLLER_INTERVAL_SECONDS: float = float(os.getenv("CHANGE_POLLER_INTERVAL_SECONDS", "60"))
+    # Tabelas cujo watermark do ETag / exportações passa a ser invalidado por eventos
+    CHANGE_POLLER_TABLES: str = os.getenv("CHANGE_POLLER_TABLES", "SG1010,SB1010")
+
+    # Logs (JSON, rotação diária, escrita em thread própria)
+    LOG_DIR: str = os.getenv("LOG_DIR", "logs")
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_BACKUP_DAYS: int = int(os.getenv("LOG_BACKUP_DAYS", "30"))
+
+    # Instrumentação das consultas (BaseRepository)
+    SLOW_QUERY_MS: float = float(os.getenv("SLOW_QUERY_MS", "1000"))
+    QUERY_STATS_WINDOW: int = int(os.getenv("QUERY_STATS_WINDOW", "200"))  # últimas execuções por consulta
+    QUERY_STATS_MAX_FINGERPRINTS: int = int(os.getenv("QUERY_STATS_MAX_FINGERPRINTS", "500"))
+
     # Configurações de execução do agente GPT
     AUTO_EXECUTE_API: bool = os.getenv("AUTO_EXECUTE_API", "true").lower() == "true"
     CONFIRM_BEFORE_REQUEST: bool = os.getenv("CONFIRM_BEFORE_REQUEST", "false").lower() == "true"
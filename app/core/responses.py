@@ -1,8 +1,55 @@
 # app/core/responses.py
-from fastapi.responses import JSONResponse
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse, Response
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj: Any):
+    """
+    Tipos que o orjson não serializa nativamente
+    (datetime/date/UUID/numpy já são tratados por ele).
+    """
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.decode("utf-8", errors="replace")
+    raise TypeError(f"Tipo não serializável em JSON: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serializa para JSON (UTF-8, sem escapar acentos) com orjson.
+    """
+    return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse serializada com orjson: bem mais rápida que o json da
+    stdlib em payloads grandes (estruturas, inspeções) e com suporte
+    nativo a datetime/date e Decimal.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
 
 def success_response(data: dict, message: str = "Operação realizada com sucesso"):
-    return JSONResponse(status_code=200, content={"success": True, "message": message, "data": data})
+    return FastJSONResponse(status_code=200, content={"success": True, "message": message, "data": data})
+
+def raw_success_response(raw_data: bytes, message: str = "Operação realizada com sucesso"):
+    """
+    Igual a success_response, mas com `data` já serializado (ex.: saída
+    FOR JSON do SQL Server): os bytes entram no envelope sem decodificar.
+    """
+    body = b'{"success":true,"message":' + dumps(message) + b',"data":' + raw_data + b"}"
+    return Response(content=body, status_code=200, media_type="application/json")
 
 def error_response(message: str, status_code: int = 400):
-    return JSONResponse(status_code=status_code, content={"success": False, "message": message})
+    return FastJSONResponse(status_code=status_code, content={"success": False, "message": message})
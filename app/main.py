@@ -1,19 +1,43 @@
 # app/main.py
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
 from app.config import settings  # Configurações do .env
 from app.routes import product_routes   # Rotas de produtos
 from app.routes import system_routes   # Rotas de produtos
 from app.routes import data_routes  # Rota genérica
-from app.middleware.auth_middleware import jwt_middleware
+from app.routes import job_routes  # Jobs de exportação
+from app.middleware.auth_middleware import JWTAuthMiddleware
+from app.middleware.compression_middleware import CompressionMiddleware
+from app.middleware.request_id_middleware import RequestIdMiddleware
+from app.services.change_poller_service import change_poller
+from app.utils.http_cache import watermarks
 from fastapi.middleware import Middleware
 from fastapi.openapi.utils import get_openapi
+from app.core.responses import FastJSONResponse
 
 SERVER_URL = " http://127.0.0.1:8000/"
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Monitor de alterações: só as tabelas de CHANGE_POLLER_TABLES; o
+    # watermark delas (ETag e planilha de estrutura em cache) passa a ser
+    # invalidado por eventos em vez de relido a cada poucos segundos.
+    if settings.CHANGE_POLLER_ENABLED:
+        tables = [t for t in settings.CHANGE_POLLER_TABLES.split(",") if t.strip()]
+        change_poller.register(watermarks.invalidate, tables)
+        watermarks.follow(change_poller.tables)
+        change_poller.start()
+    yield
+    change_poller.stop()
+    change_poller.unregister(watermarks.invalidate)
+    watermarks.unfollow()
+
+
 # Instância principal do app FastAPI
 app = FastAPI(
+    lifespan=lifespan,
     title="API DELPI",
     description="API RESTful para integração com o TOTVS Protheus — compatível com agentes GPT.",
     version="1.0.0",
@@ -28,6 +52,7 @@ app = FastAPI(
         {"name": "Auth", "description": "Autenticação via JWT"}
     ],
     openapi_schema=None,
+    default_response_class=FastJSONResponse,
 )
 
 # Adicionar definição global de Bearer Token ao Swagger
@@ -60,11 +85,15 @@ def custom_openapi():
 
 app.openapi = custom_openapi
 
-# Adicionar middleware de autenticação
-app.middleware("http")(jwt_middleware)
+# Adicionar middleware de autenticação (ASGI puro, mesma posição na pilha)
+app.add_middleware(JWTAuthMiddleware)
 
-# Adiciona compressão GZIP a todas as respostas
-app.add_middleware(GZipMiddleware, minimum_size=1000)  # bytes
+# Compressão das respostas (brotli/zstd/gzip, nível por rota, cache dos corpos comprimidos)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MIN_SIZE,  # bytes
+    cache_max_bytes=settings.COMPRESSION_CACHE_MB * 1024 * 1024,
+)
 
 # Configuração do CORS (para permitir chamadas do agente GPT e outros clientes)
 app.add_middleware(
@@ -75,6 +104,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Id de correlação por requisição (mais externo: cobre também 401 e CORS)
+app.add_middleware(RequestIdMiddleware)
+
 # Configurações automáticas do agente GPT
 app.state.agent_config = {
     "auto_execute_api": settings.AUTO_EXECUTE_API,
@@ -92,6 +124,7 @@ def root():
 app.include_router(product_routes.router, prefix="/products", tags=["products"])
 app.include_router(system_routes.router, prefix="/system", tags=["system"])
 app.include_router(data_routes.router, prefix="/data", tags=["data"])
+app.include_router(job_routes.router, prefix="/jobs", tags=["jobs"])
 # Execução direta (modo desenvolvimento)
 if __name__ == "__main__":
     import uvicorn
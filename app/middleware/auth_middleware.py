@@ -1,10 +1,13 @@
 import os
+import time
+from collections import OrderedDict
 
 import jwt
-from fastapi import Request
 from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-from app.middleware.gpt_api_token import request_has_valid_gpt_api_token
+from app.middleware.gpt_api_token import configured_gpt_api_token, headers_have_valid_gpt_api_token
 
 PUBLIC_PATHS = {
     "/",
@@ -32,36 +35,86 @@ def _unauthorized(message: str) -> JSONResponse:
     )
 
 
-async def jwt_middleware(request: Request, call_next):
-    path = request.url.path
-
-    if is_public_path(path):
-        return await call_next(request)
-
-    if request_has_valid_gpt_api_token(request):
-        return await call_next(request)
-
-    auth_header = request.headers.get("Authorization")
-
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return _unauthorized(
-            "Token não informado. Use Bearer com GPT_API_TOKEN (agente) "
-            "ou JWT de /system/login."
-        )
-
-    token = auth_header.replace("Bearer ", "").strip()
-    jwt_secret = os.getenv("JWT_SECRET", "secret")
-
-    try:
-        jwt.decode(token, jwt_secret, algorithms=["HS256"])
-    except jwt.ExpiredSignatureError:
-        return _unauthorized(
-            "Token JWT expirado. Gere um novo em /system/login "
-            "ou use GPT_API_TOKEN no Custom GPT."
-        )
-    except jwt.InvalidTokenError:
-        return _unauthorized(
-            "Token inválido. Verifique GPT_API_TOKEN ou JWT de /system/login."
-        )
+class JWTAuthMiddleware:
+    """
+    Middleware ASGI puro de autenticação (GPT_API_TOKEN ou JWT).
+
+    Diferente de `app.middleware("http")`, não passa pelo BaseHTTPMiddleware:
+    respostas em streaming seguem direto para o cliente. O segredo e o
+    GPT_API_TOKEN são lidos uma única vez, e tokens JWT já verificados
+    ficam num LRU pequeno até o `exp`, evitando `jwt.decode` a cada request.
+    """
+
+    def __init__(self, app: ASGIApp, secret: str | None = None, cache_size: int = 1024):
+        self.app = app
+        self.secret = secret or os.getenv("JWT_SECRET", "secret")
+        self.gpt_api_token = configured_gpt_api_token()
+        self.cache_size = cache_size
+        self._verified: OrderedDict[str, float] = OrderedDict()  # token -> exp
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or is_public_path(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        error = self._authenticate(Headers(scope=scope))
+        if error:
+            await _unauthorized(error)(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
+
+    def _authenticate(self, headers: Headers) -> str | None:
+        """
+        Retorna None se a requisição está autenticada, ou a mensagem de erro.
+        """
+        if headers_have_valid_gpt_api_token(headers, self.gpt_api_token):
+            return None
+
+        auth_header = headers.get("Authorization")
+
+        if not auth_header or not auth_header.startswith("Bearer "):
+            return (
+                "Token não informado. Use Bearer com GPT_API_TOKEN (agente) "
+                "ou JWT de /system/login."
+            )
+
+        token = auth_header.replace("Bearer ", "").strip()
+
+        if self._is_cached(token):
+            return None
+
+        try:
+            payload = jwt.decode(token, self.secret, algorithms=["HS256"])
+        except jwt.ExpiredSignatureError:
+            return (
+                "Token JWT expirado. Gere um novo em /system/login "
+                "ou use GPT_API_TOKEN no Custom GPT."
+            )
+        except jwt.InvalidTokenError:
+            return "Token inválido. Verifique GPT_API_TOKEN ou JWT de /system/login."
+
+        self._remember(token, payload.get("exp"))
+        return None
+
+    # ---------------------------
+    # 🔹 Cache de tokens verificados
+    # ---------------------------
+    def _is_cached(self, token: str) -> bool:
+        exp = self._verified.get(token)
+        if exp is None:
+            return False
+
+        if time.time() >= exp:
+            # Expirou desde a verificação: o decode devolve a mensagem certa
+            del self._verified[token]
+            return False
+
+        self._verified.move_to_end(token)
+        return True
 
-    return await call_next(request)
+    def _remember(self, token: str, exp) -> None:
+        self._verified[token] = float(exp) if exp is not None else float("inf")
+        self._verified.move_to_end(token)
+        while len(self._verified) > self.cache_size:
+            self._verified.popitem(last=False)
@@ -0,0 +1,299 @@
+import hashlib
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard é opcional
+    zstandard = None
+
+
+# Níveis por perfil e codificação (gzip 1-9, brotli 0-11, zstd 1-22)
+COMPRESSION_PROFILES = {
+    "fast": {"br": 1, "zstd": 1, "gzip": 1},
+    "default": {"br": 4, "zstd": 3, "gzip": 6},
+    "max": {"br": 11, "zstd": 19, "gzip": 9},
+}
+
+# Perfil por rota (primeira regra que casar). Respostas grandes e geradas
+# a cada consulta (BOM, SQL livre) usam o perfil rápido; conteúdo estático
+# como o openapi é comprimido ao máximo uma vez e reaproveitado do cache.
+ROUTE_PROFILES = [
+    (re.compile(r"^/products/[^/]+/(structure|parents|where-used|explosion)"), "fast"),
+    (re.compile(r"^/products/(structure|stock)/bulk"), "fast"),
+    (re.compile(r"^/data/sql"), "fast"),
+    (re.compile(r"^/(openapi\.json|docs|redoc)"), "max"),
+]
+
+# Conteúdo já comprimido (ou binário) não é recomprimido
+SKIP_MEDIA_TYPES = (
+    "image/",
+    "audio/",
+    "video/",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/zstd",
+    "application/pdf",
+    "application/octet-stream",
+    "application/vnd.openxmlformats-officedocument",
+    "application/vnd.apache.parquet",
+)
+
+
+def available_encodings() -> list[str]:
+    """
+    Codificações suportadas, em ordem de preferência do servidor.
+    """
+    encodings = []
+    if brotli is not None:
+        encodings.append("br")
+    if zstandard is not None:
+        encodings.append("zstd")
+    encodings.append("gzip")
+    return encodings
+
+
+def negotiate_encoding(accept_encoding: str, supported: list[str]) -> str | None:
+    """
+    Escolhe a codificação pelo Accept-Encoding (respeitando q=0 e `*`);
+    em empate de q, vale a ordem de `supported`.
+    """
+    weights: dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        match = re.search(r"q=([0-9.]+)", params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                q = 0.0
+        weights[name.strip()] = q
+
+    best, best_q = None, 0.0
+    for encoding in supported:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=level)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(body)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(body) + compressor.flush()
+
+
+class _StreamEncoder:
+    """
+    Compressor incremental: cada bloco é descarregado (flush) logo que
+    chega, para que streams (NDJSON, CSV) continuem sendo entregues aos poucos.
+    """
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=level)
+        elif encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(chunk) + self._compressor.flush()
+        if self.encoding == "zstd":
+            return self._compressor.compress(chunk) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class CompressedBodyCache:
+    """
+    LRU de corpos já comprimidos, chaveado pelo digest do corpo original
+    + codificação + nível e limitado pelo total de bytes guardados.
+    Respostas idênticas (mesma estrutura, openapi...) são comprimidas uma vez.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: OrderedDict[tuple, bytes] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, body: bytes, encoding: str, level: int) -> bytes:
+        if self.max_bytes <= 0:
+            return compress(body, encoding, level)
+
+        key = (hashlib.blake2b(body, digest_size=16).digest(), encoding, level)
+        with self._lock:
+            cached = self._items.get(key)
+            if cached is not None:
+                self._items.move_to_end(key)
+                return cached
+
+        compressed = compress(body, encoding, level)
+        if len(compressed) > self.max_bytes:
+            return compressed
+
+        with self._lock:
+            if key not in self._items:
+                self._items[key] = compressed
+                self._size += len(compressed)
+                while self._size > self.max_bytes:
+                    _, evicted = self._items.popitem(last=False)
+                    self._size -= len(evicted)
+        return compressed
+
+
+class CompressionMiddleware:
+    """
+    Compressão de respostas (ASGI puro) no lugar do GZipMiddleware:
+    - brotli/zstd quando instalados e aceitos pelo cliente, senão gzip;
+    - nível por rota (ROUTE_PROFILES);
+    - não recomprime xlsx, parquet, imagens e afins;
+    - corpos completos ≥ `cache_min_size` passam pelo CompressedBodyCache;
+    - respostas em streaming são comprimidas bloco a bloco.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1000,
+        cache_max_bytes: int = 64 * 1024 * 1024,
+        cache_min_size: int = 32 * 1024,
+        route_profiles: list = ROUTE_PROFILES,
+        default_profile: str = "default"
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache_min_size = cache_min_size
+        self.route_profiles = route_profiles
+        self.default_profile = default_profile
+        self.encodings = available_encodings()
+        self.cache = CompressedBodyCache(cache_max_bytes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        encoding = negotiate_encoding(accept_encoding, self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        level = COMPRESSION_PROFILES[self.profile_for(scope["path"])][encoding]
+        responder = _CompressionResponder(self, send, encoding, level)
+        await self.app(scope, receive, responder.send)
+
+    def profile_for(self, path: str) -> str:
+        for pattern, profile in self.route_profiles:
+            if pattern.match(path):
+                return profile
+        return self.default_profile
+
+    def compress_body(self, body: bytes, encoding: str, level: int) -> bytes:
+        if len(body) >= self.cache_min_size:
+            return self.cache.get_or_compress(body, encoding, level)
+        return compress(body, encoding, level)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, send: Send, encoding: str, level: int):
+        self.middleware = middleware
+        self._send = send
+        self.encoding = encoding
+        self.level = level
+        self.start: Message | None = None
+        self.encoder: _StreamEncoder | None = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+
+        if self.start is not None and message["type"] != "http.response.body":
+            # Ex.: http.response.pathsend — segue sem compressão
+            await self._flush_start()
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start is not None:
+            headers = MutableHeaders(raw=self.start["headers"])
+            if not self._should_compress(headers, body, more_body):
+                self.passthrough = True
+                await self._flush_start()
+                await self._send(message)
+                return
+
+            self._set_encoding_headers(headers)
+
+            if not more_body:
+                compressed = self.middleware.compress_body(body, self.encoding, self.level)
+                headers["Content-Length"] = str(len(compressed))
+                await self._flush_start()
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+
+            del headers["Content-Length"]
+            self.encoder = _StreamEncoder(self.encoding, self.level)
+            await self._flush_start()
+
+        chunk = self.encoder.compress(body) if body else b""
+        if not more_body:
+            chunk += self.encoder.finish()
+        await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    async def _flush_start(self) -> None:
+        if self.start is not None:
+            start, self.start = self.start, None
+            await self._send(start)
+
+    def _should_compress(self, headers: MutableHeaders, body: bytes, more_body: bool) -> bool:
+        if "content-encoding" in headers:
+            return False
+        if self.start["status"] in (204, 304) or (not body and not more_body):
+            return False
+
+        media_type = headers.get("content-type", "").lower()
+        if media_type.startswith(SKIP_MEDIA_TYPES):
+            return False
+
+        return more_body or len(body) >= self.middleware.minimum_size
+
+    def _set_encoding_headers(self, headers: MutableHeaders) -> None:
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+
+        # O ETag descreve o corpo sem compressão: passa a ser fraco
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = "W/" + etag
@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import os
 import secrets
+from typing import Mapping
 
 from fastapi import Request
 
@@ -15,21 +16,28 @@ def configured_gpt_api_token() -> str | None:
     return value or None
 
 
-def extract_presented_api_token(request: Request) -> str | None:
-    auth_header = request.headers.get("Authorization")
+def presented_api_token(headers: Mapping[str, str]) -> str | None:
+    auth_header = headers.get("Authorization")
     if auth_header and auth_header.startswith("Bearer "):
         token = auth_header.replace("Bearer ", "", 1).strip()
         return token or None
 
-    api_key = (request.headers.get("X-Api-Key") or "").strip()
+    api_key = (headers.get("X-Api-Key") or "").strip()
     return api_key or None
 
 
-def request_has_valid_gpt_api_token(request: Request) -> bool:
-    expected = configured_gpt_api_token()
+def extract_presented_api_token(request: Request) -> str | None:
+    return presented_api_token(request.headers)
+
+
+def headers_have_valid_gpt_api_token(headers: Mapping[str, str], expected: str | None) -> bool:
     if not expected:
         return False
-    presented = extract_presented_api_token(request)
+    presented = presented_api_token(headers)
     if not presented:
         return False
     return secrets.compare_digest(presented, expected)
+
+
+def request_has_valid_gpt_api_token(request: Request) -> bool:
+    return headers_have_valid_gpt_api_token(request.headers, configured_gpt_api_token())
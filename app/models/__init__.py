@@ -1,3 +1,4 @@
-from .product_model import Product, ProductSearchRequest
+from .product_model import Product, ProductSearchRequest, BulkStockRequest, BulkStructureRequest
 from .system_model import LoginRequest
 from .data_query_model import DataQueryRequest
+from .job_model import StructureExcelJobRequest, InternalMovementsJobRequest
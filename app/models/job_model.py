@@ -0,0 +1,16 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+
+class StructureExcelJobRequest(BaseModel):
+    code: str = Field(..., min_length=1, description="Código do produto (G1_COD)")
+
+
+class InternalMovementsJobRequest(BaseModel):
+    code: str = Field(..., min_length=1, description="Código do produto (D3_COD)")
+    date_start: Optional[str] = None
+    date_end: Optional[str] = None
+    branch: Optional[str] = None
+    location: Optional[str] = None
+    tm: Optional[str] = Field(None, description="Tipo de movimento (D3_TM)")
+    op: Optional[str] = Field(None, description="Ordem de produção")
@@ -19,3 +19,15 @@ class ProductSearchRequest(BaseModel):
     code: Optional[str] = None
     description: Optional[str] = None
     group: Optional[str] = None
+
+
+class BulkStockRequest(BaseModel):
+    codes: List[str] = Field(..., min_length=1, max_length=5000, description="Códigos de produto (B2_COD)")
+    branch: Optional[str] = Field(None, description="Filial (B2_FILIAL)")
+    location: Optional[str] = Field(None, description="Local (B2_LOCAL)")
+    stream: bool = Field(False, description="Se true, devolve NDJSON (uma linha por produto) à medida que é lido")
+
+
+class BulkStructureRequest(BaseModel):
+    codes: List[str] = Field(..., min_length=1, max_length=1000, description="Códigos dos produtos raiz (G1_COD)")
+    max_depth: int = Field(10, ge=1, le=50, description="Profundidade máxima de cada estrutura")
@@ -1,15 +1,38 @@
 # app/repositories/base_repository.py
 from app.database import get_connection
 from app.utils.logger import log_info, log_error
-from app.core.exceptions import DatabaseConnectionError
-from datetime import datetime, date
+from app.core.exceptions import DatabaseConnectionError, BusinessLogicError
+from app.utils.sql_validator import SqlValidator
+from app.utils.query_stats import QueryTiming
+from functools import lru_cache
+from typing import Iterable, Iterator, Optional, Union
 import json
+import re
+import sys
+
+_COLUMN_NAME = re.compile(r"[A-Za-z][A-Za-z0-9_]*")
+
+# Colunas de controle do Protheus (quando habilitadas no banco) que marcam
+# a última gravação / inclusão de cada registro.
+STAMP_COLUMNS = {"S_T_A_M_P_": "max_stamp", "I_N_S_D_T_": "max_insert"}
+_stamp_columns_by_table: dict[str, tuple[str, ...]] = {}
+
+
+@lru_cache(maxsize=1)
+def _allowed_tables() -> frozenset[str]:
+    return frozenset(SqlValidator().allowed_tables)
+
+
 class BaseRepository:
     """
     Classe base para acesso ao banco de dados SQL Server (Protheus).
     Fornece métodos utilitários para executar consultas e processar resultados.
     """
 
+    # SQL Server aceita no máximo 2100 parâmetros por comando;
+    # listas IN (...) são quebradas em blocos deste tamanho.
+    MAX_IN_PARAMS = 1000
+
     def __init__(self):
         self.connection = None
         self.cursor = None
@@ -31,6 +54,23 @@ class BaseRepository:
         if self.connection:
             self.connection.close()
 
+    # ---------------------------
+    # 🔹 Instrumentação
+    # ---------------------------
+    def _timing(self, query: str, params: tuple) -> QueryTiming:
+        """
+        Cronômetro da execução, identificado pelo método do repositório
+        que disparou a consulta (primeiro frame fora deste arquivo).
+        """
+        frame = sys._getframe(1)
+        while frame is not None and frame.f_code.co_filename == __file__:
+            frame = frame.f_back
+
+        caller = "?"
+        if frame is not None:
+            caller = getattr(frame.f_code, "co_qualname", frame.f_code.co_name)
+        return QueryTiming(query, params, caller)
+
     # ---------------------------
     # 🔹 Execução de queries
     # ---------------------------
@@ -38,12 +78,18 @@ class BaseRepository:
         """
         Executa uma query SQL e retorna uma lista de dicionários {coluna: valor}.
         """
+        timing = self._timing(query, params)
         try:
             self.connect()
+            timing.mark("connect")
             self.cursor.execute(query, params)
+            timing.mark("execute")
             rows = self.cursor.fetchall()
+            timing.mark("fetch")
             columns = [desc[0] for desc in self.cursor.description]
             result = [self._normalize_row(dict(zip(columns, row))) for row in rows]
+            timing.mark("normalize")
+            timing.rows = len(result)
             return result
 
         except Exception as e:
@@ -51,24 +97,150 @@ class BaseRepository:
             raise DatabaseConnectionError(str(e))
         finally:
             self.close()
+            timing.finish()
+
+    def execute_columnar(self, query: str, params: tuple = ()) -> tuple[list[str], list[list]]:
+        """
+        Igual a execute_query, mas devolve (colunas, linhas) com cada linha
+        como lista de valores, sem montar um dict por registro.
+        """
+        timing = self._timing(query, params)
+        try:
+            self.connect()
+            timing.mark("connect")
+            self.cursor.execute(query, params)
+            timing.mark("execute")
+            rows = self.cursor.fetchall()
+            timing.mark("fetch")
+            columns = [desc[0] for desc in self.cursor.description]
+            values = [self._normalize_values(row) for row in rows]
+            timing.mark("normalize")
+            timing.rows = len(values)
+            return columns, values
+
+        except Exception as e:
+            log_error(f"Erro ao executar query: {e}")
+            raise DatabaseConnectionError(str(e))
+        finally:
+            self.close()
+            timing.finish()
+
+    def execute_shaped(self, query: str, params: tuple = (), shape: str = "records", key: str = "data") -> dict:
+        """
+        Executa a consulta no formato pedido e devolve o bloco de dados
+        para ser mesclado na resposta das listagens:
+        - records:  {key: [{coluna: valor}, ...]}
+        - columnar: {"shape": "columnar", "columns": [...], key: [[valor, ...], ...]}
+
+        O formato colunar não repete os nomes das colunas a cada linha,
+        o que reduz o payload e o tempo de serialização.
+        """
+        if shape == "records":
+            return {key: self.execute_query(query, params)}
+        if shape == "columnar":
+            columns, rows = self.execute_columnar(query, params)
+            return {"shape": "columnar", "columns": columns, key: rows}
+        raise BusinessLogicError(f"Formato de resposta inválido: {shape} (use records ou columnar).")
 
     def execute_one(self, query: str, params: tuple = ()) -> dict | None:
         """
         Executa uma query SQL e retorna o primeiro registro (dict).
         """
+        timing = self._timing(query, params)
         try:
             self.connect()
+            timing.mark("connect")
             self.cursor.execute(query, params)
+            timing.mark("execute")
             row = self.cursor.fetchone()
+            timing.mark("fetch")
             if not row:
+                timing.rows = 0
                 return None
             columns = [desc[0] for desc in self.cursor.description]
-            return self._normalize_row(dict(zip(columns, row)))
+            result = self._normalize_row(dict(zip(columns, row)))
+            timing.mark("normalize")
+            timing.rows = 1
+            return result
         except Exception as e:
             log_error(f"Erro ao executar query única: {e}")
             raise DatabaseConnectionError(str(e))
         finally:
             self.close()
+            timing.finish()
+
+    def iter_query(self, query: str, params: tuple = (), batch_size: int = 1000) -> Iterator[dict]:
+        """
+        Executa uma query SQL e devolve os registros sob demanda (fetchmany),
+        sem materializar o resultado inteiro em memória.
+        """
+        return self._iter_query(query, params, batch_size, self._timing(query, params))
+
+    def _iter_query(self, query: str, params: tuple, batch_size: int, timing: QueryTiming) -> Iterator[dict]:
+        timing.skip()  # descarta o tempo entre criar o gerador e começar a consumi-lo
+        try:
+            self.connect()
+            timing.mark("connect")
+            self.cursor.execute(query, params)
+            timing.mark("execute")
+            timing.rows = 0
+            columns = [desc[0] for desc in self.cursor.description]
+            while True:
+                rows = self.cursor.fetchmany(batch_size)
+                timing.mark("fetch")
+                if not rows:
+                    break
+                batch = [self._normalize_row(dict(zip(columns, row))) for row in rows]
+                timing.mark("normalize")
+                timing.rows += len(batch)
+                yield from batch
+                timing.skip()
+        except Exception as e:
+            timing.rows = None
+            log_error(f"Erro ao iterar query: {e}")
+            raise DatabaseConnectionError(str(e))
+        finally:
+            self.close()
+            timing.finish()
+
+    def iter_batches(self, query: str, params: tuple = (), batch_size: int = 5000) -> Iterator[tuple[tuple, list]]:
+        """
+        Executa uma query SQL e devolve os registros em blocos brutos
+        (fetchmany), como `(cursor.description, linhas)`, sem montar
+        dicionários por linha. Usado pelas exportações CSV/Parquet.
+        """
+        return self._iter_batches(query, params, batch_size, self._timing(query, params))
+
+    def _iter_batches(self, query: str, params: tuple, batch_size: int, timing: QueryTiming) -> Iterator[tuple[tuple, list]]:
+        timing.skip()  # descarta o tempo entre criar o gerador e começar a consumi-lo
+        try:
+            self.connect()
+            timing.mark("connect")
+            self.cursor.execute(query, params)
+            timing.mark("execute")
+            timing.rows = 0
+            description = self.cursor.description
+            emitted = False
+            while True:
+                rows = self.cursor.fetchmany(batch_size)
+                timing.mark("fetch")
+                if not rows:
+                    break
+                emitted = True
+                timing.rows += len(rows)
+                yield description, rows
+                timing.skip()
+
+            # Resultado vazio: ainda devolve as colunas (cabeçalho/schema)
+            if not emitted:
+                yield description, []
+        except Exception as e:
+            timing.rows = None
+            log_error(f"Erro ao iterar query em blocos: {e}")
+            raise DatabaseConnectionError(str(e))
+        finally:
+            self.close()
+            timing.finish()
 
     def execute_json(self, query: str, params: tuple = ()) -> dict:
         """
@@ -85,14 +257,49 @@ class BaseRepository:
         except json.JSONDecodeError:
             return {}
         
-    def execute_query_multiple(self, query: str, params: tuple = ()) -> list[dict]:
+    def execute_json_raw(self, query: str, params: tuple = ()) -> bytes:
+        """
+        Executa uma query FOR JSON e devolve o JSON bruto (UTF-8), sem
+        decodificar. Para consultas que já entregam o JSON final do SQL
+        Server (strings com RTRIM e sub-blocos via JSON_QUERY), evitando
+        json.loads + _clean_json_data + nova serialização na resposta.
+
+        O SQL Server quebra saídas FOR JSON longas em várias linhas
+        (~2 KB cada) quando não estão em subconsulta: as partes são
+        concatenadas. Retorna b"" quando não há resultado.
+        """
+        timing = self._timing(query, params)
+        try:
+            self.connect()
+            timing.mark("connect")
+            self.cursor.execute(query, params)
+            timing.mark("execute")
+            parts = [row[0] for row in self.cursor.fetchall() if row[0]]
+            timing.mark("fetch")
+            raw = "".join(parts).encode("utf-8")
+            timing.mark("normalize")
+            timing.rows = len(parts)
+            return raw
+        except Exception as e:
+            log_error(f"Erro ao executar query JSON: {e}")
+            raise DatabaseConnectionError(str(e))
+        finally:
+            self.close()
+            timing.finish()
+        
+    def execute_query_multiple(self, query: str, params: tuple = (), columnar: bool = False) -> list[dict]:
         """
         Executa SQL com múltiplos SELECTs e retorna múltiplos resultsets.
         Cada SELECT vira um bloco independente.
+        Com columnar=True, `data` de cada bloco traz as linhas como listas
+        de valores (na ordem de `columns`) em vez de dicts.
         """
+        timing = self._timing(query, params)
         try:
             self.connect()
+            timing.mark("connect")
             self.cursor.execute(query, params)
+            timing.mark("execute")
 
             resultsets = []
             index = 1
@@ -101,11 +308,16 @@ class BaseRepository:
                 if self.cursor.description:
                     columns = [desc[0] for desc in self.cursor.description]
                     rows = self.cursor.fetchall()
+                    timing.mark("fetch")
 
-                    data = [
-                        self._normalize_row(dict(zip(columns, row)))
-                        for row in rows
-                    ]
+                    if columnar:
+                        data = [self._normalize_values(row) for row in rows]
+                    else:
+                        data = [
+                            self._normalize_row(dict(zip(columns, row)))
+                            for row in rows
+                        ]
+                    timing.mark("normalize")
 
                     resultsets.append({
                         "index": index,
@@ -115,9 +327,12 @@ class BaseRepository:
                     })
                     index += 1
 
-                if not self.cursor.nextset():
+                has_next = self.cursor.nextset()
+                timing.mark("fetch")
+                if not has_next:
                     break
 
+            timing.rows = sum(r["total"] for r in resultsets)
             return resultsets
 
         except Exception as e:
@@ -125,6 +340,233 @@ class BaseRepository:
             raise DatabaseConnectionError(str(e))
         finally:
             self.close()
+            timing.finish()
+
+    # ---------------------------
+    # 🔹 Watermark de tabelas
+    # ---------------------------
+    def get_stamp_columns(self, table: str) -> tuple[str, ...]:
+        """
+        Colunas S_T_A_M_P_ / I_N_S_D_T_ existentes na tabela. Consultado
+        uma vez por tabela e guardado para o resto do processo.
+        """
+        if table not in _stamp_columns_by_table:
+            placeholders = ", ".join("?" for _ in STAMP_COLUMNS)
+            rows = self.execute_query(
+                f"""
+                SELECT name AS column_name
+                FROM sys.columns
+                WHERE object_id = OBJECT_ID(?)
+                  AND name IN ({placeholders});
+                """,
+                (table, *STAMP_COLUMNS)
+            )
+            found = {row["column_name"] for row in rows}
+            _stamp_columns_by_table[table] = tuple(c for c in STAMP_COLUMNS if c in found)
+        return _stamp_columns_by_table[table]
+
+    def get_table_watermark(self, table: str, checksum: bool = False) -> dict:
+        """
+        Retorna um "watermark" barato da tabela para detectar alterações:
+        total de linhas, maior R_E_C_N_O_ e quantidade de linhas deletadas
+        (D_E_L_E_T_ = '*'). Inclusões e exclusões lógicas mudam esses valores.
+
+        Quando a tabela tem S_T_A_M_P_ / I_N_S_D_T_, o maior valor de cada
+        uma também entra no watermark: S_T_A_M_P_ acusa alterações feitas
+        no próprio registro sem precisar do checksum.
+
+        Com `checksum=True` inclui também CHECKSUM_AGG das linhas, que
+        detecta alterações feitas no próprio registro (ex.: G1_QUANT),
+        ao custo de ler a tabela inteira.
+
+        `token` resume o watermark em uma única string.
+        """
+        table = (table or "").strip().upper()
+        if table not in _allowed_tables():
+            raise ValueError(f"Tabela não permitida: {table}")
+
+        stamp_columns = self.get_stamp_columns(table)
+        extra_columns = "".join(f",\n                MAX({c}) AS {STAMP_COLUMNS[c]}" for c in stamp_columns)
+        if checksum:
+            extra_columns += ",\n                CHECKSUM_AGG(BINARY_CHECKSUM(*)) AS row_checksum"
+
+        query = f"""
+            SELECT
+                COUNT_BIG(*)    AS total_rows,
+                MAX(R_E_C_N_O_) AS max_recno,
+                SUM(CASE WHEN D_E_L_E_T_ = '*' THEN 1 ELSE 0 END) AS deleted_rows{extra_columns}
+            FROM {table} WITH (NOLOCK);
+        """
+
+        row = self.execute_one(query) or {}
+        watermark = {
+            "table": table,
+            "total_rows": int(row.get("total_rows") or 0),
+            "max_recno": int(row.get("max_recno") or 0),
+            "deleted_rows": int(row.get("deleted_rows") or 0),
+        }
+        for column in stamp_columns:
+            key = STAMP_COLUMNS[column]
+            value = row.get(key)
+            watermark[key] = value.isoformat() if hasattr(value, "isoformat") else str(value or "")
+        if checksum:
+            watermark["row_checksum"] = int(row.get("row_checksum") or 0)
+
+        watermark["token"] = "-".join(str(v) for k, v in watermark.items() if k != "table")
+        return watermark
+
+    def get_change_watermark(self, table: str) -> dict:
+        """
+        Watermark para invalidação de caches (ETag, exportações): precisa
+        acusar também alterações feitas no próprio registro. Usa o
+        S_T_A_M_P_ quando a tabela o tem; sem ele (I_N_S_D_T_ só marca
+        inclusões), recorre ao CHECKSUM_AGG, que lê a tabela inteira.
+        """
+        table = (table or "").strip().upper()
+        checksum = "S_T_A_M_P_" not in self.get_stamp_columns(table)
+        return self.get_table_watermark(table, checksum=checksum)
+
+    # ---------------------------
+    # 🔹 Utilitários
+    # ---------------------------
+    @staticmethod
+    def _chunked(values: Iterable, size: int) -> Iterator[list]:
+        """
+        Divide uma sequência em blocos de até `size` elementos.
+        """
+        chunk = []
+        for value in values:
+            chunk.append(value)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _unique_codes(codes: Iterable[str]) -> list[str]:
+        """
+        Normaliza (strip) e remove duplicados preservando a ordem de entrada.
+        """
+        seen = set()
+        result = []
+        for code in codes:
+            code = (code or "").strip()
+            if code and code not in seen:
+                seen.add(code)
+                result.append(code)
+        return result
+
+    @staticmethod
+    def _values_table(values: list) -> str:
+        """
+        Monta uma tabela derivada `(VALUES (?), (?), ...)` com um parâmetro
+        por valor, para ser usada em JOIN/CTE quando a lista de códigos
+        precisa ser referenciada mais de uma vez na mesma query.
+        """
+        return "(VALUES " + ", ".join(["(?)" for _ in values]) + ")"
+
+    # ---------------------------
+    # 🔹 Projeção de campos (fields=)
+    # ---------------------------
+    @staticmethod
+    def _parse_fields(fields: Optional[Union[str, Iterable[str]]]) -> Optional[list[str]]:
+        """
+        Normaliza o parâmetro `fields` ("code, description" ou lista) para
+        uma lista sem duplicados. None/vazio significa "todos os campos".
+        """
+        if not fields:
+            return None
+        if isinstance(fields, str):
+            fields = fields.split(",")
+
+        result = []
+        for field in fields:
+            field = field.strip()
+            if field and field not in result:
+                result.append(field)
+        return result or None
+
+    def _select_list(
+        self,
+        columns: dict[str, str],
+        fields: Optional[Union[str, Iterable[str]]] = None,
+        required: Iterable[str] = ()
+    ) -> str:
+        """
+        Monta a lista do SELECT a partir de {alias: expressão SQL} somente
+        com os campos pedidos, para o SQL Server ler menos colunas.
+
+        - Sem `fields`, devolve todas as colunas (comportamento original).
+        - A ordem segue `columns`, não a ordem pedida.
+        - `required` são aliases sempre incluídos (ex.: usados no ORDER BY).
+        - Campos desconhecidos geram BusinessLogicError.
+        """
+        wanted = self._parse_fields(fields)
+
+        if wanted is not None:
+            unknown = [f for f in wanted if f not in columns]
+            if unknown:
+                raise BusinessLogicError(
+                    f"Campo(s) inválido(s) em fields: {', '.join(unknown)}. "
+                    f"Disponíveis: {', '.join(columns)}."
+                )
+            selected = set(wanted) | set(required)
+        else:
+            selected = set(columns)
+
+        return ",\n                ".join(
+            f"{expression} AS {alias}"
+            for alias, expression in columns.items()
+            if alias in selected
+        )
+
+    def _select_columns(
+        self,
+        table_alias: str,
+        fields: Optional[Union[str, Iterable[str]]] = None,
+        prefix: str = ""
+    ) -> str:
+        """
+        Projeção para consultas `alias.*` sobre tabelas do dicionário
+        (SX2, SX3...): `fields` são os próprios nomes de coluna.
+        Os nomes são validados (identificador + prefixo da tabela) antes
+        de entrar no SQL. Sem `fields`, devolve `alias.*`.
+        """
+        wanted = self._parse_fields(fields)
+        if wanted is None:
+            return f"{table_alias}.*"
+
+        invalid = [
+            f for f in wanted
+            if not _COLUMN_NAME.fullmatch(f) or not f.upper().startswith(prefix.upper())
+        ]
+        if invalid:
+            raise BusinessLogicError(
+                f"Campo(s) inválido(s) em fields: {', '.join(invalid)}."
+                + (f" As colunas devem começar com {prefix}." if prefix else "")
+            )
+
+        return ", ".join(f"{table_alias}.[{f.upper()}]" for f in wanted)
+
+    @staticmethod
+    def _prune_nodes(node: dict, fields: Optional[set[str]], children_key: str) -> dict:
+        """
+        Projeção esparsa de árvores (ex.: nós da estrutura BOM): mantém em
+        cada nó só as chaves pedidas, além de `children_key` e de marcações
+        estruturais como `cycle`. Altera os nós no próprio lugar.
+        """
+        if not fields:
+            return node
+
+        keep = set(fields) | {children_key, "cycle"}
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            for key in [k for k in current if k not in keep]:
+                del current[key]
+            stack.extend(current.get(children_key) or [])
+        return node
 
     # ---------------------------
     # 🔹 Normalização de dados
@@ -133,18 +575,28 @@ class BaseRepository:
         """
         Limpa e normaliza dados retornados do banco.
         - Remove espaços extras
-        - Converte datetime/date para ISO
         - Substitui None por string vazia
+
+        datetime/date são mantidos como objetos: a serialização para ISO
+        fica a cargo da resposta JSON (FastJSONResponse).
         """
         for k, v in row.items():
-            if isinstance(v, (datetime, date)):
-                row[k] = v.isoformat()
-            elif isinstance(v, str):
+            if isinstance(v, str):
                 row[k] = v.strip()
             elif v is None:
                 row[k] = ""
         return row
 
+    @staticmethod
+    def _normalize_values(row) -> list:
+        """
+        Mesma limpeza de _normalize_row, para uma linha como lista de valores.
+        """
+        return [
+            value.strip() if isinstance(value, str) else ("" if value is None else value)
+            for value in row
+        ]
+
     def _clean_json_data(self, data):
         """
         Limpa e normaliza o JSON retornado do SQL Server:
@@ -6,17 +6,19 @@ class DataRepository(BaseRepository):
     Repositório para consultas dinâmicas.
     """
 
-    def execute_raw_sql_safe(self, sql: str) -> dict:
+    def execute_raw_sql_safe(self, sql: str, shape: str = "records") -> dict:
         """
         Executa SQL bruto após validação de segurança
         (DECLARE / SET + múltiplos SELECTs).
+        Com shape="columnar" as linhas vêm como listas de valores.
         """
         try:
-            resultsets = self.execute_query_multiple(sql)
+            resultsets = self.execute_query_multiple(sql, columnar=shape == "columnar")
 
             return {
                 "success": True,
                 "sql": sql,
+                "shape": shape,
                 "total_resultsets": len(resultsets),
                 "resultsets": resultsets
             }
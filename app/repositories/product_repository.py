@@ -2,10 +2,12 @@
 from app.repositories.base_repository import BaseRepository
 from app.core.exceptions import BusinessLogicError
 from app.utils.logger import log_info, log_error
-from typing import Optional, Union
+from app.utils.bom_graph import BomGraph
+from typing import Callable, Optional, Union
 from datetime import datetime
 import math
 import json
+import numpy as np
 
 class ProductRepository(BaseRepository):
     """
@@ -129,6 +131,18 @@ class ProductRepository(BaseRepository):
         return nodes[root_code]
 
 
+    @staticmethod
+    def _cycle_from_path(bom_path: str) -> list[str]:
+        """
+        Converts a '/A/B/C/A/' CTE path into the cycle it closes: ['A', 'B', 'C', 'A'].
+        """
+        codes = [c for c in (bom_path or "").split("/") if c]
+        if not codes:
+            return []
+        start = codes.index(codes[-1])
+        return codes[start:]
+
+
     def _build_guide_hierarchy(self, rows: list[dict]) -> list[dict]:
         products = {}
 
@@ -200,128 +214,136 @@ class ProductRepository(BaseRepository):
     # -------------------------------
     # 🔹 PRODUCT (SB1010)  
     # -------------------------------
-    def get_product_by_code(self, code: str) -> dict:
+    # SB1010 columns exposed by get_product_by_code (alias -> column)
+    _PRODUCT_COLUMNS = {
+        # =====================
+        # IDENTIFICAÇÃO
+        # =====================
+        "group_code": "B1_GRUPO",
+        "code": "B1_COD",
+        "description": "B1_DESC",
+        "type": "B1_TIPO",
+        "subgroup": "B1_SUBGRUP",
+        "previous_code": "B1_CODANT",
+        "active": "B1_ATIVO",
+        "blocked": "B1_MSBLQL",
+
+        # =====================
+        # COMERCIAL
+        # =====================
+        "customer_reference": "B1_REFEREN",
+        "customer_reference_old": "B1_REFCANT",
+        "sale_price": "B1_PRV1",
+        "contractual_product": "B1_CONTRAT",
+        "sales_class": "B1_CLASSVE",
+
+        # =====================
+        # ENGENHARIA / PRODUÇÃO
+        # =====================
+        "drawing_code": "B1_CODDES",
+        "unit": "B1_UM",
+        "secondary_unit": "B1_SEGUM",
+        "conversion_factor": "B1_CONV",
+        "conversion_type": "B1_TIPCONV",
+        "material_type": "B1_TPMAT",
+        "production_line": "B1_LINHA",
+        "operation_decimal_type": "B1_TIPODEC",
+        "current_revision": "B1_REVATU",
+        "last_revision_date": "B1_UREV",
+        "net_weight": "B1_PESO",
+
+        # =====================
+        # ESTOQUE / LOGÍSTICA
+        # =====================
+        "default_warehouse": "B1_LOCPAD",
+        "package_quantity": "B1_QE",
+        "barcode": "B1_CODBAR",
+        "customer_packaging": "B1_EMBDELP",
+        "make_or_buy": "B1_PRODSBP",
+
+        # =====================
+        # COMPRAS
+        # =====================
+        "last_purchase_date": "B1_UCOM",
+        "last_purchase_price": "B1_UPRC",
+        "lead_time_type": "B1_TIPE",
+        "requester_restriction": "B1_SOLICIT",
+
+        # =====================
+        # CUSTOS
+        # =====================
+        "standard_cost": "B1_CUSTD",
+        "standard_cost_date": "B1_UCALSTD",
+        "cost_currency": "B1_MCUSTD",
+        "cost_reference_date": "B1_DATREF",
+        "import_expense": "B1_DESPIMP",
+
+        # =====================
+        # FISCAL / TRIBUTÁRIO
+        # =====================
+        "ncm_ipi_position": "B1_POSIPI",
+        "origin": "B1_ORIGEM",
+        "imported_product": "B1_IMPORT",
+        "tax_group": "B1_GRTRIB",
+        "entry_tes": "B1_TE",
+        "exit_tes": "B1_TS",
+        "icms_rate": "B1_PICM",
+        "ipi_rate": "B1_IPI",
+        "pis_incidence": "B1_PIS",
+        "pis_percent": "B1_PPIS",
+        "cofins_incidence": "B1_COFINS",
+        "cofins_percent": "B1_PCOFINS",
+        "csll_incidence": "B1_CSLL",
+        "inss_incidence": "B1_INSS",
+        "retention_by_operation": "B1_RETOPER",
+        "customs_authority": "B1_ANUENTE",
+        "media_product": "B1_MIDIA",
+        "media_quantity": "B1_QTMIDIA",
+        "intelligent_tes_group": "B1_GRPTI",
+
+        # =====================
+        # QUALIDADE / PCP
+        # =====================
+        "rohs_indicator": "B1_YHOHS",
+        "traceability": "B1_RASTRO",
+        "warranty_product": "B1_GARANT",
+        "mrp_considered": "B1_MRP",
+        "suggestion_flag": "B1_FLAGSUG",
+        "power_control": "B1_CPOTENC",
+
+        # =====================
+        # CONTÁBIL
+        # =====================
+        "accounting_account": "B1_CONTA",
+        "cost_center": "B1_CC",
+        "appropriation_type": "B1_APROPRI",
+
+        # =====================
+        # SISTEMA / CONTROLES DELPI
+        # =====================
+        "initial_consumption_date": "B1_CONINI",
+        "created_by": "B1_USERLGI",
+        "updated_by": "B1_USERLGA",
+        "mandatory_cc_sc": "B1_YSC",
+        "mandatory_cc_pc": "B1_YPC",
+        "mandatory_cc_pv": "B1_YPV",
+        "mandatory_cc_mi": "B1_YMI",
+        "mandatory_cc_nfe": "B1_YNFE",
+        "approval_validation": "B1_YVLPC",
+        "delpi_category": "B1_YCAT",
+        "delpi_segment": "B1_ZDLPSEG",
+    }
+
+    def get_product_by_code(self, code: str, fields: Optional[str] = None) -> dict:
+        """
+        Returns the SB1010 registration of a product. `fields` (comma
+        separated aliases of _PRODUCT_COLUMNS) limits the columns read.
+        """
         log_info(f"Consultando produto {code} no Protheus (SB1010)...")
 
-        sql = """
+        sql = f"""
             SELECT
-                -- =====================
-                -- IDENTIFICAÇÃO
-                -- =====================
-                B1_GRUPO     AS group_code,
-                B1_COD       AS code,
-                B1_DESC      AS description,
-                B1_TIPO      AS type,
-                B1_SUBGRUP   AS subgroup,
-                B1_CODANT    AS previous_code,
-                B1_ATIVO     AS active,
-                B1_MSBLQL   AS blocked,
-
-                -- =====================
-                -- COMERCIAL
-                -- =====================
-                B1_REFEREN   AS customer_reference,
-                B1_REFCANT   AS customer_reference_old,
-                B1_PRV1      AS sale_price,
-                B1_CONTRAT   AS contractual_product,
-                B1_CLASSVE   AS sales_class,
-
-                -- =====================
-                -- ENGENHARIA / PRODUÇÃO
-                -- =====================
-                B1_CODDES    AS drawing_code,
-                B1_UM        AS unit,
-                B1_SEGUM     AS secondary_unit,
-                B1_CONV      AS conversion_factor,
-                B1_TIPCONV   AS conversion_type,
-                B1_TPMAT     AS material_type,
-                B1_LINHA     AS production_line,
-                B1_TIPODEC   AS operation_decimal_type,
-                B1_REVATU    AS current_revision,
-                B1_UREV      AS last_revision_date,
-                B1_PESO      AS net_weight,
-
-                -- =====================
-                -- ESTOQUE / LOGÍSTICA
-                -- =====================
-                B1_LOCPAD    AS default_warehouse,
-                B1_QE        AS package_quantity,
-                B1_CODBAR    AS barcode,
-                B1_EMBDELP   AS customer_packaging,
-                B1_PRODSBP   AS make_or_buy,
-
-                -- =====================
-                -- COMPRAS
-                -- =====================
-                B1_UCOM      AS last_purchase_date,
-                B1_UPRC      AS last_purchase_price,
-                B1_TIPE      AS lead_time_type,
-                B1_SOLICIT   AS requester_restriction,
-
-                -- =====================
-                -- CUSTOS
-                -- =====================
-                B1_CUSTD     AS standard_cost,
-                B1_UCALSTD   AS standard_cost_date,
-                B1_MCUSTD   AS cost_currency,
-                B1_DATREF   AS cost_reference_date,
-                B1_DESPIMP  AS import_expense,
-
-                -- =====================
-                -- FISCAL / TRIBUTÁRIO
-                -- =====================
-                B1_POSIPI   AS ncm_ipi_position,
-                B1_ORIGEM   AS origin,
-                B1_IMPORT   AS imported_product,
-                B1_GRTRIB   AS tax_group,
-                B1_TE       AS entry_tes,
-                B1_TS       AS exit_tes,
-                B1_PICM     AS icms_rate,
-                B1_IPI      AS ipi_rate,
-                B1_PIS      AS pis_incidence,
-                B1_PPIS     AS pis_percent,
-                B1_COFINS   AS cofins_incidence,
-                B1_PCOFINS  AS cofins_percent,
-                B1_CSLL     AS csll_incidence,
-                B1_INSS     AS inss_incidence,
-                B1_RETOPER  AS retention_by_operation,
-                B1_ANUENTE  AS customs_authority,
-                B1_MIDIA    AS media_product,
-                B1_QTMIDIA  AS media_quantity,
-                B1_GRPTI    AS intelligent_tes_group,
-
-                -- =====================
-                -- QUALIDADE / PCP
-                -- =====================
-                B1_YHOHS    AS rohs_indicator,
-                B1_RASTRO   AS traceability,
-                B1_GARANT   AS warranty_product,
-                B1_MRP      AS mrp_considered,
-                B1_FLAGSUG  AS suggestion_flag,
-                B1_CPOTENC  AS power_control,
-
-                -- =====================
-                -- CONTÁBIL
-                -- =====================
-                B1_CONTA    AS accounting_account,
-                B1_CC       AS cost_center,
-                B1_APROPRI  AS appropriation_type,
-
-                -- =====================
-                -- SISTEMA / CONTROLES DELPI
-                -- =====================
-                B1_CONINI   AS initial_consumption_date,
-                B1_USERLGI  AS created_by,
-                B1_USERLGA  AS updated_by,
-                B1_YSC      AS mandatory_cc_sc,
-                B1_YPC      AS mandatory_cc_pc,
-                B1_YPV      AS mandatory_cc_pv,
-                B1_YMI      AS mandatory_cc_mi,
-                B1_YNFE     AS mandatory_cc_nfe,
-                B1_YVLPC    AS approval_validation,
-                B1_YCAT     AS delpi_category,
-                B1_ZDLPSEG  AS delpi_segment
-
+                {self._select_list(self._PRODUCT_COLUMNS, fields)}
             FROM SB1010
             WHERE D_E_L_E_T_ = ''
             AND B1_COD = ?
@@ -343,11 +365,25 @@ class ProductRepository(BaseRepository):
     # -------------------------------
     # 🔹 SEACH PRODUCTS BY DESCRIPTION 
     # -------------------------------
+    _SEARCH_COLUMNS = {
+        "group_code": "SB1.B1_GRUPO",
+        "code": "SB1.B1_COD",
+        "description": "SB1.B1_DESC",
+        "unit": "SB1.B1_UM",
+        "type": "SB1.B1_TIPO",
+        "subgroup": "SB1.B1_SUBGRUP",
+        "previous_code": "SB1.B1_CODANT",
+        "active": "SB1.B1_ATIVO",
+        "blocked": "SB1.B1_MSBLQL",
+    }
+
     def search_by_description(
         self,
         description: str,
         page: int = 1,
         page_size: int = 50,
+        fields: Optional[str] = None,
+        shape: str = "records",
     ):
         if page < 1:
             raise ValueError("page must be >= 1")
@@ -405,27 +441,22 @@ class ProductRepository(BaseRepository):
         # -----------------------------
         # DATA
         # -----------------------------
+        columns = {**self._SEARCH_COLUMNS, "relevance_score": f"({score_sql})"}
+
         sql = f"""
             SELECT
-                SB1.B1_GRUPO     AS group_code,
-                SB1.B1_COD       AS code,
-                SB1.B1_DESC      AS description,
-                SB1.B1_UM        AS unit,
-                SB1.B1_TIPO      AS type,
-                SB1.B1_SUBGRUP   AS subgroup,
-                SB1.B1_CODANT    AS previous_code,
-                SB1.B1_ATIVO     AS active,
-                SB1.B1_MSBLQL    AS blocked,
-                ({score_sql})    AS relevance_score
+                {self._select_list(columns, fields, required=("relevance_score",))}
             FROM SB1010 SB1
             WHERE {where_sql}
             ORDER BY relevance_score DESC, SB1.B1_DESC, SB1.B1_COD
             OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
         """
 
-        rows = self.execute_query(
+        rows = self.execute_shaped(
             sql,
-            tuple(score_params + params + [offset, page_size])
+            tuple(score_params + params + [offset, page_size]),
+            shape,
+            key="results"
         )
 
         return {
@@ -435,33 +466,74 @@ class ProductRepository(BaseRepository):
             "page_size": page_size,
             "total_pages": (total + page_size - 1) // page_size,
             "description": description,
-            "results": rows
+            **rows
         }
 
 
     # -------------------------------
     # 🔹 STRUCTURE (BOM)
     # -------------------------------
+    # BOM node keys filled from SB1010 (node key -> column)
+    _STRUCTURE_NODE_DETAILS = {
+        "description": "B1_DESC",
+        "type": "B1_TIPO",
+        "unit": "B1_UM",
+    }
+    _STRUCTURE_NODE_FIELDS = ("code", *_STRUCTURE_NODE_DETAILS, "quantity")
+
     def list_structure(
         self,
         code: str,
         max_depth: int = 5,
         page: int = 1,
-        page_size: int = 100
+        page_size: int = 100,
+        fields: Optional[str] = None
     ) -> dict:
         """
         Returns the product BOM (structure) in hierarchical format,
         including product type (B1_TIPO) and unit of measure (B1_UM).
         SQL Server compatible.
+
+        `fields` is a sparse projection of the nodes (e.g. "code,quantity"):
+        other keys are dropped from every node, and SB1010 is only joined
+        for the detail columns actually requested.
         """
+        node_fields = self._parse_fields(fields)
+        if node_fields:
+            unknown = [f for f in node_fields if f not in self._STRUCTURE_NODE_FIELDS]
+            if unknown:
+                raise BusinessLogicError(
+                    f"Campo(s) inválido(s) em fields: {', '.join(unknown)}. "
+                    f"Disponíveis: {', '.join(self._STRUCTURE_NODE_FIELDS)}."
+                )
+
+        details = {
+            key: column
+            for key, column in self._STRUCTURE_NODE_DETAILS.items()
+            if not node_fields or key in node_fields
+        }
+        detail_columns = ",\n".join(
+            f"{'parent.' + details[key] if key in details else 'NULL'} AS parent_{key}, "
+            f"{'comp.' + details[key] if key in details else 'NULL'} AS component_{key}"
+            for key in self._STRUCTURE_NODE_DETAILS
+        )
+        detail_joins = """
+            LEFT JOIN SB1010 parent WITH (NOLOCK)
+                ON parent.B1_COD = rb.parent_code
+            AND parent.D_E_L_E_T_ = ''
+            LEFT JOIN SB1010 comp WITH (NOLOCK)
+                ON comp.B1_COD = rb.component_code
+            AND comp.D_E_L_E_T_ = ''""" if details else ""
 
-        data_query = """
+        data_query = f"""
             WITH recursive_bom AS (
                 SELECT 
                     G1_COD   AS parent_code,
                     G1_COMP  AS component_code,
                     G1_QUANT AS quantity,
-                    1        AS bom_level
+                    1        AS bom_level,
+                    CAST('/' + RTRIM(G1_COD) + '/' + RTRIM(G1_COMP) + '/' AS VARCHAR(MAX)) AS bom_path,
+                    CASE WHEN G1_COD = G1_COMP THEN 1 ELSE 0 END AS is_cycle
                 FROM SG1010 WITH (NOLOCK)
                 WHERE D_E_L_E_T_ = ''
                 AND G1_COD = ?
@@ -473,34 +545,27 @@ class ProductRepository(BaseRepository):
                     c.G1_COD,
                     c.G1_COMP,
                     c.G1_QUANT,
-                    p.bom_level + 1
+                    p.bom_level + 1,
+                    CAST(p.bom_path + RTRIM(c.G1_COMP) + '/' AS VARCHAR(MAX)),
+                    CASE WHEN CHARINDEX('/' + RTRIM(c.G1_COMP) + '/', p.bom_path) > 0 THEN 1 ELSE 0 END
                 FROM SG1010 c WITH (NOLOCK)
                 INNER JOIN recursive_bom p
                     ON p.component_code = c.G1_COD
                 WHERE c.D_E_L_E_T_ = ''
                 AND p.bom_level < ?
+                AND p.is_cycle = 0
                 AND c.G1_FIM > CONVERT(CHAR(8), GETDATE(), 112)
             )
             SELECT 
                 rb.parent_code,
-                parent.B1_DESC AS parent_description,
-                parent.B1_TIPO AS parent_type,
-                parent.B1_UM   AS parent_unit,
-
                 rb.component_code,
-                comp.B1_DESC   AS component_description,
-                comp.B1_TIPO   AS component_type,
-                comp.B1_UM     AS component_unit,
+                {detail_columns},
 
                 rb.quantity,
-                rb.bom_level
-            FROM recursive_bom rb
-            LEFT JOIN SB1010 parent WITH (NOLOCK)
-                ON parent.B1_COD = rb.parent_code
-            AND parent.D_E_L_E_T_ = ''
-            LEFT JOIN SB1010 comp WITH (NOLOCK)
-                ON comp.B1_COD = rb.component_code
-            AND comp.D_E_L_E_T_ = ''
+                rb.bom_level,
+                rb.bom_path,
+                rb.is_cycle
+            FROM recursive_bom rb{detail_joins}
             ORDER BY
                 rb.bom_level,
                 rb.parent_code,
@@ -510,6 +575,7 @@ class ProductRepository(BaseRepository):
         rows = self.execute_query(data_query, (code, max_depth))
 
         items: dict[str, dict] = {}
+        cycles: list[list[str]] = []
 
         for r in rows:
             component_node = {
@@ -534,6 +600,15 @@ class ProductRepository(BaseRepository):
                 }
 
             items[parent_code]["components"].append(component_node)
+
+            # Cycle-closing edge: shown but never expanded nor indexed
+            if r["is_cycle"]:
+                component_node["cycle"] = True
+                cycle = self._cycle_from_path(r["bom_path"])
+                if cycle not in cycles:
+                    cycles.append(cycle)
+                continue
+
             items[component_node["code"]] = component_node
 
         root = items.get(
@@ -552,6 +627,7 @@ class ProductRepository(BaseRepository):
         root_components = root.get("components", [])
         offset = (page - 1) * page_size
         root["components"] = root_components[offset: offset + page_size]
+        self._prune_nodes(root, node_fields, "components")
 
         return {
             "success": True,
@@ -559,6 +635,7 @@ class ProductRepository(BaseRepository):
             "page": page,
             "page_size": page_size,
             "total_pages": math.ceil(len(root_components) / page_size),
+            "cycles": cycles,
             "data": root
         }
 
@@ -579,7 +656,9 @@ class ProductRepository(BaseRepository):
                     G1_COD   AS parent_code,
                     G1_COMP  AS component_code,
                     G1_QUANT AS quantity,
-                    1        AS bom_level
+                    1        AS bom_level,
+                    CAST('/' + RTRIM(G1_COD) + '/' + RTRIM(G1_COMP) + '/' AS VARCHAR(MAX)) AS bom_path,
+                    CASE WHEN G1_COD = G1_COMP THEN 1 ELSE 0 END AS is_cycle
                 FROM SG1010 WITH (NOLOCK)
                 WHERE D_E_L_E_T_ = ''
                 AND G1_COD = ?
@@ -591,12 +670,15 @@ class ProductRepository(BaseRepository):
                     c.G1_COD,
                     c.G1_COMP,
                     c.G1_QUANT,
-                    p.bom_level + 1
+                    p.bom_level + 1,
+                    CAST(p.bom_path + RTRIM(c.G1_COMP) + '/' AS VARCHAR(MAX)),
+                    CASE WHEN CHARINDEX('/' + RTRIM(c.G1_COMP) + '/', p.bom_path) > 0 THEN 1 ELSE 0 END
                 FROM SG1010 c WITH (NOLOCK)
                 INNER JOIN recursive_bom p
                     ON p.component_code = c.G1_COD
                 WHERE c.D_E_L_E_T_ = ''
                 AND p.bom_level < 50
+                AND p.is_cycle = 0
                 AND c.G1_FIM > CONVERT(CHAR(8), GETDATE(), 112)
             )
             SELECT 
@@ -611,7 +693,9 @@ class ProductRepository(BaseRepository):
                 comp.B1_UM     AS component_unit,
 
                 rb.quantity,
-                rb.bom_level
+                rb.bom_level,
+                rb.bom_path,
+                rb.is_cycle
             FROM recursive_bom rb
             LEFT JOIN SB1010 parent WITH (NOLOCK)
                 ON parent.B1_COD = rb.parent_code
@@ -631,6 +715,7 @@ class ProductRepository(BaseRepository):
         # Build hierarchical structure
         # -------------------------------------------------
         items: dict[str, dict] = {}
+        cycles: list[list[str]] = []
 
         for r in rows:
             component_node = {
@@ -655,6 +740,15 @@ class ProductRepository(BaseRepository):
                 }
 
             items[parent_code]["components"].append(component_node)
+
+            # Cycle-closing edge: shown but never expanded nor indexed
+            if r["is_cycle"]:
+                component_node["cycle"] = True
+                cycle = self._cycle_from_path(r["bom_path"])
+                if cycle not in cycles:
+                    cycles.append(cycle)
+                continue
+
             items[component_node["code"]] = component_node
 
         root = items.get(
@@ -675,10 +769,1091 @@ class ProductRepository(BaseRepository):
             "page": None,
             "page_size": None,
             "total_pages": None,
+            "cycles": cycles,
             "data": root
         }
 
 
+    # -------------------------------
+    # 🔹 STRUCTURE (BOM) - CHILDREN (LAZY)
+    # -------------------------------
+    def list_structure_children(
+        self,
+        code: str,
+        node: Optional[str] = None,
+        page: int = 1,
+        page_size: int = 100
+    ) -> dict:
+        """
+        Returns only the direct components of `node` (defaults to `code`),
+        each with a `has_children` flag from a cheap EXISTS lookup, so trees
+        can be expanded one level at a time instead of exploding everything.
+        """
+        if page < 1:
+            raise ValueError("page must be >= 1")
+        if not 1 <= page_size <= 500:
+            raise ValueError("page_size must be between 1 and 500")
+
+        node = (node or code).strip()
+        offset = (page - 1) * page_size
+
+        count_sql = """
+            SELECT COUNT(*) AS total
+            FROM SG1010 WITH (NOLOCK)
+            WHERE D_E_L_E_T_ = ''
+            AND G1_COD = ?
+            AND G1_FIM > CONVERT(CHAR(8), GETDATE(), 112)
+        """
+
+        total = int(self.execute_one(count_sql, (node,))["total"] or 0)
+
+        data_sql = """
+            SELECT
+                G1.G1_COD       AS parent_code,
+                G1.G1_COMP      AS code,
+                comp.B1_DESC    AS description,
+                comp.B1_TIPO    AS type,
+                comp.B1_UM      AS unit,
+                G1.G1_TRT       AS sequence,
+                G1.G1_QUANT     AS quantity,
+                CASE
+                    WHEN EXISTS (
+                        SELECT 1
+                        FROM SG1010 CH WITH (NOLOCK)
+                        WHERE CH.D_E_L_E_T_ = ''
+                        AND CH.G1_COD = G1.G1_COMP
+                        AND CH.G1_FIM > CONVERT(CHAR(8), GETDATE(), 112)
+                    )
+                    THEN CAST(1 AS BIT)
+                    ELSE CAST(0 AS BIT)
+                END             AS has_children
+            FROM SG1010 G1 WITH (NOLOCK)
+            LEFT JOIN SB1010 comp WITH (NOLOCK)
+                ON comp.B1_COD = G1.G1_COMP
+            AND comp.D_E_L_E_T_ = ''
+            WHERE G1.D_E_L_E_T_ = ''
+            AND G1.G1_COD = ?
+            AND G1.G1_FIM > CONVERT(CHAR(8), GETDATE(), 112)
+            ORDER BY G1.G1_COMP, G1.G1_TRT
+            OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
+        """
+
+        rows = self.execute_query(data_sql, (node, offset, page_size))
+
+        for r in rows:
+            r["quantity"] = float(r["quantity"]) if r["quantity"] != "" else 0.0
+            r["has_children"] = bool(r["has_children"])
+
+        return {
+            "success": True,
+            "root": code,
+            "node": node,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "total_pages": (total + page_size - 1) // page_size,
+            "data": rows
+        }
+
+
+    # -------------------------------
+    # 🔹 STRUCTURE (BOM) - EDGES
+    # -------------------------------
+    def list_bom_edges(self, code: str, max_depth: int = 50) -> list[dict]:
+        """
+        Returns each active SG1010 edge (parent → component) reachable from
+        `code` exactly once, with SB1010 data for both sides.
+
+        Unlike the path-expanding CTE of list_structure_full, shared
+        sub-assemblies produce a single set of edges regardless of how many
+        times they appear in the tree. Edges reach at most `max_depth`
+        levels below the root.
+        """
+        return self.list_bom_edges_bulk([code], max_depth)
+
+    def list_bom_edges_bulk(self, codes: list[str], max_depth: int = 50) -> list[dict]:
+        """
+        Same as list_bom_edges, for several roots at once; edges shared
+        between roots are returned once.
+
+        The BOM is expanded level by level over distinct codes
+        (_expand_frontier), so every code is expanded once no matter how
+        many paths lead to it.
+        """
+        edges = self._expand_frontier(codes, max_depth, self._bom_edges_of, "component_code")
+        edges.sort(key=lambda r: (r["parent_code"], r["component_code"]))
+        return edges
+
+    def _expand_frontier(
+        self,
+        codes: list[str],
+        max_depth: int,
+        read_edges: Callable[[list[str]], list[dict]],
+        next_key: str
+    ) -> list[dict]:
+        """
+        Level-by-level BOM expansion over distinct codes.
+
+        Each level calls `read_edges` with the codes first reached on the
+        previous level (IN-lists of at most MAX_IN_PARAMS codes); the
+        `next_key` side of each returned edge forms the next frontier.
+        Every code is expanded once, and cycles stop on their own because
+        visited codes never return to the frontier. Edges reach at most
+        `max_depth` levels away from `codes`.
+        """
+        frontier = self._unique_codes(codes)
+        visited = set(frontier)
+        edges: list[dict] = []
+
+        for _ in range(max_depth):
+            if not frontier:
+                break
+
+            next_frontier = []
+            for chunk in self._chunked(frontier, self.MAX_IN_PARAMS):
+                for r in read_edges(chunk):
+                    edges.append(r)
+                    reached = r[next_key]
+                    if reached not in visited:
+                        visited.add(reached)
+                        next_frontier.append(reached)
+            frontier = next_frontier
+
+        return edges
+
+    def _bom_edges_of(self, codes: list[str], upward: bool = False) -> list[dict]:
+        """
+        Active SG1010 edges whose parent is in `codes` (whose component,
+        if `upward`), quantities of duplicated parent → component rows
+        summed, with SB1010 data for both sides.
+        """
+        placeholders = ",".join(["?" for _ in codes])
+        match_column = "G1.G1_COMP" if upward else "G1.G1_COD"
+        sql = f"""
+            SELECT
+                G1.G1_COD       AS parent_code,
+                parent.B1_DESC  AS parent_description,
+                parent.B1_TIPO  AS parent_type,
+                parent.B1_UM    AS parent_unit,
+
+                G1.G1_COMP      AS component_code,
+                comp.B1_DESC    AS component_description,
+                comp.B1_TIPO    AS component_type,
+                comp.B1_UM      AS component_unit,
+
+                SUM(G1.G1_QUANT) AS quantity
+            FROM SG1010 G1 WITH (NOLOCK)
+            LEFT JOIN SB1010 parent WITH (NOLOCK)
+                ON parent.B1_COD = G1.G1_COD
+            AND parent.D_E_L_E_T_ = ''
+            LEFT JOIN SB1010 comp WITH (NOLOCK)
+                ON comp.B1_COD = G1.G1_COMP
+            AND comp.D_E_L_E_T_ = ''
+            WHERE G1.D_E_L_E_T_ = ''
+            AND {match_column} IN ({placeholders})
+            AND G1.G1_FIM > CONVERT(CHAR(8), GETDATE(), 112)
+            GROUP BY
+                G1.G1_COD, parent.B1_DESC, parent.B1_TIPO, parent.B1_UM,
+                G1.G1_COMP, comp.B1_DESC, comp.B1_TIPO, comp.B1_UM
+        """
+        return self.execute_query(sql, tuple(codes))
+
+    def _bom_graph(self, edges: list[dict], roots: tuple = ()) -> tuple[BomGraph, dict[str, dict]]:
+        """
+        Builds the BomGraph and a code → SB1010 metadata map from edge rows.
+        Edges closing a cycle below any of `roots` are dropped and reported
+        in `graph.cycles`, so the propagations always run on a DAG.
+        """
+        graph = BomGraph(
+            ((r["parent_code"], r["component_code"], r["quantity"]) for r in edges),
+            nodes=roots
+        )
+        for root in roots:
+            graph.drop_back_edges(root)
+
+        meta: dict[str, dict] = {}
+        for r in edges:
+            for side in ("parent", "component"):
+                node_code = r[f"{side}_code"]
+                if node_code not in meta:
+                    meta[node_code] = {
+                        "description": r[f"{side}_description"],
+                        "type": r[f"{side}_type"],
+                        "unit": r[f"{side}_unit"],
+                    }
+
+        return graph, meta
+
+    # -------------------------------
+    # 🔹 STRUCTURE (BOM) - GRAPH
+    # -------------------------------
+    def list_structure_graph(self, code: str, max_depth: int = 10) -> dict:
+        """
+        Returns the BOM as a node table plus an edge list: every product
+        (including shared sub-assemblies) appears exactly once in `nodes`,
+        and each parent → component relation once in `edges`.
+        """
+        if not 1 <= max_depth <= 50:
+            raise ValueError("max_depth must be between 1 and 50")
+
+        edges = self.list_bom_edges(code, max_depth)
+        graph, meta = self._bom_graph(edges, roots=(code,))
+        level = graph.levels(code)
+
+        if code not in meta:
+            product = self.get_product_type(code) or {}
+            meta[code] = {
+                "description": product.get("description"),
+                "type": product.get("type"),
+                "unit": product.get("unit"),
+            }
+
+        nodes = [
+            {
+                "code": node_code,
+                "description": meta.get(node_code, {}).get("description"),
+                "type": meta.get(node_code, {}).get("type"),
+                "unit": meta.get(node_code, {}).get("unit"),
+                "bom_level": int(level[i]),
+                "has_children": bool(graph.children[i])
+            }
+            for i, node_code in enumerate(graph.codes)
+        ]
+        nodes.sort(key=lambda n: (n["bom_level"], n["code"]))
+
+        return {
+            "success": True,
+            "mode": "graph",
+            "root": code,
+            "max_depth": max_depth,
+            "total_nodes": len(nodes),
+            "total_edges": len(edges),
+            "cycles": graph.cycles,
+            "nodes": nodes,
+            "edges": [
+                {
+                    "parent": r["parent_code"],
+                    "component": r["component_code"],
+                    "quantity": float(r["quantity"] or 0)
+                }
+                for r in edges
+            ]
+        }
+
+
+    # -------------------------------
+    # 🔹 STRUCTURE (BOM) - BULK
+    # -------------------------------
+    def list_structure_bulk(self, codes: list[str], max_depth: int = 10) -> dict:
+        """
+        Returns the component tree of several roots from one shared read.
+
+        The union of edges is read once (list_bom_edges_bulk: one query per
+        BOM level for all roots together) and each tree is assembled in
+        memory from the shared adjacency, cut at `max_depth` levels below
+        its own root. Cycle-closing components are flagged
+        with `cycle: true` and not expanded.
+        """
+        if not 1 <= max_depth <= 50:
+            raise ValueError("max_depth must be between 1 and 50")
+
+        codes = self._unique_codes(codes)
+        edges = self.list_bom_edges_bulk(codes, max_depth)
+        graph, meta = self._bom_graph(edges)
+
+        def node_for(i: int, quantity: float) -> dict:
+            node_code = graph.codes[i]
+            node_meta = meta.get(node_code, {})
+            return {
+                "code": node_code,
+                "description": node_meta.get("description"),
+                "type": node_meta.get("type"),
+                "unit": node_meta.get("unit"),
+                "quantity": quantity,
+                "components": []
+            }
+
+        data = []
+        not_found = []
+        for root_code in codes:
+            root_index = graph.index.get(root_code)
+            if root_index is None or not graph.children[root_index]:
+                not_found.append(root_code)
+                continue
+
+            root = node_for(root_index, 1.0)
+            cycles: list[list[str]] = []
+
+            # Iterative DFS: (graph node, tree node, depth, codes on the current path)
+            stack = [(root_index, root, 0, (root_index,))]
+            while stack:
+                i, tree_node, depth, path = stack.pop()
+                if depth >= max_depth:
+                    continue
+
+                for e in graph.children[i]:
+                    child = int(graph.dst[e])
+                    child_node = node_for(child, float(graph.qty[e]))
+                    tree_node["components"].append(child_node)
+
+                    if child in path:
+                        child_node["cycle"] = True
+                        cycle = [graph.codes[p] for p in path[path.index(child):]] + [graph.codes[child]]
+                        if cycle not in cycles:
+                            cycles.append(cycle)
+                        continue
+
+                    stack.append((child, child_node, depth + 1, path + (child,)))
+
+            root["cycles"] = cycles
+            data.append(root)
+
+        return {
+            "success": True,
+            "total": len(data),
+            "max_depth": max_depth,
+            "total_edges": len(edges),
+            "not_found": not_found,
+            "data": data
+        }
+
+
+    # -------------------------------
+    # 🔹 STRUCTURE (BOM) - REVISION DIFF
+    # -------------------------------
+    def list_structure_diff(
+        self,
+        code: str,
+        date_from: Union[str, datetime],
+        date_to: Optional[Union[str, datetime]] = None,
+        max_depth: int = 50
+    ) -> dict:
+        """
+        Compares the BOM of `code` as of two dates (G1_INI/G1_FIM validity
+        windows) and returns the added, removed and changed-quantity edges.
+
+        The relations valid at either date are expanded level by level over
+        distinct codes (_expand_frontier), each edge returned once with its
+        quantity on both dates; the structure visible at each date is then
+        resolved and diffed in memory.
+        """
+        if not 1 <= max_depth <= 50:
+            raise ValueError("max_depth must be between 1 and 50")
+
+        date_a = self._convert_date_to_protheus(date_from)
+        date_b = self._convert_date_to_protheus(date_to) or datetime.now().strftime("%Y%m%d")
+        if not date_a:
+            raise ValueError("date_from must be a valid date")
+
+        rows = self._expand_frontier(
+            [code], max_depth,
+            lambda parents: self._diff_edges_of(parents, date_a, date_b),
+            "component_code"
+        )
+
+        def visible_edges(side: str) -> dict[tuple[str, str], float]:
+            # Only edges reachable from the root through relations valid at that date
+            edges = {
+                (r["parent_code"], r["component_code"]): float(r[f"quantity_{side}"] or 0)
+                for r in rows
+                if int(r[f"rows_{side}"] or 0) > 0
+            }
+            graph = BomGraph(((p, c, q) for (p, c), q in edges.items()), nodes=(code,))
+            scope = graph.reachable(code)
+            return {
+                key: qty for key, qty in edges.items()
+                if scope[graph.index[key[0]]]
+            }
+
+        before = visible_edges("a")
+        after = visible_edges("b")
+        info = {(r["parent_code"], r["component_code"]): r for r in rows}
+
+        def edge(key: tuple[str, str], **extra) -> dict:
+            r = info[key]
+            return {
+                "parent": key[0],
+                "component": key[1],
+                "description": r["component_description"],
+                "type": r["component_type"],
+                "unit": r["component_unit"],
+                **extra
+            }
+
+        added = [edge(k, quantity=after[k]) for k in sorted(after.keys() - before.keys())]
+        removed = [edge(k, quantity=before[k]) for k in sorted(before.keys() - after.keys())]
+        changed = [
+            edge(k, quantity_from=before[k], quantity_to=after[k], delta=after[k] - before[k])
+            for k in sorted(before.keys() & after.keys())
+            if not math.isclose(before[k], after[k], rel_tol=1e-9, abs_tol=1e-9)
+        ]
+
+        return {
+            "success": True,
+            "code": code,
+            "date_from": date_a,
+            "date_to": date_b,
+            "max_depth": max_depth,
+            "total_edges_from": len(before),
+            "total_edges_to": len(after),
+            "total_changes": len(added) + len(removed) + len(changed),
+            "added": added,
+            "removed": removed,
+            "changed": changed
+        }
+
+
+    def _diff_edges_of(self, parents: list[str], date_a: str, date_b: str) -> list[dict]:
+        """
+        SG1010 edges of `parents` valid at `date_a` or `date_b`, one row per
+        parent → component with the row count and summed quantity valid at
+        each date, plus SB1010 data for the component.
+        """
+        placeholders = ",".join(["?" for _ in parents])
+        sql = f"""
+            DECLARE
+                @date_a CHAR(8) = ?,
+                @date_b CHAR(8) = ?;
+
+            WITH valid_bom AS (
+                SELECT
+                    G1_COD,
+                    G1_COMP,
+                    G1_QUANT,
+                    CASE WHEN G1_INI <= @date_a AND G1_FIM > @date_a THEN 1 ELSE 0 END AS valid_a,
+                    CASE WHEN G1_INI <= @date_b AND G1_FIM > @date_b THEN 1 ELSE 0 END AS valid_b
+                FROM SG1010 WITH (NOLOCK)
+                WHERE D_E_L_E_T_ = ''
+                AND G1_COD IN ({placeholders})
+                AND (
+                    (G1_INI <= @date_a AND G1_FIM > @date_a)
+                    OR (G1_INI <= @date_b AND G1_FIM > @date_b)
+                )
+            )
+            SELECT
+                V.G1_COD        AS parent_code,
+                V.G1_COMP       AS component_code,
+                comp.B1_DESC    AS component_description,
+                comp.B1_TIPO    AS component_type,
+                comp.B1_UM      AS component_unit,
+
+                SUM(V.valid_a)                                    AS rows_a,
+                SUM(CASE WHEN V.valid_a = 1 THEN V.G1_QUANT ELSE 0 END) AS quantity_a,
+                SUM(V.valid_b)                                    AS rows_b,
+                SUM(CASE WHEN V.valid_b = 1 THEN V.G1_QUANT ELSE 0 END) AS quantity_b
+            FROM valid_bom V
+            LEFT JOIN SB1010 comp WITH (NOLOCK)
+                ON comp.B1_COD = V.G1_COMP
+            AND comp.D_E_L_E_T_ = ''
+            GROUP BY
+                V.G1_COD, V.G1_COMP, comp.B1_DESC, comp.B1_TIPO, comp.B1_UM;
+        """
+        return self.execute_query(sql, (date_a, date_b, *parents))
+
+
+    # -------------------------------
+    # 🔹 STRUCTURE (BOM) - EXPLOSION
+    # -------------------------------
+    def explode_structure(
+        self,
+        code: str,
+        quantity: float = 1.0,
+        include_intermediate: bool = False
+    ) -> dict:
+        """
+        Returns the flattened BOM explosion of `code`: total required quantity
+        of every leaf (or every node) for `quantity` units of the root,
+        accumulated across all paths.
+        """
+        if quantity <= 0:
+            raise ValueError("quantity must be > 0")
+
+        edges = self.list_bom_edges(code)
+        graph, meta = self._bom_graph(edges, roots=(code,))
+
+        required = graph.explode(code, quantity)
+        level = graph.levels(code)
+
+        if include_intermediate:
+            nodes = [
+                i for i in range(len(graph))
+                if level[i] > 0
+            ]
+        else:
+            nodes = graph.leaves(code)
+            nodes = [i for i in nodes if level[i] > 0]
+
+        data = []
+        for i in nodes:
+            node_code = graph.codes[i]
+            node_meta = meta.get(node_code, {})
+            data.append({
+                "code": node_code,
+                "description": node_meta.get("description"),
+                "type": node_meta.get("type"),
+                "unit": node_meta.get("unit"),
+                "bom_level": int(level[i]),
+                "is_leaf": not graph.children[i],
+                "quantity_per_unit": float(required[i]) / quantity,
+                "total_quantity": float(required[i])
+            })
+
+        data.sort(key=lambda n: (n["bom_level"], n["code"]))
+
+        return {
+            "success": True,
+            "code": code,
+            "quantity": quantity,
+            "total": len(data),
+            "total_edges": len(edges),
+            "cycles": graph.cycles,
+            "data": data
+        }
+
+
+    # -------------------------------
+    # 🔹 MATERIAL REQUIREMENTS (BOM + SB2010 + SC7010)
+    # -------------------------------
+    def list_open_purchase_quantities(
+        self,
+        codes: list[str],
+        branch: Optional[str] = None
+    ) -> dict[str, dict]:
+        """
+        Returns open SC7010 purchase order quantities (ordered - received)
+        for many products, one set-based query per block of codes.
+        """
+        result: dict[str, dict] = {}
+
+        for chunk in self._chunked(self._unique_codes(codes), self.MAX_IN_PARAMS):
+            placeholders = ",".join(["?" for _ in chunk])
+            params = list(chunk)
+
+            branch_filter = ""
+            if branch:
+                branch_filter = "AND C7.C7_FILIAL = ?"
+                params.append(branch)
+
+            sql = f"""
+                SELECT
+                    C7.C7_PRODUTO                   AS product_code,
+                    SUM(C7.C7_QUANT - C7.C7_QUJE)   AS open_quantity,
+                    COUNT(DISTINCT C7.C7_NUM)       AS open_orders,
+                    MIN(C7.C7_DATPRF)               AS next_delivery_date
+                FROM SC7010 C7 WITH (NOLOCK)
+                WHERE C7.D_E_L_E_T_ = ''
+                AND C7.C7_PRODUTO IN ({placeholders})
+                AND C7.C7_QUANT > C7.C7_QUJE
+                AND C7.C7_RESIDUO = ''
+                {branch_filter}
+                GROUP BY C7.C7_PRODUTO
+            """
+
+            for r in self.execute_query(sql, tuple(params)):
+                result[r["product_code"]] = {
+                    "open_quantity": float(r["open_quantity"] or 0),
+                    "open_orders": int(r["open_orders"] or 0),
+                    "next_delivery_date": r["next_delivery_date"]
+                }
+
+        return result
+
+    def get_material_requirements(
+        self,
+        code: str,
+        quantity: float,
+        branch: Optional[str] = None,
+        location: Optional[str] = None,
+        only_shortages: bool = False
+    ) -> dict:
+        """
+        Answers "can we build `quantity` units of `code`?".
+
+        The BOM is exploded once, SB2010 availability and open SC7010
+        quantities are fetched set-wise for every component, and netting
+        runs level by level so stock of an intermediate product reduces
+        the demand passed down to its own components.
+        """
+        if quantity <= 0:
+            raise ValueError("quantity must be > 0")
+
+        log_info(f"Calculando necessidades de {quantity} x {code} (filial={branch}, local={location})")
+
+        edges = self.list_bom_edges(code)
+        graph, meta = self._bom_graph(edges, roots=(code,))
+        level = graph.levels(code)
+
+        components = [c for c in graph.codes if c != code]
+
+        stock = {
+            r["product_code"]: r["total_available_quantity"]
+            for r in self.iter_stock_bulk(components, branch, location)
+        } if components else {}
+        purchases = self.list_open_purchase_quantities(components, branch) if components else {}
+
+        available = np.array([max(stock.get(c, 0.0), 0.0) for c in graph.codes], dtype=np.float64)
+        on_order = np.array(
+            [purchases.get(c, {}).get("open_quantity", 0.0) for c in graph.codes],
+            dtype=np.float64
+        )
+
+        gross, net = graph.net_requirements(code, quantity, available, on_order)
+
+        data = []
+        total_shortages = 0
+        for i, node_code in enumerate(graph.codes):
+            if level[i] <= 0:
+                continue
+
+            is_leaf = not graph.children[i]
+            shortage = float(net[i]) if is_leaf else 0.0
+            if shortage > 0:
+                total_shortages += 1
+            if only_shortages and shortage <= 0:
+                continue
+
+            node_meta = meta.get(node_code, {})
+            purchase = purchases.get(node_code, {})
+            data.append({
+                "code": node_code,
+                "description": node_meta.get("description"),
+                "type": node_meta.get("type"),
+                "unit": node_meta.get("unit"),
+                "bom_level": int(level[i]),
+                "is_leaf": is_leaf,
+                "gross_requirement": float(gross[i]),
+                "available_quantity": float(available[i]),
+                "open_purchase_quantity": float(on_order[i]),
+                "next_delivery_date": purchase.get("next_delivery_date"),
+                "net_requirement": float(net[i]),
+                "to_produce": 0.0 if is_leaf else float(net[i]),
+                "shortage": shortage
+            })
+
+        data.sort(key=lambda n: (n["bom_level"], n["code"]))
+
+        return {
+            "success": True,
+            "code": code,
+            "quantity": quantity,
+            "can_build": total_shortages == 0,
+            "cycles": graph.cycles,
+            "total": len(data),
+            "total_shortages": total_shortages,
+            "filters": {
+                "branch": branch,
+                "location": location,
+                "only_shortages": only_shortages
+            },
+            "data": data
+        }
+
+
+    # -------------------------------
+    # 🔹 LEAD TIME (SC7010 ⋈ SD1010 + SG2010)
+    # -------------------------------
+    def list_procurement_lead_times(self, codes: list[str]) -> dict[str, dict]:
+        """
+        Returns the procurement lead time (days) of many products at once.
+
+        Priority: real average lead time (SC7010 issue → SD1010 receipt, all
+        suppliers), then the longest registered SA5010 lead time, then
+        SB1010 B1_PE.
+        """
+        result: dict[str, dict] = {}
+
+        for chunk in self._chunked(self._unique_codes(codes), self.MAX_IN_PARAMS):
+            sql = f"""
+                WITH codes AS (
+                    SELECT v.product_code
+                    FROM {self._values_table(chunk)} AS v(product_code)
+                ),
+                real_lead_time AS (
+                    SELECT
+                        C7.C7_PRODUTO AS product_code,
+                        COUNT(*)      AS sample_size,
+                        AVG(CAST(DATEDIFF(DAY, C7.C7_EMISSAO, SD1.D1_EMISSAO) AS FLOAT)) AS avg_lead_time_days
+                    FROM SC7010 C7 WITH (NOLOCK)
+                    INNER JOIN codes
+                        ON codes.product_code = C7.C7_PRODUTO
+                    INNER JOIN SD1010 SD1 WITH (NOLOCK)
+                        ON SD1.D1_PEDIDO  = C7.C7_NUM
+                    AND SD1.D1_FORNECE = C7.C7_FORNECE
+                    AND SD1.D1_LOJA    = C7.C7_LOJA
+                    AND SD1.D1_COD     = C7.C7_PRODUTO
+                    AND SD1.D_E_L_E_T_ = ''
+                    WHERE C7.D_E_L_E_T_ = ''
+                    GROUP BY C7.C7_PRODUTO
+                ),
+                registered_lead_time AS (
+                    SELECT
+                        SA5.A5_PRODUTO      AS product_code,
+                        MAX(SA5.A5_LEAD_T)  AS registered_lead_time_days
+                    FROM SA5010 SA5 WITH (NOLOCK)
+                    INNER JOIN codes
+                        ON codes.product_code = SA5.A5_PRODUTO
+                    WHERE SA5.D_E_L_E_T_ = ''
+                    GROUP BY SA5.A5_PRODUTO
+                )
+                SELECT
+                    codes.product_code,
+                    RLT.avg_lead_time_days,
+                    RLT.sample_size,
+                    REG.registered_lead_time_days,
+                    SB1.B1_PE AS product_lead_time_days
+                FROM codes
+                LEFT JOIN real_lead_time RLT
+                    ON RLT.product_code = codes.product_code
+                LEFT JOIN registered_lead_time REG
+                    ON REG.product_code = codes.product_code
+                LEFT JOIN SB1010 SB1 WITH (NOLOCK)
+                    ON SB1.B1_COD = codes.product_code
+                AND SB1.D_E_L_E_T_ = ''
+            """
+
+            for r in self.execute_query(sql, tuple(chunk)):
+                if r["avg_lead_time_days"] not in ("", None):
+                    days, source = float(r["avg_lead_time_days"]), "real"
+                elif r["registered_lead_time_days"] not in ("", None) and float(r["registered_lead_time_days"]) > 0:
+                    days, source = float(r["registered_lead_time_days"]), "registered"
+                elif r["product_lead_time_days"] not in ("", None) and float(r["product_lead_time_days"]) > 0:
+                    days, source = float(r["product_lead_time_days"]), "product"
+                else:
+                    days, source = 0.0, None
+
+                result[r["product_code"]] = {
+                    "lead_time_days": days,
+                    "source": source,
+                    "sample_size": int(r["sample_size"] or 0)
+                }
+
+        return result
+
+    def list_routing_times(self, codes: list[str], branch: Optional[str] = None) -> dict[str, dict]:
+        """
+        Returns the SG2010 routing time of many products at once (first route
+        of each product): total setup hours and standard hours per piece.
+        """
+        result: dict[str, dict] = {}
+
+        for chunk in self._chunked(self._unique_codes(codes), self.MAX_IN_PARAMS):
+            placeholders = ",".join(["?" for _ in chunk])
+            params = list(chunk)
+
+            branch_filter = ""
+            if branch:
+                branch_filter = "AND SG2.G2_FILIAL = ?"
+                params.append(branch)
+
+            sql = f"""
+                WITH routes AS (
+                    SELECT
+                        SG2.G2_PRODUTO AS product_code,
+                        SG2.G2_CODIGO  AS route_code,
+                        SG2.G2_SETUP   AS setup_hours,
+                        SG2.G2_TEMPAD  AS standard_time_hour_mil,
+                        DENSE_RANK() OVER (
+                            PARTITION BY SG2.G2_PRODUTO
+                            ORDER BY SG2.G2_CODIGO
+                        ) AS route_rank
+                    FROM SG2010 SG2 WITH (NOLOCK)
+                    WHERE SG2.D_E_L_E_T_ = ''
+                    AND SG2.G2_PRODUTO IN ({placeholders})
+                    {branch_filter}
+                )
+                SELECT
+                    product_code,
+                    MIN(route_code)                         AS route_code,
+                    COUNT(*)                                AS operations,
+                    SUM(setup_hours)                        AS setup_hours,
+                    SUM(standard_time_hour_mil) / 1000.0    AS standard_time_hours_piece
+                FROM routes
+                WHERE route_rank = 1
+                GROUP BY product_code
+            """
+
+            for r in self.execute_query(sql, tuple(params)):
+                result[r["product_code"]] = {
+                    "route_code": r["route_code"],
+                    "operations": int(r["operations"] or 0),
+                    "setup_hours": float(r["setup_hours"] or 0),
+                    "standard_time_hours_piece": float(r["standard_time_hours_piece"] or 0)
+                }
+
+        return result
+
+    def get_lead_time_critical_path(
+        self,
+        code: str,
+        quantity: float = 1.0,
+        branch: Optional[str] = None,
+        hours_per_day: float = 8.0
+    ) -> dict:
+        """
+        Longest cumulative procurement + routing time from the root to any
+        leaf of the BOM.
+
+        Leaves weigh their procurement lead time (days); manufactured nodes
+        weigh setup + standard time for their exploded quantity, converted
+        to days with `hours_per_day`. Lead times and routings are fetched
+        set-wise for the whole structure and the longest path is computed
+        in memory over the DAG.
+        """
+        if quantity <= 0:
+            raise ValueError("quantity must be > 0")
+        if hours_per_day <= 0:
+            raise ValueError("hours_per_day must be > 0")
+
+        log_info(f"Calculando caminho crítico de lead time de {code} (qtd={quantity})")
+
+        edges = self.list_bom_edges(code)
+        graph, meta = self._bom_graph(edges, roots=(code,))
+
+        level = graph.levels(code)
+        required = graph.explode(code, quantity)
+
+        leaves = [graph.codes[i] for i in graph.leaves(code) if level[i] > 0]
+        manufactured = [c for i, c in enumerate(graph.codes) if graph.children[i] or c == code]
+
+        procurement = self.list_procurement_lead_times(leaves) if leaves else {}
+        routing = self.list_routing_times(manufactured, branch) if manufactured else {}
+
+        weight = np.zeros(len(graph), dtype=np.float64)
+        nodes = []
+        for i, node_code in enumerate(graph.codes):
+            if level[i] < 0:
+                continue
+
+            node = {
+                "code": node_code,
+                "description": meta.get(node_code, {}).get("description"),
+                "type": meta.get(node_code, {}).get("type"),
+                "bom_level": int(level[i]),
+                "required_quantity": float(required[i]),
+            }
+
+            if graph.children[i] or node_code == code:
+                route = routing.get(node_code, {})
+                hours = route.get("setup_hours", 0.0) + route.get("standard_time_hours_piece", 0.0) * float(required[i])
+                weight[i] = hours / hours_per_day
+                node.update({
+                    "kind": "routing",
+                    "route_code": route.get("route_code"),
+                    "routing_hours": hours,
+                })
+            else:
+                lead = procurement.get(node_code, {})
+                weight[i] = lead.get("lead_time_days", 0.0)
+                node.update({
+                    "kind": "procurement",
+                    "lead_time_source": lead.get("source"),
+                    "lead_time_sample_size": lead.get("sample_size", 0),
+                })
+
+            node["own_days"] = float(weight[i])
+            nodes.append((i, node))
+
+        total, path = graph.longest_path(code, weight)
+
+        for i, node in nodes:
+            node["cumulative_days"] = float(total[i])
+
+        by_index = dict(nodes)
+        critical_path = [by_index[i] for i in path if i in by_index]
+
+        return {
+            "success": True,
+            "code": code,
+            "quantity": quantity,
+            "hours_per_day": hours_per_day,
+            "total_lead_time_days": float(total[graph.index[code]]),
+            "critical_path": critical_path,
+            "cycles": graph.cycles,
+            "total": len(nodes),
+            "data": sorted((n for _, n in nodes), key=lambda n: (n["bom_level"], n["code"]))
+        }
+
+
+    # -------------------------------
+    # 🔹 COST ROLL-UP (SC7010 + SB1010)
+    # -------------------------------
+    def list_last_purchase_prices(self, codes: list[str]) -> dict[str, dict]:
+        """
+        Returns the unit price of many products at once: last SC7010
+        purchase price, falling back to SB1010 B1_UPRC (last purchase price)
+        and then B1_CUSTD (standard cost).
+        """
+        result: dict[str, dict] = {}
+
+        for chunk in self._chunked(self._unique_codes(codes), self.MAX_IN_PARAMS):
+            sql = f"""
+                WITH codes AS (
+                    SELECT v.product_code
+                    FROM {self._values_table(chunk)} AS v(product_code)
+                ),
+                last_purchase AS (
+                    SELECT
+                        C7.C7_PRODUTO   AS product_code,
+                        C7.C7_PRECO     AS last_price,
+                        C7.C7_EMISSAO   AS last_price_date,
+                        C7.C7_FORNECE   AS supplier_code,
+                        ROW_NUMBER() OVER (
+                            PARTITION BY C7.C7_PRODUTO
+                            ORDER BY C7.C7_EMISSAO DESC, C7.R_E_C_N_O_ DESC
+                        ) AS rn
+                    FROM SC7010 C7 WITH (NOLOCK)
+                    INNER JOIN codes
+                        ON codes.product_code = C7.C7_PRODUTO
+                    WHERE C7.D_E_L_E_T_ = ''
+                    AND C7.C7_PRECO > 0
+                )
+                SELECT
+                    codes.product_code,
+                    LP.last_price,
+                    LP.last_price_date,
+                    LP.supplier_code,
+                    SB1.B1_UPRC     AS product_last_price,
+                    SB1.B1_UCOM     AS product_last_price_date,
+                    SB1.B1_CUSTD    AS standard_cost
+                FROM codes
+                LEFT JOIN last_purchase LP
+                    ON LP.product_code = codes.product_code
+                AND LP.rn = 1
+                LEFT JOIN SB1010 SB1 WITH (NOLOCK)
+                    ON SB1.B1_COD = codes.product_code
+                AND SB1.D_E_L_E_T_ = ''
+            """
+
+            for r in self.execute_query(sql, tuple(chunk)):
+                if r["last_price"] not in ("", None):
+                    price, source, price_date = float(r["last_price"]), "last_purchase", r["last_price_date"]
+                elif r["product_last_price"] not in ("", None) and float(r["product_last_price"]) > 0:
+                    price, source, price_date = float(r["product_last_price"]), "product_last_price", r["product_last_price_date"]
+                elif r["standard_cost"] not in ("", None) and float(r["standard_cost"]) > 0:
+                    price, source, price_date = float(r["standard_cost"]), "standard_cost", None
+                else:
+                    price, source, price_date = 0.0, None, None
+
+                result[r["product_code"]] = {
+                    "unit_price": price,
+                    "price_source": source,
+                    "price_date": price_date,
+                    "supplier_code": r["supplier_code"] if source == "last_purchase" else None
+                }
+
+        return result
+
+    def get_cost_rollup(self, code: str, quantity: float = 1.0) -> dict:
+        """
+        Rolled-up material cost of `code`: leaf prices are fetched in one
+        batched query, multiplied by the BOM quantities and summed bottom-up
+        through the intermediate products (each node computed once).
+        """
+        if quantity <= 0:
+            raise ValueError("quantity must be > 0")
+
+        log_info(f"Calculando custo acumulado da estrutura de {code} (qtd={quantity})")
+
+        edges = self.list_bom_edges(code)
+        graph, meta = self._bom_graph(edges, roots=(code,))
+        level = graph.levels(code)
+
+        leaf_indexes = [i for i in graph.leaves(code) if level[i] > 0]
+        prices = self.list_last_purchase_prices([graph.codes[i] for i in leaf_indexes]) if leaf_indexes else {}
+
+        leaf_price = np.zeros(len(graph), dtype=np.float64)
+        for i in leaf_indexes:
+            leaf_price[i] = prices.get(graph.codes[i], {}).get("unit_price", 0.0)
+
+        unit_cost = graph.rollup(code, leaf_price)
+        required = graph.explode(code, quantity)
+
+        data = []
+        missing_prices = 0
+        for i, node_code in enumerate(graph.codes):
+            if level[i] <= 0:
+                continue
+
+            is_leaf = not graph.children[i]
+            price = prices.get(node_code, {}) if is_leaf else {}
+            if is_leaf and not price.get("price_source"):
+                missing_prices += 1
+
+            node_meta = meta.get(node_code, {})
+            data.append({
+                "code": node_code,
+                "description": node_meta.get("description"),
+                "type": node_meta.get("type"),
+                "unit": node_meta.get("unit"),
+                "bom_level": int(level[i]),
+                "is_leaf": is_leaf,
+                "required_quantity": float(required[i]),
+                "unit_cost": float(unit_cost[i]),
+                "extended_cost": float(required[i] * unit_cost[i]) if is_leaf else None,
+                "price_source": price.get("price_source"),
+                "price_date": price.get("price_date"),
+                "supplier_code": price.get("supplier_code")
+            })
+
+        data.sort(key=lambda n: (n["bom_level"], n["code"]))
+        root_unit_cost = float(unit_cost[graph.index[code]])
+
+        return {
+            "success": True,
+            "code": code,
+            "description": meta.get(code, {}).get("description"),
+            "quantity": quantity,
+            "unit_cost": root_unit_cost,
+            "total_cost": root_unit_cost * quantity,
+            "missing_prices": missing_prices,
+            "cycles": graph.cycles,
+            "total": len(data),
+            "data": data
+        }
+
+
+    # -------------------------------
+    # 🔹 STRUCTURE (BOM) - CYCLE AUDIT
+    # -------------------------------
+    def list_bom_cycles(self) -> dict:
+        """
+        Scans every active SG1010 relation in a single query and returns the
+        groups of products that reference each other (strongly connected
+        components), each with one example cycle path.
+        """
+        query = """
+            SELECT DISTINCT
+                G1_COD  AS parent_code,
+                G1_COMP AS component_code
+            FROM SG1010 WITH (NOLOCK)
+            WHERE D_E_L_E_T_ = ''
+            AND G1_FIM > CONVERT(CHAR(8), GETDATE(), 112);
+        """
+
+        graph = BomGraph(
+            (r["parent_code"], r["component_code"], 1.0)
+            for r in self.iter_query(query, batch_size=5000)
+        )
+
+        data = [
+            {
+                "codes": component,
+                "size": len(component),
+                "example_path": graph.cycle_path(component)
+            }
+            for component in graph.strongly_connected_components()
+        ]
+        data.sort(key=lambda c: (-c["size"], c["codes"][0]))
+
+        return {
+            "success": True,
+            "total": len(data),
+            "total_products": len(graph),
+            "total_edges": int(graph.src.size),
+            "data": data
+        }
+
+
     # -------------------------------
     # 🔹 PARENTS (WHERE USED)
     # -------------------------------
@@ -717,7 +1892,9 @@ class ProductRepository(BaseRepository):
                     G1_COD   AS parent_code,
                     G1_COMP  AS child_code,
                     G1_QUANT AS quantity,
-                    1        AS level
+                    1        AS level,
+                    CAST('/' + RTRIM(G1_COMP) + '/' + RTRIM(G1_COD) + '/' AS VARCHAR(MAX)) AS bom_path,
+                    CASE WHEN G1_COD = G1_COMP THEN 1 ELSE 0 END AS is_cycle
                 FROM SG1010 WITH (NOLOCK)
                 WHERE D_E_L_E_T_ = ''
                 AND G1_COMP = ?
@@ -728,12 +1905,15 @@ class ProductRepository(BaseRepository):
                     c.G1_COD   AS parent_code,
                     c.G1_COMP  AS child_code,
                     c.G1_QUANT AS quantity,
-                    p.level + 1 AS level
+                    p.level + 1 AS level,
+                    CAST(p.bom_path + RTRIM(c.G1_COD) + '/' AS VARCHAR(MAX)),
+                    CASE WHEN CHARINDEX('/' + RTRIM(c.G1_COD) + '/', p.bom_path) > 0 THEN 1 ELSE 0 END
                 FROM SG1010 c WITH (NOLOCK)
                 INNER JOIN recursive_parents p
                     ON p.parent_code = c.G1_COMP
                 WHERE c.D_E_L_E_T_ = ''
                 AND p.level < ?
+                AND p.is_cycle = 0
             )
             SELECT 
                 rp.parent_code,
@@ -747,7 +1927,8 @@ class ProductRepository(BaseRepository):
                 child.B1_UM    AS child_unit,
 
                 rp.quantity,
-                rp.level
+                rp.level,
+                rp.is_cycle
             FROM recursive_parents rp
             LEFT JOIN SB1010 parent WITH (NOLOCK)
                 ON parent.B1_COD = rp.parent_code
@@ -793,6 +1974,11 @@ class ProductRepository(BaseRepository):
             # attach parent to child
             items[child_code]["parents"].append(parent_node)
 
+            # Cycle-closing edge: shown but never expanded nor indexed
+            if r["is_cycle"]:
+                parent_node["cycle"] = True
+                continue
+
             # index parent globally
             items[parent_node["code"]] = parent_node
 
@@ -818,11 +2004,103 @@ class ProductRepository(BaseRepository):
 
         return {
             "success": True,
-            "total": len(root_parents),
-            "page": page,
-            "page_size": page_size,
-            "total_pages": math.ceil(len(root_parents) / page_size),
-            "data": root
+            "total": len(root_parents),
+            "page": page,
+            "page_size": page_size,
+            "total_pages": math.ceil(len(root_parents) / page_size),
+            "data": root
+        }
+
+
+    # -------------------------------
+    # 🔹 WHERE USED - IMPACT
+    # -------------------------------
+    def list_where_used_edges(self, code: str, max_depth: int = 50) -> list[dict]:
+        """
+        Returns each active SG1010 edge (parent → component) on the way up
+        from `code` to its top-level products exactly once, with SB1010
+        data for both sides. Shared parents yield a single set of edges.
+
+        Same distinct-code frontier as list_bom_edges_bulk, walking up
+        (the parents of each level form the next one).
+        """
+        edges = self._expand_frontier(
+            [code], max_depth,
+            lambda codes: self._bom_edges_of(codes, upward=True),
+            "parent_code"
+        )
+        edges.sort(key=lambda r: (r["parent_code"], r["component_code"]))
+        return edges
+
+    def get_where_used_impact(
+        self,
+        code: str,
+        max_depth: int = 50,
+        include_intermediate: bool = False
+    ) -> dict:
+        """
+        Returns the top-level products (no active parent) affected by a
+        change in `code`, each with how many units of `code` one unit of
+        it consumes (summed over every path) and the number of paths.
+
+        Computed on the reverse adjacency of the distinct where-used edges,
+        so each ancestor is evaluated once regardless of how many paths
+        lead to it. Intermediate assemblies are included on request.
+
+        Ancestors reached only at `max_depth` had their parents cut off by
+        the query: they are reported with `truncated: true` (never as
+        top-level), since their own top-level products are unknown.
+        """
+        if not 1 <= max_depth <= 50:
+            raise ValueError("max_depth must be between 1 and 50")
+
+        edges = self.list_where_used_edges(code, max_depth)
+        graph, meta = self._bom_graph(edges)
+
+        # Before dropping cycle-closing edges: a node whose only parents
+        # close a cycle still has an active parent
+        distance = graph.distances(code, upward=True)
+        has_parent = [bool(p) for p in graph.parents]
+        cycles = graph.drop_back_edges(code, upward=True)
+
+        multiplier, paths, level = graph.where_used(code)
+
+        data = []
+        for i in np.flatnonzero(level > 0).tolist():
+            truncated = not has_parent[i] and distance[i] >= max_depth
+            top_level = not has_parent[i] and not truncated
+            if not (top_level or truncated or include_intermediate):
+                continue
+
+            node_code = graph.codes[i]
+            node_meta = meta.get(node_code, {})
+            data.append({
+                "code": node_code,
+                "description": node_meta.get("description"),
+                "type": node_meta.get("type"),
+                "unit": node_meta.get("unit"),
+                "top_level": top_level,
+                "truncated": truncated,
+                "bom_level": int(level[i]),
+                "quantity_per_unit": float(multiplier[i]),
+                "paths": int(paths[i])
+            })
+
+        data.sort(key=lambda n: (not n["top_level"], n["code"]))
+        total_top_level = sum(1 for n in data if n["top_level"])
+        total_truncated = sum(1 for n in data if n["truncated"])
+
+        return {
+            "success": True,
+            "code": code,
+            "description": meta.get(code, {}).get("description"),
+            "max_depth": max_depth,
+            "total": len(data),
+            "total_top_level": total_top_level,
+            "total_truncated": total_truncated,
+            "total_edges": len(edges),
+            "cycles": cycles,
+            "data": data
         }
 
 
@@ -920,7 +2198,9 @@ class ProductRepository(BaseRepository):
                     G1_COD   AS parent_code,
                     G1_COMP  AS component_code,
                     G1_QUANT AS quantity,
-                    1        AS bom_level
+                    1        AS bom_level,
+                    CAST('/' + RTRIM(G1_COD) + '/' + RTRIM(G1_COMP) + '/' AS VARCHAR(MAX)) AS bom_path,
+                    CASE WHEN G1_COD = G1_COMP THEN 1 ELSE 0 END AS is_cycle
                 FROM SG1010 WITH (NOLOCK)
                 WHERE D_E_L_E_T_ = ''
                 AND G1_COD = ?
@@ -932,12 +2212,15 @@ class ProductRepository(BaseRepository):
                     c.G1_COD,
                     c.G1_COMP,
                     c.G1_QUANT,
-                    p.bom_level + 1
+                    p.bom_level + 1,
+                    CAST(p.bom_path + RTRIM(c.G1_COMP) + '/' AS VARCHAR(MAX)),
+                    CASE WHEN CHARINDEX('/' + RTRIM(c.G1_COMP) + '/', p.bom_path) > 0 THEN 1 ELSE 0 END
                 FROM SG1010 c WITH (NOLOCK)
                 INNER JOIN recursive_bom p
                     ON p.component_code = c.G1_COD
                 WHERE c.D_E_L_E_T_ = ''
                 AND p.bom_level < ?
+                AND p.is_cycle = 0
                 AND c.G1_FIM > CONVERT(CHAR(8), GETDATE(), 112)
             )
             SELECT 
@@ -952,7 +2235,8 @@ class ProductRepository(BaseRepository):
                 RTRIM(comp.B1_UM)   AS component_unit,
 
                 rb.quantity,
-                rb.bom_level
+                rb.bom_level,
+                rb.is_cycle
             FROM recursive_bom rb
             LEFT JOIN SB1010 parent WITH (NOLOCK)
                 ON parent.B1_COD = rb.parent_code
@@ -1029,6 +2313,12 @@ class ProductRepository(BaseRepository):
                 }
 
             items[parent_code]["components"].append(component_node)
+
+            # Cycle-closing edge: shown but never expanded nor indexed
+            if r["is_cycle"]:
+                component_node["cycle"] = True
+                continue
+
             items[comp_code] = component_node
 
         root = items.get(code, {
@@ -1060,7 +2350,8 @@ class ProductRepository(BaseRepository):
         self,
         code: str,
         page: int = 1,
-        page_size: int = 50
+        page_size: int = 50,
+        shape: str = "records"
     ) -> dict:
 
         if page < 1:
@@ -1182,9 +2473,10 @@ class ProductRepository(BaseRepository):
             OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
         """
 
-        rows = self.execute_query(
+        rows = self.execute_shaped(
             sql,
-            (code, code, code, offset, page_size)
+            (code, code, code, offset, page_size),
+            shape
         )
 
         return {
@@ -1193,31 +2485,47 @@ class ProductRepository(BaseRepository):
             "page": page,
             "page_size": page_size,
             "total_pages": (total + page_size - 1) // page_size,
-            "data": rows
+            **rows
         }
 
 
     # -------------------------------
     # 🔹 INBOUND INVOICE ITEMS (Notas Fiscais de Entrada)
     # -------------------------------
-    def list_inbound_invoice_items(
+    _INBOUND_INVOICE_ITEMS_COLUMNS = {
+        "branch": "SD1.D1_FILIAL",
+        "invoice_number": "SD1.D1_DOC",
+        "invoice_series": "SD1.D1_SERIE",
+        "item": "SD1.D1_ITEM",
+        "issue_date": "SD1.D1_EMISSAO",
+
+        "product_code": "SD1.D1_COD",
+        "product_description": "SB1.B1_DESC",
+        "unit": "SB1.B1_UM",
+
+        "supplier_code": "SD1.D1_FORNECE",
+        "supplier_name": "SA2.A2_NOME",
+
+        "quantity": "SD1.D1_QUANT",
+        "unit_price": "CASE WHEN SD1.D1_QUANT <> 0 THEN SD1.D1_TOTAL / SD1.D1_QUANT ELSE 0 END",
+        "total_value": "SD1.D1_TOTAL",
+    }
+
+    def _inbound_invoice_items_query(
         self,
         code: str,
-        page: int = 1,
-        page_size: int = 50,
         issue_date_start: Optional[str] = None,
         issue_date_end: Optional[str] = None,
         supplier: Optional[str] = None,
-        branch: Optional[str] = None
-    ) -> dict:
-
-        if page < 1:
-            raise ValueError("page must be >= 1")
-        if not 1 <= page_size <= 500:
-            raise ValueError("page_size must be between 1 and 500")
-
-        offset = (page - 1) * page_size
-
+        branch: Optional[str] = None,
+        fields: Optional[str] = None
+    ) -> tuple[str, str, list, dict]:
+        """
+        Builds the SD1010 count/data queries (data without pagination)
+        shared by the listing and the CSV/Parquet export. `fields` limits
+        the selected columns (aliases of _INBOUND_INVOICE_ITEMS_COLUMNS).
+        Returns (count_sql, data_sql, params, filters).
+        """
         filters = []
         params = [code]
 
@@ -1248,30 +2556,9 @@ class ProductRepository(BaseRepository):
             AND SD1.D1_COD = ? {where_extra}
         """
 
-        total = int(self.execute_one(count_sql, tuple(params))["total"] or 0)
-
         data_sql = f"""
             SELECT
-                SD1.D1_FILIAL    AS branch,
-                SD1.D1_DOC       AS invoice_number,
-                SD1.D1_SERIE     AS invoice_series,
-                SD1.D1_ITEM      AS item,
-                SD1.D1_EMISSAO   AS issue_date,
-
-                SD1.D1_COD       AS product_code,
-                SB1.B1_DESC      AS product_description,
-                SB1.B1_UM        AS unit,
-
-                SD1.D1_FORNECE   AS supplier_code,
-                SA2.A2_NOME      AS supplier_name,
-
-                SD1.D1_QUANT     AS quantity,
-                CASE 
-                    WHEN SD1.D1_QUANT <> 0 
-                    THEN SD1.D1_TOTAL / SD1.D1_QUANT 
-                    ELSE 0 
-                END              AS unit_price,
-                SD1.D1_TOTAL     AS total_value
+                {self._select_list(self._INBOUND_INVOICE_ITEMS_COLUMNS, fields)}
 
             FROM SD1010 SD1
             INNER JOIN SB1010 SB1
@@ -1284,12 +2571,45 @@ class ProductRepository(BaseRepository):
             WHERE SD1.D_E_L_E_T_ = ''
             AND SD1.D1_COD = ? {where_extra}
             ORDER BY SD1.D1_EMISSAO DESC
-            OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
         """
 
-        rows = self.execute_query(
-            data_sql,
-            tuple(params + [offset, page_size])
+        return count_sql, data_sql, params, {
+            "issue_date_start": issue_date_start,
+            "issue_date_end": issue_date_end,
+            "supplier": supplier,
+            "branch": branch
+        }
+
+    def list_inbound_invoice_items(
+        self,
+        code: str,
+        page: int = 1,
+        page_size: int = 50,
+        issue_date_start: Optional[str] = None,
+        issue_date_end: Optional[str] = None,
+        supplier: Optional[str] = None,
+        branch: Optional[str] = None,
+        fields: Optional[str] = None,
+        shape: str = "records"
+    ) -> dict:
+
+        if page < 1:
+            raise ValueError("page must be >= 1")
+        if not 1 <= page_size <= 500:
+            raise ValueError("page_size must be between 1 and 500")
+
+        offset = (page - 1) * page_size
+
+        count_sql, data_sql, params, filters = self._inbound_invoice_items_query(
+            code, issue_date_start, issue_date_end, supplier, branch, fields
+        )
+
+        total = int(self.execute_one(count_sql, tuple(params))["total"] or 0)
+
+        rows = self.execute_shaped(
+            data_sql + "\n            OFFSET ? ROWS FETCH NEXT ? ROWS ONLY",
+            tuple(params + [offset, page_size]),
+            shape
         )
 
         return {
@@ -1298,15 +2618,28 @@ class ProductRepository(BaseRepository):
             "page": page,
             "page_size": page_size,
             "total_pages": (total + page_size - 1) // page_size,
-            "filters": {
-                "issue_date_start": issue_date_start,
-                "issue_date_end": issue_date_end,
-                "supplier": supplier,
-                "branch": branch
-            },
-            "data": rows
+            "filters": filters,
+            **rows
         }
 
+    def iter_inbound_invoice_items_batches(
+        self,
+        code: str,
+        issue_date_start: Optional[str] = None,
+        issue_date_end: Optional[str] = None,
+        supplier: Optional[str] = None,
+        branch: Optional[str] = None,
+        fields: Optional[str] = None
+    ):
+        """
+        Streams every inbound invoice item matching the filters as raw
+        fetchmany batches (see BaseRepository.iter_batches).
+        """
+        _, data_sql, params, _ = self._inbound_invoice_items_query(
+            code, issue_date_start, issue_date_end, supplier, branch, fields
+        )
+        return self.iter_batches(data_sql, tuple(params))
+
 
     # -------------------------------
     # 🔹 OUTBOUND INVOICE ITEMS (Notas Fiscais de Saída)
@@ -1418,22 +2751,35 @@ class ProductRepository(BaseRepository):
     # -------------------------------
     # 🔹 STOCK + LOCALIZAÇÃO FÍSICA (SB2010 + SBZ010)
     # -------------------------------
-    def list_stock(
+    _STOCK_COLUMNS = {
+        "product_code": "SB2.B2_COD",
+        "branch": "SB2.B2_FILIAL",
+        "warehouse": "SB2.B2_LOCAL",
+        "current_quantity": "SB2.B2_QATU",
+        "committed_quantity": "SB2.B2_QEMP",
+        "reserved_quantity": "SB2.B2_RESERVA",
+        "available_quantity": "(SB2.B2_QATU - SB2.B2_QEMP - SB2.B2_RESERVA)",
+
+        # Physical location (SBZ)
+        "physical_location": "SBZ.BZ_MPLOCAL",
+        "default_warehouse": "SBZ.BZ_LOCPAD",
+        "cost_center": "SBZ.BZ_CUSTO",
+        "warehouse_section": "SBZ.BZ_GALPAO",
+    }
+
+    def _stock_query(
         self,
         code: str,
-        page: int = 1,
-        page_size: int = 50,
         branch: Optional[str] = None,
-        location: Optional[str] = None
-    ) -> dict:
-
-        if page < 1:
-            raise ValueError("page must be >= 1")
-        if not 1 <= page_size <= 500:
-            raise ValueError("page_size must be between 1 and 500")
-
-        offset = (page - 1) * page_size
-
+        location: Optional[str] = None,
+        fields: Optional[str] = None
+    ) -> tuple[str, str, list, dict]:
+        """
+        Builds the SB2010 count/data queries (data without pagination)
+        shared by the listing and the CSV/Parquet export. `fields` limits
+        the selected columns (aliases of _STOCK_COLUMNS).
+        Returns (count_sql, data_sql, params, filters).
+        """
         filters = [
             "SB2.D_E_L_E_T_ = ''",
             "SB2.B2_COD = ?"
@@ -1459,26 +2805,12 @@ class ProductRepository(BaseRepository):
             WHERE {where_clause}
         """
 
-        total = int(self.execute_one(count_sql, tuple(params))["total"] or 0)
-
         # -------------------------------
         # DATA
         # -------------------------------
         data_sql = f"""
             SELECT
-                SB2.B2_COD      AS product_code,
-                SB2.B2_FILIAL   AS branch,
-                SB2.B2_LOCAL    AS warehouse,
-                SB2.B2_QATU     AS current_quantity,
-                SB2.B2_QEMP     AS committed_quantity,
-                SB2.B2_RESERVA  AS reserved_quantity,
-                (SB2.B2_QATU - SB2.B2_QEMP - SB2.B2_RESERVA) AS available_quantity,
-
-                -- Physical location (SBZ)
-                SBZ.BZ_MPLOCAL  AS physical_location,
-                SBZ.BZ_LOCPAD   AS default_warehouse,
-                SBZ.BZ_CUSTO    AS cost_center,
-                SBZ.BZ_GALPAO   AS warehouse_section
+                {self._select_list(self._STOCK_COLUMNS, fields)}
 
             FROM SB2010 SB2
             LEFT JOIN SBZ010 SBZ
@@ -1487,12 +2819,39 @@ class ProductRepository(BaseRepository):
 
             WHERE {where_clause}
             ORDER BY SB2.B2_FILIAL, SB2.B2_LOCAL
-            OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
         """
 
-        rows = self.execute_query(
-            data_sql,
-            tuple(params + [offset, page_size])
+        return count_sql, data_sql, params, {
+            "branch": branch,
+            "location": location
+        }
+
+    def list_stock(
+        self,
+        code: str,
+        page: int = 1,
+        page_size: int = 50,
+        branch: Optional[str] = None,
+        location: Optional[str] = None,
+        fields: Optional[str] = None,
+        shape: str = "records"
+    ) -> dict:
+
+        if page < 1:
+            raise ValueError("page must be >= 1")
+        if not 1 <= page_size <= 500:
+            raise ValueError("page_size must be between 1 and 500")
+
+        offset = (page - 1) * page_size
+
+        count_sql, data_sql, params, filters = self._stock_query(code, branch, location, fields)
+
+        total = int(self.execute_one(count_sql, tuple(params))["total"] or 0)
+
+        rows = self.execute_shaped(
+            data_sql + "\n            OFFSET ? ROWS FETCH NEXT ? ROWS ONLY",
+            tuple(params + [offset, page_size]),
+            shape
         )
 
         return {
@@ -1501,6 +2860,140 @@ class ProductRepository(BaseRepository):
             "page": page,
             "page_size": page_size,
             "total_pages": (total + page_size - 1) // page_size,
+            "filters": filters,
+            **rows
+        }
+
+    def iter_stock_batches(
+        self,
+        code: str,
+        branch: Optional[str] = None,
+        location: Optional[str] = None,
+        fields: Optional[str] = None
+    ):
+        """
+        Streams every SB2010 balance of `code` matching the filters as raw
+        fetchmany batches (see BaseRepository.iter_batches).
+        """
+        _, data_sql, params, _ = self._stock_query(code, branch, location, fields)
+        return self.iter_batches(data_sql, tuple(params))
+
+
+    # -------------------------------
+    # 🔹 STOCK BULK (SB2010 — vários produtos)
+    # -------------------------------
+    def iter_stock_bulk(
+        self,
+        codes: list[str],
+        branch: Optional[str] = None,
+        location: Optional[str] = None
+    ):
+        """
+        Yields SB2010 availability per product for many codes at once.
+
+        Each block of codes is resolved by a single set-based query; the
+        per-product totals come from window aggregates in the same query,
+        so products are emitted as soon as their rows are read.
+        """
+        codes = self._unique_codes(codes)
+        if not codes:
+            raise ValueError("At least one product code must be provided")
+
+        for chunk in self._chunked(codes, self.MAX_IN_PARAMS):
+            placeholders = ",".join(["?" for _ in chunk])
+
+            filters = [
+                "SB2.D_E_L_E_T_ = ''",
+                f"SB2.B2_COD IN ({placeholders})"
+            ]
+            params = list(chunk)
+
+            if branch:
+                filters.append("SB2.B2_FILIAL = ?")
+                params.append(branch)
+
+            if location:
+                filters.append("SB2.B2_LOCAL = ?")
+                params.append(location)
+
+            where_clause = " AND ".join(filters)
+
+            data_sql = f"""
+                SELECT
+                    SB2.B2_COD      AS product_code,
+                    SB2.B2_FILIAL   AS branch,
+                    SB2.B2_LOCAL    AS warehouse,
+                    SB2.B2_QATU     AS current_quantity,
+                    SB2.B2_QEMP     AS committed_quantity,
+                    SB2.B2_RESERVA  AS reserved_quantity,
+                    (SB2.B2_QATU - SB2.B2_QEMP - SB2.B2_RESERVA) AS available_quantity,
+
+                    SUM(SB2.B2_QATU)    OVER (PARTITION BY SB2.B2_COD) AS total_current_quantity,
+                    SUM(SB2.B2_QEMP)    OVER (PARTITION BY SB2.B2_COD) AS total_committed_quantity,
+                    SUM(SB2.B2_RESERVA) OVER (PARTITION BY SB2.B2_COD) AS total_reserved_quantity,
+                    SUM(SB2.B2_QATU - SB2.B2_QEMP - SB2.B2_RESERVA)
+                        OVER (PARTITION BY SB2.B2_COD)                 AS total_available_quantity
+
+                FROM SB2010 SB2 WITH (NOLOCK)
+                WHERE {where_clause}
+                ORDER BY SB2.B2_COD, SB2.B2_FILIAL, SB2.B2_LOCAL
+            """
+
+            found: set[str] = set()
+            current = None
+
+            for r in self.iter_query(data_sql, tuple(params)):
+                if current is None or current["product_code"] != r["product_code"]:
+                    if current is not None:
+                        yield current
+                    found.add(r["product_code"])
+                    current = {
+                        "product_code": r["product_code"],
+                        "total_current_quantity": float(r["total_current_quantity"] or 0),
+                        "total_committed_quantity": float(r["total_committed_quantity"] or 0),
+                        "total_reserved_quantity": float(r["total_reserved_quantity"] or 0),
+                        "total_available_quantity": float(r["total_available_quantity"] or 0),
+                        "warehouses": []
+                    }
+
+                current["warehouses"].append({
+                    "branch": r["branch"],
+                    "warehouse": r["warehouse"],
+                    "current_quantity": float(r["current_quantity"] or 0),
+                    "committed_quantity": float(r["committed_quantity"] or 0),
+                    "reserved_quantity": float(r["reserved_quantity"] or 0),
+                    "available_quantity": float(r["available_quantity"] or 0)
+                })
+
+            if current is not None:
+                yield current
+
+            # Products without any SB2010 row are reported with zero stock
+            for code in chunk:
+                if code not in found:
+                    yield {
+                        "product_code": code,
+                        "total_current_quantity": 0.0,
+                        "total_committed_quantity": 0.0,
+                        "total_reserved_quantity": 0.0,
+                        "total_available_quantity": 0.0,
+                        "warehouses": []
+                    }
+
+    def list_stock_bulk(
+        self,
+        codes: list[str],
+        branch: Optional[str] = None,
+        location: Optional[str] = None
+    ) -> dict:
+        """
+        Returns SB2010 availability for many products (see iter_stock_bulk).
+        """
+        rows = list(self.iter_stock_bulk(codes, branch, location))
+
+        return {
+            "success": True,
+            "total": len(rows),
             "filters": {
                 "branch": branch,
                 "location": location
@@ -1542,7 +3035,9 @@ class ProductRepository(BaseRepository):
                 SELECT
                     G1_COD  AS parent_code,
                     G1_COMP AS product_code,
-                    1       AS bom_level
+                    1       AS bom_level,
+                    CAST('/' + RTRIM(G1_COD) + '/' + RTRIM(G1_COMP) + '/' AS VARCHAR(MAX)) AS bom_path,
+                    CASE WHEN G1_COD = G1_COMP THEN 1 ELSE 0 END AS is_cycle
                 FROM SG1010
                 WHERE D_E_L_E_T_ = ''
                 AND G1_COD = ?
@@ -1552,12 +3047,15 @@ class ProductRepository(BaseRepository):
                 SELECT
                     C.G1_COD,
                     C.G1_COMP,
-                    B.bom_level + 1
+                    B.bom_level + 1,
+                    CAST(B.bom_path + RTRIM(C.G1_COMP) + '/' AS VARCHAR(MAX)),
+                    CASE WHEN CHARINDEX('/' + RTRIM(C.G1_COMP) + '/', B.bom_path) > 0 THEN 1 ELSE 0 END
                 FROM SG1010 C
                 INNER JOIN RECURSIVE_BOM B
                     ON B.product_code = C.G1_COD
                 WHERE C.D_E_L_E_T_ = ''
                 AND B.bom_level < ?
+                AND B.is_cycle = 0
             ),
             CODES AS (
                 SELECT ? AS product_code, 0 AS bom_level
@@ -1583,7 +3081,9 @@ class ProductRepository(BaseRepository):
                 SELECT
                     G1_COD  AS parent_code,
                     G1_COMP AS product_code,
-                    1       AS bom_level
+                    1       AS bom_level,
+                    CAST('/' + RTRIM(G1_COD) + '/' + RTRIM(G1_COMP) + '/' AS VARCHAR(MAX)) AS bom_path,
+                    CASE WHEN G1_COD = G1_COMP THEN 1 ELSE 0 END AS is_cycle
                 FROM SG1010
                 WHERE D_E_L_E_T_ = ''
                 AND G1_COD = ?
@@ -1593,12 +3093,15 @@ class ProductRepository(BaseRepository):
                 SELECT
                     C.G1_COD,
                     C.G1_COMP,
-                    B.bom_level + 1
+                    B.bom_level + 1,
+                    CAST(B.bom_path + RTRIM(C.G1_COMP) + '/' AS VARCHAR(MAX)),
+                    CASE WHEN CHARINDEX('/' + RTRIM(C.G1_COMP) + '/', B.bom_path) > 0 THEN 1 ELSE 0 END
                 FROM SG1010 C
                 INNER JOIN RECURSIVE_BOM B
                     ON B.product_code = C.G1_COD
                 WHERE C.D_E_L_E_T_ = ''
                 AND B.bom_level < ?
+                AND B.is_cycle = 0
             ),
             CODES AS (
                 SELECT ? AS product_code, 0 AS bom_level
@@ -1680,12 +3183,18 @@ class ProductRepository(BaseRepository):
     def list_inspection_definition(
         self,
         code: str,
-        max_depth: int = 10
-    ) -> dict:
+        max_depth: int = 10,
+        raw: bool = False
+    ) -> Union[dict, bytes]:
         """
         Returns the INSPECTION DEFINITION (QP6, QP7, QP8) of a product
         and its components according to SG1010.
 
+        The JSON is built entirely by SQL Server (trimmed strings, nested
+        blocks via JSON_QUERY). With raw=True the UTF-8 JSON document is
+        returned as bytes, untouched, so it can be written straight into
+        the HTTP response.
+
         ⚠️ DOES NOT return:
             - inspection history
             - results
@@ -1716,7 +3225,9 @@ class ProductRepository(BaseRepository):
             SELECT
                 G1.G1_COD  AS root_code,
                 G1.G1_COMP AS product_code,
-                1          AS bom_level
+                1          AS bom_level,
+                CAST('/' + RTRIM(G1.G1_COD) + '/' + RTRIM(G1.G1_COMP) + '/' AS VARCHAR(MAX)) AS bom_path,
+                CASE WHEN G1.G1_COD = G1.G1_COMP THEN 1 ELSE 0 END AS is_cycle
             FROM SG1010 G1 WITH (NOLOCK)
             WHERE G1.D_E_L_E_T_ = ''
             AND G1.G1_COD = @product_code
@@ -1726,12 +3237,15 @@ class ProductRepository(BaseRepository):
             SELECT
                 B.root_code,
                 G1.G1_COMP,
-                B.bom_level + 1
+                B.bom_level + 1,
+                CAST(B.bom_path + RTRIM(G1.G1_COMP) + '/' AS VARCHAR(MAX)),
+                CASE WHEN CHARINDEX('/' + RTRIM(G1.G1_COMP) + '/', B.bom_path) > 0 THEN 1 ELSE 0 END
             FROM SG1010 G1 WITH (NOLOCK)
             INNER JOIN bom_recursive B
                 ON B.product_code = G1.G1_COD
             WHERE G1.D_E_L_E_T_ = ''
             AND B.bom_level < @max_depth
+            AND B.is_cycle = 0
         ),
 
         product_scope AS (
@@ -1771,10 +3285,11 @@ class ProductRepository(BaseRepository):
         SELECT
         (
             SELECT
+                CAST(1 AS BIT) AS success,
                 COUNT(*) AS total,
-                (
+                JSON_QUERY(ISNULL((
                     SELECT
-                        I.product_code,
+                        RTRIM(I.product_code) AS product_code,
                         I.bom_level,
 
                         CASE
@@ -1799,82 +3314,82 @@ class ProductRepository(BaseRepository):
                         -- =========================
                         -- QP6 — Inspection header
                         -- =========================
-                        (
+                        JSON_QUERY((
                             SELECT
-                                QP6.QP6_PRODUT  AS product_code,
-                                QP6.QP6_REVI    AS revision,
-                                QP6.QP6_REVINV  AS review_invalid,
-                                QP6.QP6_DESCPO  AS description,
-                                QP6.QP6_DTCAD   AS created_at,
-                                QP6.QP6_DTINI   AS start_date,
-                                QP6.QP6_CADR    AS created_by,
+                                RTRIM(QP6.QP6_PRODUT) AS product_code,
+                                RTRIM(QP6.QP6_REVI) AS revision,
+                                RTRIM(QP6.QP6_REVINV) AS review_invalid,
+                                RTRIM(QP6.QP6_DESCPO) AS description,
+                                RTRIM(QP6.QP6_DTCAD) AS created_at,
+                                RTRIM(QP6.QP6_DTINI) AS start_date,
+                                RTRIM(QP6.QP6_CADR) AS created_by,
                                 QP6.QP6_PTOLER  AS tolerance_percent,
-                                QP6.QP6_TIPO    AS inspection_type,
-                                QP6.QP6_DOCOBR  AS requires_document,
-                                QP6.QP6_SITPRD  AS product_status,
-                                QP6.QP6_DESSTP  AS status_description,
-                                QP6.QP6_UNMED1  AS unit
+                                RTRIM(QP6.QP6_TIPO) AS inspection_type,
+                                RTRIM(QP6.QP6_DOCOBR) AS requires_document,
+                                RTRIM(QP6.QP6_SITPRD) AS product_status,
+                                RTRIM(QP6.QP6_DESSTP) AS status_description,
+                                RTRIM(QP6.QP6_UNMED1) AS unit
                             FROM QP6010 QP6 WITH (NOLOCK)
                             WHERE QP6.D_E_L_E_T_ = ''
                             AND QP6.QP6_PRODUT = I.product_code
                             AND QP6.QP6_REVI = I.revision
                             FOR JSON PATH, WITHOUT_ARRAY_WRAPPER
-                        ) AS qp6,
+                        )) AS qp6,
 
                         -- =========================
                         -- QP7 — Measurable tests
                         -- =========================
-                        (
+                        JSON_QUERY((
                             SELECT
-                                QP7.QP7_PRODUT  AS product_code,
-                                QP7.QP7_REVI    AS revision,
-                                QP7.QP7_ENSAIO  AS test_code,
-                                QP7.QP7_LABOR   AS labor,
-                                QP7.QP7_SEQLAB  AS sequence,
-                                QP7.QP7_UNIMED  AS unit,
-                                QP7.QP7_MINMAX  AS min_max_type,
-                                QP7.QP7_NOMINA  AS nominal_value,
-                                QP7.QP7_LIE     AS lower_spec_limit,
-                                QP7.QP7_LSE     AS upper_spec_limit,
-                                QP7.QP7_LIC     AS lower_control_limit,
-                                QP7.QP7_LSC     AS upper_control_limit,
-                                QP7.QP7_CODREC  AS reaction_code,
-                                QP7.QP7_OPERAC  AS operation,
-                                QP7.QP7_ENSOBR  AS mandatory,
-                                QP7.QP7_CERTIF  AS certification
+                                RTRIM(QP7.QP7_PRODUT) AS product_code,
+                                RTRIM(QP7.QP7_REVI) AS revision,
+                                RTRIM(QP7.QP7_ENSAIO) AS test_code,
+                                RTRIM(QP7.QP7_LABOR) AS labor,
+                                RTRIM(QP7.QP7_SEQLAB) AS sequence,
+                                RTRIM(QP7.QP7_UNIMED) AS unit,
+                                RTRIM(QP7.QP7_MINMAX) AS min_max_type,
+                                RTRIM(QP7.QP7_NOMINA) AS nominal_value,
+                                RTRIM(QP7.QP7_LIE) AS lower_spec_limit,
+                                RTRIM(QP7.QP7_LSE) AS upper_spec_limit,
+                                RTRIM(QP7.QP7_LIC) AS lower_control_limit,
+                                RTRIM(QP7.QP7_LSC) AS upper_control_limit,
+                                RTRIM(QP7.QP7_CODREC) AS reaction_code,
+                                RTRIM(QP7.QP7_OPERAC) AS operation,
+                                RTRIM(QP7.QP7_ENSOBR) AS mandatory,
+                                RTRIM(QP7.QP7_CERTIF) AS certification
                             FROM QP7010 QP7 WITH (NOLOCK)
                             WHERE QP7.D_E_L_E_T_ = ''
                             AND QP7.QP7_PRODUT = I.product_code
                             AND QP7.QP7_REVI = I.revision
                             FOR JSON PATH
-                        ) AS qp7,
+                        )) AS qp7,
 
                         -- =========================
                         -- QP8 — Textual tests
                         -- =========================
-                        (
+                        JSON_QUERY((
                             SELECT
-                                QP8.QP8_PRODUT  AS product_code,
-                                QP8.QP8_REVI    AS revision,
-                                QP8.QP8_ENSAIO  AS test_code,
-                                QP8.QP8_LABOR   AS labor,
-                                QP8.QP8_SEQLAB  AS sequence,
-                                QP8.QP8_TEXTO   AS text,
-                                QP8.QP8_CODREC  AS reaction_code,
-                                QP8.QP8_OPERAC  AS operation,
-                                QP8.QP8_ENSOBR  AS mandatory,
-                                QP8.QP8_CERTIF  AS certification
+                                RTRIM(QP8.QP8_PRODUT) AS product_code,
+                                RTRIM(QP8.QP8_REVI) AS revision,
+                                RTRIM(QP8.QP8_ENSAIO) AS test_code,
+                                RTRIM(QP8.QP8_LABOR) AS labor,
+                                RTRIM(QP8.QP8_SEQLAB) AS sequence,
+                                RTRIM(QP8.QP8_TEXTO) AS text,
+                                RTRIM(QP8.QP8_CODREC) AS reaction_code,
+                                RTRIM(QP8.QP8_OPERAC) AS operation,
+                                RTRIM(QP8.QP8_ENSOBR) AS mandatory,
+                                RTRIM(QP8.QP8_CERTIF) AS certification
                             FROM QP8010 QP8 WITH (NOLOCK)
                             WHERE QP8.D_E_L_E_T_ = ''
                             AND QP8.QP8_PRODUT = I.product_code
                             AND QP8.QP8_REVI = I.revision
                             FOR JSON PATH
-                        ) AS qp8
+                        )) AS qp8
 
                     FROM inspection_scope I
                     ORDER BY I.bom_level, I.product_code
                     FOR JSON PATH
-                ) AS data
+                ), '[]')) AS data
             FROM inspection_scope
             FOR JSON PATH, WITHOUT_ARRAY_WRAPPER
         ) AS data;
@@ -1884,13 +3399,12 @@ class ProductRepository(BaseRepository):
         # Execution
         # ============================================================
         params = (code, max_depth)
-        result = self.execute_json(sql, params)
+        result = self.execute_json_raw(sql, params) or b'{"success":true,"total":0,"data":[]}'
 
-        return {
-            "success": True,
-            "total": result.get("total", 0),
-            "data": result.get("data", [])
-        }
+        if raw:
+            return result
+
+        return json.loads(result)
 
 
     # -------------------------------
@@ -1937,7 +3451,9 @@ class ProductRepository(BaseRepository):
             SELECT 
                 G1_COD AS parentCode,
                 G1_COMP AS productCode,
-                1 AS level
+                1 AS level,
+                CAST('/' + RTRIM(G1_COD) + '/' + RTRIM(G1_COMP) + '/' AS VARCHAR(MAX)) AS bomPath,
+                CASE WHEN G1_COD = G1_COMP THEN 1 ELSE 0 END AS isCycle
             FROM SG1010 WITH (NOLOCK)
             WHERE D_E_L_E_T_ = '' AND G1_COD = @code
 
@@ -1946,12 +3462,15 @@ class ProductRepository(BaseRepository):
             SELECT 
                 C.G1_COD,
                 C.G1_COMP,
-                P.level + 1
+                P.level + 1,
+                CAST(P.bomPath + RTRIM(C.G1_COMP) + '/' AS VARCHAR(MAX)),
+                CASE WHEN CHARINDEX('/' + RTRIM(C.G1_COMP) + '/', P.bomPath) > 0 THEN 1 ELSE 0 END
             FROM SG1010 C WITH (NOLOCK)
             INNER JOIN RECURSIVE_BOM P 
                 ON P.productCode = C.G1_COD
             WHERE C.D_E_L_E_T_ = '' 
             AND P.level < @depth
+            AND P.isCycle = 0
         ),
         CODES AS (
             SELECT @code AS productCode, NULL AS parentCode, 0 AS level
@@ -2077,7 +3596,7 @@ class ProductRepository(BaseRepository):
     # -------------------------------
     # 🔹 CUSTOMERS (SA7010/SA1010) 
     # -------------------------------
-    def list_customers(self, code: str, page: int = 1, page_size: int = 50) -> dict:
+    def list_customers(self, code: str, page: int = 1, page_size: int = 50, shape: str = "records") -> dict:
         if page < 1:
             raise ValueError("page must be >= 1")
         if not 1 <= page_size <= 500:
@@ -2160,7 +3679,7 @@ class ProductRepository(BaseRepository):
             OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
         """
 
-        rows = self.execute_query(sql, (code, code, offset, page_size))
+        rows = self.execute_shaped(sql, (code, code, offset, page_size), shape)
 
         return {
             "success": True,
@@ -2168,14 +3687,14 @@ class ProductRepository(BaseRepository):
             "page": page,
             "page_size": page_size,
             "total_pages": (total + page_size - 1) // page_size,
-            "data": rows
+            **rows
         }
 
 
     # -------------------------------
     # 🔹 PURCHASES (SC7010/SA2010) 
     # -------------------------------
-    def list_purchases(self, code: str, page: int = 1, page_size: int = 50) -> dict:
+    def list_purchases(self, code: str, page: int = 1, page_size: int = 50, shape: str = "records") -> dict:
         if page < 1:
             raise ValueError("page must be >= 1")
         if not 1 <= page_size <= 500:
@@ -2223,7 +3742,7 @@ class ProductRepository(BaseRepository):
             OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
         """
 
-        rows = self.execute_query(sql, (code, offset, page_size))
+        rows = self.execute_shaped(sql, (code, offset, page_size), shape)
 
         return {
             "success": True,
@@ -2231,7 +3750,7 @@ class ProductRepository(BaseRepository):
             "page": page,
             "page_size": page_size,
             "total_pages": (total + page_size - 1) // page_size,
-            "data": rows
+            **rows
         }
 
 
@@ -2421,21 +3940,20 @@ class ProductRepository(BaseRepository):
     # -------------------------------
     # 🔹 MOVEMENTS
     # -------------------------------
-    def list_internal_movements(
+    def _internal_movements_where(
         self,
         code: str,
-        page: int = 1,
-        page_size: int = 50,
         date_start: Optional[str] = None,
         date_end: Optional[str] = None,
         branch: Optional[str] = None,
         location: Optional[str] = None,
         tm: Optional[str] = None,
         op: Optional[str] = None,
-    ) -> dict:
-
-        offset = (page - 1) * page_size
-
+    ) -> tuple[str, list, dict]:
+        """
+        Builds the SD3010 WHERE clause shared by the paginated listing
+        and the streaming export. Returns (where_clause, params, filters).
+        """
         filters = ["SD3.D_E_L_E_T_ = ''", "SD3.D3_COD = ?"]
         params = [code]
 
@@ -2465,46 +3983,87 @@ class ProductRepository(BaseRepository):
             filters.append("SD3.D3_OP = ?")
             params.append(op)
 
-        where_clause = " AND ".join(filters)
-
-        count_sql = f"""
-            SELECT COUNT(*) AS total
-            FROM SD3010 SD3
-            WHERE {where_clause}
-        """
+        return " AND ".join(filters), params, {
+            "date_start": date_start,
+            "date_end": date_end,
+            "branch": branch,
+            "location": location,
+            "tm": tm,
+            "op": op
+        }
 
-        total = int(self.execute_one(count_sql, tuple(params))["total"] or 0)
+    _INTERNAL_MOVEMENTS_COLUMNS = {
+        "branch": "SD3.D3_FILIAL",
+        "location": "SD3.D3_LOCAL",
+        "document": "SD3.D3_DOC",
+        "issue_date": "SD3.D3_EMISSAO",
 
-        data_sql = f"""
-            SELECT
-                SD3.D3_FILIAL   AS branch,
-                SD3.D3_LOCAL    AS location,
-                SD3.D3_DOC      AS document,
-                SD3.D3_EMISSAO  AS issue_date,
+        "product_code": "SD3.D3_COD",
+        "product_description": "SB1.B1_DESC",
+        "unit": "SB1.B1_UM",
 
-                SD3.D3_COD      AS product_code,
-                SB1.B1_DESC     AS product_description,
-                SB1.B1_UM       AS unit,
+        "movement_type": "SD3.D3_TM",
+        "cf": "SD3.D3_CF",
+        "quantity": "SD3.D3_QUANT",
+        "production_order": "SD3.D3_OP",
+        "user_name": "SD3.D3_USUARIO",
+    }
 
-                SD3.D3_TM       AS movement_type,
-                SD3.D3_CF       AS cf,
-                SD3.D3_QUANT    AS quantity,
-                SD3.D3_OP       AS production_order,
-                SD3.D3_USUARIO  AS user_name
+    def _internal_movements_select(self, fields: Optional[str] = None) -> str:
+        """
+        SELECT ... FROM shared by the listing and the export; `fields`
+        limits the columns (aliases of _INTERNAL_MOVEMENTS_COLUMNS).
+        """
+        return f"""
+            SELECT
+                {self._select_list(self._INTERNAL_MOVEMENTS_COLUMNS, fields)}
 
             FROM SD3010 SD3
             INNER JOIN SB1010 SB1
                 ON SB1.B1_COD = SD3.D3_COD
             AND SB1.D_E_L_E_T_ = ''
+        """
+
+    def list_internal_movements(
+        self,
+        code: str,
+        page: int = 1,
+        page_size: int = 50,
+        date_start: Optional[str] = None,
+        date_end: Optional[str] = None,
+        branch: Optional[str] = None,
+        location: Optional[str] = None,
+        tm: Optional[str] = None,
+        op: Optional[str] = None,
+        fields: Optional[str] = None,
+        shape: str = "records",
+    ) -> dict:
+
+        offset = (page - 1) * page_size
+
+        where_clause, params, filters = self._internal_movements_where(
+            code, date_start, date_end, branch, location, tm, op
+        )
+
+        count_sql = f"""
+            SELECT COUNT(*) AS total
+            FROM SD3010 SD3
+            WHERE {where_clause}
+        """
+
+        total = int(self.execute_one(count_sql, tuple(params))["total"] or 0)
 
+        data_sql = f"""
+            {self._internal_movements_select(fields)}
             WHERE {where_clause}
             ORDER BY SD3.D3_EMISSAO DESC, SD3.R_E_C_N_O_ DESC
             OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
         """
 
-        rows = self.execute_query(
+        rows = self.execute_shaped(
             data_sql,
-            tuple(params + [offset, page_size])
+            tuple(params + [offset, page_size]),
+            shape
         )
 
         return {
@@ -2513,13 +4072,47 @@ class ProductRepository(BaseRepository):
             "page": page,
             "page_size": page_size,
             "total_pages": (total + page_size - 1) // page_size,
-            "filters": {
-                "date_start": date_start,
-                "date_end": date_end,
-                "branch": branch,
-                "location": location,
-                "tm": tm,
-                "op": op
-            },
-            "data": rows
+            "filters": filters,
+            **rows
         }
+
+    def _internal_movements_export_query(
+        self,
+        code: str,
+        date_start: Optional[str] = None,
+        date_end: Optional[str] = None,
+        branch: Optional[str] = None,
+        location: Optional[str] = None,
+        tm: Optional[str] = None,
+        op: Optional[str] = None,
+        fields: Optional[str] = None
+    ) -> tuple[str, tuple]:
+        """
+        Same columns and order as list_internal_movements, without pagination.
+        """
+        where_clause, params, _ = self._internal_movements_where(
+            code, date_start, date_end, branch, location, tm, op
+        )
+
+        data_sql = f"""
+            {self._internal_movements_select(fields)}
+            WHERE {where_clause}
+            ORDER BY SD3.D3_EMISSAO DESC, SD3.R_E_C_N_O_ DESC
+        """
+        return data_sql, tuple(params)
+
+    def iter_internal_movements(self, code: str, batch_size: int = 5000, **filters):
+        """
+        Streams every SD3010 movement matching the filters (same columns
+        and order as list_internal_movements) as dicts, without pagination.
+        """
+        data_sql, params = self._internal_movements_export_query(code, **filters)
+        return self.iter_query(data_sql, params, batch_size)
+
+    def iter_internal_movements_batches(self, code: str, **filters):
+        """
+        Same rows as iter_internal_movements, as raw fetchmany batches
+        (see BaseRepository.iter_batches) for CSV/Parquet export.
+        """
+        data_sql, params = self._internal_movements_export_query(code, **filters)
+        return self.iter_batches(data_sql, params)
@@ -27,12 +27,12 @@ class SystemRepository(BaseRepository):
         tables = self.execute_query(query, (offset, limit))
         return tables
 
-    def get_table(self, tableName: str) ->dict:
+    def get_table(self, tableName: str, fields: str | None = None) ->dict:
         log_info(f"Buscando informações da tabela {tableName}.")
-        query = """
+        query = f"""
             SELECT 
                 t.name AS TableName,
-                X2.*
+                {self._select_columns("X2", fields, prefix="X2_")}
             FROM sys.tables t
             LEFT JOIN SX2010 X2
                 ON X2.X2_ARQUIVO = t.name
@@ -45,10 +45,11 @@ class SystemRepository(BaseRepository):
             raise BusinessLogicError(f"Tabela com código '{tableName}' não encontrada.")
         return table
 
-    def get_columns_table(self, tableName: str, page: int = 1, page_size: int = 50) -> dict:
+    def get_columns_table(self, tableName: str, page: int = 1, page_size: int = 50, fields: str | None = None) -> dict:
         """
         Retorna as colunas da tabela (SX3010) com suporte à paginação completa:
         inclui total de registros e total de páginas.
+        `fields` limita as colunas do SX3 lidas (ex.: "X3_CAMPO,X3_TITULO").
         """
         log_info(f"Buscando colunas da tabela {tableName} (página {page}, limite {page_size})...")
 
@@ -76,7 +77,7 @@ class SystemRepository(BaseRepository):
         # 🔹 Busca paginada
         query = f"""
             SELECT 
-                X3.*
+                {self._select_columns("X3", fields, prefix="X3_")}
             FROM SX3010 AS X3
             INNER JOIN SX2010 AS X2
                 ON X3.X3_ARQUIVO = X2.X2_CHAVE
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Request, Body
+from fastapi import APIRouter, Request, Body, Query
 from fastapi.responses import JSONResponse
 from app.services.data_service import run_raw_sql
 from app.models.data_query_model import DataQueryRequestOpenAPI, RawSqlRequest
@@ -40,12 +40,17 @@ router = APIRouter()
         }
     },
 )
-async def execute_sql_raw(request: Request):
+async def execute_sql_raw(
+    request: Request,
+    shape: str = Query("records", pattern="^(records|columnar)$", description="records (lista de objetos) | columnar (columns + linhas como listas)")
+):
     """
     Executa SQL puro, aceitando `application/json` (campo 'sql') ou `text/plain`.
 
     - Permite colar a query diretamente no Swagger.
     - Compatível com agentes que enviam JSON.
+    - `shape=columnar`: cada resultset traz `columns` e `data` como listas
+      de valores, sem repetir os nomes das colunas em cada linha.
     """
     try:
         content_type = request.headers.get("content-type", "").lower()
@@ -64,7 +69,7 @@ async def execute_sql_raw(request: Request):
             return error_response("Corpo vazio — nenhum SQL foi recebido.")
 
         # 🔹 Execução segura
-        result = run_raw_sql(sql_text)
+        result = run_raw_sql(sql_text, shape)
         if result.get("success"):
             return success_response(data=result, message="Consulta SQL executada com sucesso.")
         else:
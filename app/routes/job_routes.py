@@ -0,0 +1,84 @@
+from fastapi import APIRouter
+from fastapi.responses import FileResponse
+from app.services.export_job_service import (
+    start_structure_excel_job,
+    start_internal_movements_job,
+    start_bom_cycles_job,
+    get_export_job,
+)
+from app.models.job_model import StructureExcelJobRequest, InternalMovementsJobRequest
+from app.core.responses import success_response, error_response
+from app.utils.logger import log_error
+
+router = APIRouter()
+
+
+@router.post("/structure-excel", summary="Cria job de exportação da estrutura (BOM) em Excel")
+def create_structure_excel_job(payload: StructureExcelJobRequest):
+    """
+    Enfileira a geração da planilha de estrutura. Acompanhe em
+    GET /jobs/{id} e baixe em GET /jobs/{id}/download quando `status=done`.
+    """
+    try:
+        job = start_structure_excel_job(payload.code)
+        return success_response(data=job, message=f"Job {job['id']} criado com sucesso.")
+    except Exception as e:
+        log_error(f"Erro ao criar job de estrutura de {payload.code}: {e}")
+        return error_response(f"Erro inesperado: {getattr(e, 'detail', e)}")
+
+
+@router.post("/internal-movements", summary="Cria job de exportação das movimentações internas (SD3010) em CSV")
+def create_internal_movements_job(payload: InternalMovementsJobRequest):
+    """
+    Enfileira a exportação das movimentações internas com os mesmos
+    filtros de GET /products/{code}/internal-movements, sem paginação.
+    """
+    try:
+        job = start_internal_movements_job(
+            payload.code,
+            payload.date_start,
+            payload.date_end,
+            payload.branch,
+            payload.location,
+            payload.tm,
+            payload.op
+        )
+        return success_response(data=job, message=f"Job {job['id']} criado com sucesso.")
+    except Exception as e:
+        log_error(f"Erro ao criar job de movimentações de {payload.code}: {e}")
+        return error_response(f"Erro inesperado: {getattr(e, 'detail', e)}")
+
+
+@router.post("/bom-cycles", summary="Cria job de auditoria de ciclos na estrutura (SG1010)")
+def create_bom_cycles_job():
+    """
+    Enfileira a auditoria de ciclos (resultado em JSON). Se já houver uma
+    auditoria em andamento, devolve o mesmo job.
+    """
+    try:
+        job = start_bom_cycles_job()
+        return success_response(data=job, message=f"Job {job['id']}: {job['status']}.")
+    except Exception as e:
+        log_error(f"Erro ao criar job de auditoria de ciclos: {e}")
+        return error_response(f"Erro inesperado: {getattr(e, 'detail', e)}")
+
+
+@router.get("/{job_id}", summary="Consulta o status e o progresso de um job de exportação")
+def job_status(job_id: str):
+    job = get_export_job(job_id)
+    if job is None:
+        return error_response(f"Job {job_id} não encontrado ou expirado.", status_code=404)
+
+    return success_response(data=job.to_dict(), message=f"Job {job_id}: {job.status}.")
+
+
+@router.get("/{job_id}/download", summary="Baixa o arquivo gerado por um job de exportação")
+def job_download(job_id: str):
+    job = get_export_job(job_id)
+    if job is None:
+        return error_response(f"Job {job_id} não encontrado ou expirado.", status_code=404)
+
+    if job.status != "done" or not job.path.exists():
+        return error_response(f"Job {job_id} ainda não concluído (status: {job.status}).", status_code=409)
+
+    return FileResponse(job.path, media_type=job.media_type, filename=job.filename)
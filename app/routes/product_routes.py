@@ -1,17 +1,28 @@
 from fastapi import APIRouter, HTTPException, Query
-from app.services.product_service import get_product, get_structure, get_parents, get_exclusive_materials, get_guide, get_inspection, get_product_analyser, get_customers, get_structure_excel
+from app.services.product_service import get_product, get_structure, get_parents, get_exclusive_materials, get_guide, get_inspection, get_product_analyser, get_customers
 from app.services.product_service import get_suppliers, get_inbound_invoice_items, get_outbound_invoice_items, get_stock, search_products_by_description
 from app.services.product_service import get_purchases, get_sales_summary, get_sales_open_orders, get_sales_billing, get_product_pricing, get_internal_movements
-from app.core.responses import success_response, error_response
+from app.services.product_service import get_stock_bulk, iter_stock_bulk, get_structure_explosion
+from app.services.product_service import get_material_requirements, get_lead_time_critical_path, get_cost_rollup
+from app.services.product_service import get_structure_children, get_structure_bulk, get_where_used_impact
+from app.services.product_service import get_structure_diff, get_structure_excel_cached
+from app.services.product_service import iter_inbound_invoice_items_batches, iter_stock_batches, iter_internal_movements_batches
+from app.services.export_job_service import get_latest_bom_cycles_audit
+from app.utils.tabular_export import tabular_response
+from app.core.responses import success_response, raw_success_response, error_response, dumps
 from app.core.exceptions import DatabaseConnectionError
 from app.utils.logger import log_info, log_error
 from app.repositories.base_repository import BaseRepository
 from pydantic import BaseModel
 from typing import Optional
-from app.models.product_model import ProductSearchRequest
+from app.models.product_model import ProductSearchRequest, BulkStockRequest, BulkStructureRequest
 from fastapi.responses import StreamingResponse
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, FileResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from app.utils.export_cache import export_cache
+from app.utils.http_cache import conditional, etag_matches, PRODUCT_TABLES, STRUCTURE_TABLES, SUPPLIER_TABLES, INSPECTION_TABLES
 from fastapi import Request
+from itertools import chain
 
 router = APIRouter()
 
@@ -20,13 +31,17 @@ router = APIRouter()
     "/search/description",
     summary="Busca específica por descrição, com paginação e score"
 )
+@conditional(PRODUCT_TABLES)
 def search_products_by_description_route(
+    request: Request,
     description: str = Query(..., description="Descrição ou termos"),
     page: int = Query(1, ge=1),
     page_size: int = Query(50, ge=1, le=500),
+    fields: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula (padrão: todos)"),
+    shape: str = Query("records", pattern="^(records|columnar)$", description="records (lista de objetos) | columnar (columns + linhas como listas)"),
 ):
     try:
-        result = search_products_by_description(description, page, page_size)
+        result = search_products_by_description(description, page, page_size, fields, shape)
         return success_response(
             data=result,
             message=f"Busca por descrição realizada com sucesso (página {page}/{result['total_pages']})."
@@ -36,13 +51,93 @@ def search_products_by_description_route(
         return error_response(f"Erro inesperado: {e}")
 
 
+@router.post("/stock/bulk", summary="Consulta o estoque (SB2010) de vários produtos em uma única consulta")
+def stock_bulk(payload: BulkStockRequest):
+    """
+    Retorna, para cada código informado, o saldo disponível agregado
+    e o detalhamento por filial/armazém.
+
+    Com `stream=true` a resposta é NDJSON (um produto por linha),
+    enviada à medida que os blocos são lidos do banco.
+    """
+    try:
+        if payload.stream:
+            rows = iter(iter_stock_bulk(payload.codes, payload.branch, payload.location))
+            # O primeiro produto é lido antes de montar a resposta: erros de
+            # consulta ainda viram uma resposta de erro, não um 200 truncado
+            first = next(rows, None)
+            rows = chain([first], rows) if first is not None else iter(())
+            return StreamingResponse(
+                (dumps(row) + b"\n" for row in rows),
+                media_type="application/x-ndjson"
+            )
+
+        result = get_stock_bulk(payload.codes, payload.branch, payload.location)
+        return success_response(
+            data=result,
+            message=f"Estoque de {result['total']} produto(s) retornado com sucesso."
+        )
+    except Exception as e:
+        log_error(f"Erro ao consultar estoque em lote: {e}")
+        return error_response(f"Erro inesperado: {e}")
+
+
+@router.post("/structure/bulk", summary="Consulta a estrutura (BOM) de vários produtos de uma só vez")
+def structure_bulk(payload: BulkStructureRequest):
+    """
+    Retorna uma árvore por produto raiz. A estrutura de todos os códigos
+    informados é lida junta, nível a nível (uma consulta por nível), e
+    sub-conjuntos compartilhados entre as raízes são lidos uma única vez.
+    """
+    try:
+        result = get_structure_bulk(payload.codes, payload.max_depth)
+        return success_response(
+            data=result,
+            message=f"Estrutura de {result['total']} produto(s) retornada com sucesso."
+        )
+    except Exception as e:
+        log_error(f"Erro ao consultar estrutura em lote: {e}")
+        return error_response(f"Erro inesperado: {e}")
+
+
+@router.get("/bom/cycles", summary="Resultado da última auditoria de ciclos na estrutura (SG1010)")
+def bom_cycles():
+    """
+    Devolve o status da última auditoria dos grupos de produtos que se
+    referenciam mutuamente na estrutura (ex.: A → B → A) e, quando
+    concluída, os ciclos encontrados com um caminho de exemplo cada.
+    A auditoria lê toda a SG1010 e é iniciada em POST /jobs/bom-cycles.
+    """
+    try:
+        audit = get_latest_bom_cycles_audit()
+        if audit is None:
+            return error_response(
+                "Nenhuma auditoria de ciclos disponível. Inicie uma em POST /jobs/bom-cycles.",
+                status_code=404
+            )
+
+        job = audit["job"]
+        message = f"Auditoria de ciclos {job['id']}: {job['status']}."
+        if audit["result"] is not None:
+            message = f"{audit['result']['total']} ciclo(s) encontrado(s) na estrutura (auditoria de {job['finished_at']})."
+        return success_response(data=audit, message=message)
+    except Exception as e:
+        log_error(f"Erro ao auditar ciclos da estrutura: {e}")
+        return error_response(f"Erro inesperado: {getattr(e, 'detail', e)}")
+
+
 @router.get("/{code}", summary="Consulta produto por código")
-def product(code: str):
+@conditional(PRODUCT_TABLES)
+def product(
+    request: Request,
+    code: str,
+    fields: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula (padrão: todos)")
+):
     try:
-        product = get_product(code)
+        product = get_product(code, fields)
 
         return success_response(
-            data={"produto": product.model_dump()},  
+            data={"produto": product.model_dump(exclude_unset=bool(fields))},  
             message="Produto localizado com sucesso!"
         )
 
@@ -52,17 +147,32 @@ def product(code: str):
 
 
 @router.get("/{code}/structure", summary="Consulta estrutura (BOM) paginada via CTE")
+@conditional(STRUCTURE_TABLES, daily=True)
 def structure(
+    request: Request,
     code: str,
     max_depth: int = Query(10, ge=1, le=15),
     page: int = Query(1, ge=1),
-    page_size: int = Query(100, ge=1, le=500)
+    page_size: int = Query(100, ge=1, le=500),
+    mode: str = Query("tree", pattern="^(tree|graph)$", description="'tree' (hierárquico) ou 'graph' (tabela de nós + lista de arestas)"),
+    fields: Optional[str] = Query(None, description="Campos de cada nó (code, description, type, unit, quantity), separados por vírgula")
 ):
     """
     Retorna a estrutura (BOM) via CTE com suporte a paginação.
+
+    Com `mode=graph` cada sub-conjunto aparece uma única vez: a resposta traz
+    `nodes` (um por produto) e `edges` (pai → componente), sem paginação.
+
+    Com `fields` (modo tree) cada nó traz só as chaves pedidas, além de
+    `components`; sem description/type/unit o SB1010 nem é consultado.
     """
     try:
-        result = get_structure(code, max_depth, page, page_size)
+        result = get_structure(code, max_depth, page, page_size, mode, fields)
+        if mode == "graph":
+            return success_response(
+                data=result,
+                message=f"Estrutura do produto {code} retornada com sucesso ({result['total_nodes']} nós, {result['total_edges']} arestas)."
+            )
         return success_response(
             data=result,
             message=f"Estrutura do produto {code} retornada com sucesso (página {page}/{result['total_pages']})."
@@ -72,6 +182,55 @@ def structure(
         return error_response(f"Erro inesperado: {e}")
 
 
+@router.get("/{code}/structure/children", summary="Expande um nível da estrutura (BOM) sob demanda")
+@conditional(STRUCTURE_TABLES, daily=True)
+def structure_children(
+    request: Request,
+    code: str,
+    node: Optional[str] = Query(None, description="Código do nó a expandir (padrão: o próprio produto)"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(100, ge=1, le=500)
+):
+    """
+    Retorna somente os componentes diretos de `node`, com a flag
+    `has_children` indicando se cada componente pode ser expandido.
+    """
+    try:
+        result = get_structure_children(code, node, page, page_size)
+        return success_response(
+            data=result,
+            message=f"Componentes de {result['node']} retornados com sucesso (página {page}/{result['total_pages']})."
+        )
+    except Exception as e:
+        log_error(f"Erro ao expandir estrutura de {code} (nó {node}): {e}")
+        return error_response(f"Erro inesperado: {e}")
+
+
+@router.get("/{code}/structure/diff", summary="Diferenças da estrutura (BOM) entre duas datas")
+@conditional(STRUCTURE_TABLES, daily=True)
+def structure_diff(
+    request: Request,
+    code: str,
+    date_from: str = Query(..., description="Data base (YYYY-MM-DD, DD/MM/YYYY ou YYYYMMDD)"),
+    date_to: Optional[str] = Query(None, description="Data de comparação (padrão: hoje)"),
+    max_depth: int = Query(50, ge=1, le=50)
+):
+    """
+    Compara a estrutura vigente em `date_from` com a vigente em `date_to`
+    (janelas G1_INI/G1_FIM) e retorna as relações incluídas, excluídas e
+    com quantidade alterada.
+    """
+    try:
+        result = get_structure_diff(code, date_from, date_to, max_depth)
+        return success_response(
+            data=result,
+            message=f"{result['total_changes']} alteração(ões) na estrutura de {code} entre {result['date_from']} e {result['date_to']}."
+        )
+    except Exception as e:
+        log_error(f"Erro ao comparar estrutura do produto {code}: {e}")
+        return error_response(f"Erro inesperado: {e}")
+
+
 @router.get(
     "/{code}/structure/excel",
     summary="Exporta a estrutura formatada em planilha Excel (público)",
@@ -83,27 +242,32 @@ async def structure_excel_public(
     format: str = Query("json", description="Use 'xlsx' para baixar o arquivo Excel")
 ):
     """
-    Se format=xlsx → retorna StreamingResponse (arquivo)
-    Caso contrário → retorna JSON com link para download.
+    Se format=xlsx → retorna o arquivo (gerado ou servido do cache em disco,
+    com ETag/Last-Modified).
+    Caso contrário → retorna JSON com link para download, sem gerar o arquivo.
     """
     try:
-        # Sempre gera o arquivo (caso o usuário clique no link)
-        excel_file = get_structure_excel(code)
         filename = f"Estrutura_{code}.xlsx"
 
         # ------------------------------
         # Se pediu Excel → baixa arquivo
         # ------------------------------
         if format.lower() == "xlsx":
-            return StreamingResponse(
-                excel_file,
+            path, etag = await run_in_threadpool(get_structure_excel_cached, code)
+            headers = {
+                "ETag": etag,
+                "Last-Modified": export_cache.last_modified(path),
+                "Cache-Control": "no-cache",
+            }
+
+            if etag_matches(request.headers.get("if-none-match"), etag):
+                return Response(status_code=304, headers=headers)
+
+            return FileResponse(
+                path,
                 media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                headers={
-                    "Content-Disposition": f"attachment; filename={filename}",
-                    "Cache-Control": "no-cache, no-store, must-revalidate",
-                    "Pragma": "no-cache",
-                    "Expires": "0",
-                }
+                filename=filename,
+                headers=headers
             )
 
         # ------------------------------
@@ -114,7 +278,7 @@ async def structure_excel_public(
 
         return JSONResponse(
             content={
-                "message": "Arquivo Excel gerado com sucesso!",
+                "message": "Link para download do arquivo Excel gerado com sucesso!",
                 "download_url": public_url,
                 "html_link": html_link
             }
@@ -125,8 +289,103 @@ async def structure_excel_public(
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
+@router.get("/{code}/explosion", summary="Explosão da estrutura (BOM) com quantidades acumuladas")
+@conditional(STRUCTURE_TABLES, daily=True)
+def structure_explosion(
+    request: Request,
+    code: str,
+    qty: float = Query(1.0, gt=0, description="Quantidade do produto raiz"),
+    include_intermediate: bool = Query(False, description="Inclui PIs intermediários além das folhas")
+):
+    """
+    Retorna a lista achatada de componentes folha com a quantidade total
+    necessária para `qty` unidades do produto, somando todos os caminhos
+    da estrutura (sub-conjuntos compartilhados são agregados).
+    """
+    try:
+        result = get_structure_explosion(code, qty, include_intermediate)
+        return success_response(
+            data=result,
+            message=f"Explosão da estrutura de {code} retornada com sucesso ({result['total']} itens)."
+        )
+    except Exception as e:
+        log_error(f"Erro ao explodir estrutura do produto {code}: {e}")
+        return error_response(f"Erro inesperado: {e}")
+
+
+@router.get("/{code}/requirements", summary="Necessidades líquidas de material (BOM + estoque + compras em aberto)")
+def material_requirements(
+    code: str,
+    qty: float = Query(..., gt=0, description="Quantidade do produto raiz a produzir"),
+    branch: Optional[str] = Query(None, description="Filial (B2_FILIAL / C7_FILIAL)"),
+    location: Optional[str] = Query(None, description="Local (B2_LOCAL)"),
+    only_shortages: bool = Query(False, description="Retorna somente componentes em falta")
+):
+    """
+    Explode a estrutura, abate o saldo disponível (SB2010) e as compras
+    em aberto (SC7010) nível a nível e retorna a falta líquida por componente.
+    """
+    try:
+        result = get_material_requirements(code, qty, branch, location, only_shortages)
+        status = "pode ser produzido" if result["can_build"] else f"possui {result['total_shortages']} componente(s) em falta"
+        return success_response(
+            data=result,
+            message=f"{qty} x {code} {status}."
+        )
+    except Exception as e:
+        log_error(f"Erro ao calcular necessidades do produto {code}: {e}")
+        return error_response(f"Erro inesperado: {e}")
+
+
+@router.get("/{code}/lead-time", summary="Caminho crítico de lead time da estrutura (compras + roteiro)")
+def lead_time_critical_path(
+    code: str,
+    qty: float = Query(1.0, gt=0, description="Quantidade do produto raiz"),
+    branch: Optional[str] = Query(None, description="Filial do roteiro (G2_FILIAL)"),
+    hours_per_day: float = Query(8.0, gt=0, le=24, description="Horas produtivas por dia para converter o roteiro")
+):
+    """
+    Calcula o maior tempo acumulado da raiz até uma folha: lead time de
+    compra das matérias-primas (real SC7010 ⋈ SD1010, cadastrado SA5010
+    ou B1_PE) somado ao tempo de roteiro (SG2010 G2_SETUP/G2_TEMPAD)
+    dos itens fabricados.
+    """
+    try:
+        result = get_lead_time_critical_path(code, qty, branch, hours_per_day)
+        return success_response(
+            data=result,
+            message=f"Caminho crítico de {code}: {result['total_lead_time_days']:.1f} dia(s)."
+        )
+    except Exception as e:
+        log_error(f"Erro ao calcular lead time do produto {code}: {e}")
+        return error_response(f"Erro inesperado: {e}")
+
+
+@router.get("/{code}/cost-rollup", summary="Custo acumulado da estrutura (último preço de compra)")
+def cost_rollup(
+    code: str,
+    qty: float = Query(1.0, gt=0, description="Quantidade do produto raiz")
+):
+    """
+    Soma de baixo para cima o custo das matérias-primas da estrutura,
+    usando o último preço de compra (SC7010) ou, na falta dele,
+    B1_UPRC / B1_CUSTD do cadastro do produto.
+    """
+    try:
+        result = get_cost_rollup(code, qty)
+        return success_response(
+            data=result,
+            message=f"Custo acumulado de {code} retornado com sucesso ({result['missing_prices']} item(ns) sem preço)."
+        )
+    except Exception as e:
+        log_error(f"Erro ao calcular custo acumulado do produto {code}: {e}")
+        return error_response(f"Erro inesperado: {e}")
+
+
 @router.get("/{code}/parents", summary="Consulta produtos pai (Where Used) paginada via CTE")
+@conditional(STRUCTURE_TABLES, daily=True)
 def parents(
+    request: Request,
     code: str,
     max_depth: int = Query(10, ge=1, le=15),
     page: int = Query(1, ge=1),
@@ -146,8 +405,35 @@ def parents(
         return error_response(f"Erro inesperado: {e}")
 
 
+@router.get("/{code}/where-used/impact", summary="Produtos finais afetados por um componente (onde-usado consolidado)")
+@conditional(STRUCTURE_TABLES, daily=True)
+def where_used_impact(
+    request: Request,
+    code: str,
+    max_depth: int = Query(50, ge=1, le=50),
+    include_intermediate: bool = Query(False, description="Inclui também os conjuntos intermediários")
+):
+    """
+    Lista os produtos de nível superior (sem pai ativo) que usam o item,
+    com a quantidade do item consumida por unidade de cada um (somada em
+    todos os caminhos) e o número de caminhos até ele. Ancestrais cortados
+    por `max_depth` vêm com `truncated: true`.
+    """
+    try:
+        result = get_where_used_impact(code, max_depth, include_intermediate)
+        message = f"{result['total_top_level']} produto(s) final(is) afetado(s) por {code}."
+        if result["total_truncated"]:
+            message += f" {result['total_truncated']} ancestral(is) cortado(s) por max_depth={max_depth}."
+        return success_response(data=result, message=message)
+    except Exception as e:
+        log_error(f"Erro ao calcular impacto do item {code}: {e}")
+        return error_response(f"Erro inesperado: {e}")
+
+
 @router.get("/{code}/exclusive-materials", summary="Análise de exclusividade de materiais")
+@conditional(STRUCTURE_TABLES, daily=True)
 def exclusive_materials(
+    request: Request,
     code: str,
     max_depth: int = Query(15, ge=1, le=20)
 ):
@@ -174,16 +460,19 @@ def exclusive_materials(
 
 
 @router.get("/{code}/suppliers", summary="Consulta os fornecedores de um produto com paginação")
+@conditional(SUPPLIER_TABLES)
 def suppliers(
+    request: Request,
     code: str,
     page: int = Query(1, ge=1),
-    page_size: int = Query(50, ge=1, le=500)
+    page_size: int = Query(50, ge=1, le=500),
+    shape: str = Query("records", pattern="^(records|columnar)$", description="records (lista de objetos) | columnar (columns + linhas como listas)")
 ):
     """
     Retorna os fornecedores de um produto com suporte a paginação.
     """
     try:
-        result = get_suppliers(code, page, page_size)
+        result = get_suppliers(code, page, page_size, shape)
         return success_response(
             data=result,
             message=f"Fornecedores de {code} retornados com sucesso (página {page}/{result['total_pages']})."
@@ -201,13 +490,22 @@ def inbound_invoice_items(
     issue_date_start: Optional[str] = Query(None),
     issue_date_end: Optional[str] = Query(None),
     supplier: Optional[str] = Query(None),
-    branch: Optional[str] = Query(None)
+    branch: Optional[str] = Query(None),
+    format: str = Query("json", pattern="^(json|csv|parquet)$", description="json (paginado) | csv | parquet (todas as linhas)"),
+    fields: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula (padrão: todos)"),
+    shape: str = Query("records", pattern="^(records|columnar)$", description="records (lista de objetos) | columnar (columns + linhas como listas)")
 ):
     """
     Retorna as notas fiscais de entrada (SD1010) com paginação e filtros opcionais.
+    Com `format=csv|parquet` devolve todas as linhas filtradas como arquivo,
+    ignorando a paginação.
     """
     try:
-        result = get_inbound_invoice_items(code, page, page_size, issue_date_start, issue_date_end, supplier, branch)
+        if format != "json":
+            batches = iter_inbound_invoice_items_batches(code, issue_date_start, issue_date_end, supplier, branch, fields)
+            return tabular_response(batches, format, f"NFE_Entrada_{code}")
+
+        result = get_inbound_invoice_items(code, page, page_size, issue_date_start, issue_date_end, supplier, branch, fields, shape)
         return success_response(
             data=result,
             message=f"Inbound invoices for {code} fetched successfully (page {page}/{result['total_pages']})."
@@ -248,10 +546,11 @@ def inbound_invoice_items(
 def purchases(
     code: str,
     page: int = Query(1, ge=1),
-    page_size: int = Query(50, ge=1, le=500)
+    page_size: int = Query(50, ge=1, le=500),
+    shape: str = Query("records", pattern="^(records|columnar)$", description="records (lista de objetos) | columnar (columns + linhas como listas)")
 ):
     try:
-        result = get_purchases(code, page, page_size)
+        result = get_purchases(code, page, page_size, shape)
         return success_response(
             data=result,
             message=f"Histórico de compras de {code} retornado com sucesso (página {page}/{result['total_pages']})."
@@ -348,14 +647,21 @@ def stock(
     page: int = Query(1, ge=1),
     page_size: int = Query(50, ge=1, le=500),
     branch: Optional[str] = Query(None, description="Filial (B2_FILIAL)"),
-    location: Optional[str] = Query(None, description="Local (B2_LOCAL)")
+    location: Optional[str] = Query(None, description="Local (B2_LOCAL)"),
+    format: str = Query("json", pattern="^(json|csv|parquet)$", description="json (paginado) | csv | parquet (todas as linhas)"),
+    fields: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula (padrão: todos)"),
+    shape: str = Query("records", pattern="^(records|columnar)$", description="records (lista de objetos) | columnar (columns + linhas como listas)")
 ):
     """
     Retorna o estoque do produto consultando a tabela SB2010.
     Possui filtros opcionais para filial e local, além de paginação.
+    Com `format=csv|parquet` devolve todas as linhas filtradas como arquivo.
     """
     try:
-        result = get_stock(code, page, page_size, branch, location)
+        if format != "json":
+            return tabular_response(iter_stock_batches(code, branch, location, fields), format, f"Estoque_{code}")
+
+        result = get_stock(code, page, page_size, branch, location, fields, shape)
         return success_response(
             data=result,
             message=f"Estoque de {code} retornado com sucesso (página {page}/{result['total_pages']})."
@@ -378,9 +684,20 @@ def internal_movements(
     branch: Optional[str] = Query(None),
     location: Optional[str] = Query(None),
     tm: Optional[str] = Query(None, description="Tipo de movimento (D3_TM)"),
-    op: Optional[str] = Query(None, description="Ordem de produção")
+    op: Optional[str] = Query(None, description="Ordem de produção"),
+    format: str = Query("json", pattern="^(json|csv|parquet)$", description="json (paginado) | csv | parquet (todas as linhas)"),
+    fields: Optional[str] = Query(None, description="Campos a retornar, separados por vírgula (padrão: todos)"),
+    shape: str = Query("records", pattern="^(records|columnar)$", description="records (lista de objetos) | columnar (columns + linhas como listas)")
 ):
+    """
+    Com `format=csv|parquet` devolve todas as movimentações filtradas
+    como arquivo, lidas em blocos e sem paginação.
+    """
     try:
+        if format != "json":
+            batches = iter_internal_movements_batches(code, date_start, date_end, branch, location, tm, op, fields)
+            return tabular_response(batches, format, f"Movimentacoes_{code}")
+
         result = get_internal_movements(
             code,
             page,
@@ -390,7 +707,9 @@ def internal_movements(
             branch,
             location,
             tm,
-            op
+            op,
+            fields,
+            shape
         )
 
         return success_response(
@@ -430,7 +749,9 @@ def guide(
     "/{code}/inspection",
     summary="Consulta a inspeção de processos do produto e seus componentes"
 )
+@conditional(INSPECTION_TABLES, daily=True)
 def inspection(
+    request: Request,
     code: str,
     max_depth: int = Query(10, ge=1, le=15)
 ):
@@ -439,9 +760,9 @@ def inspection(
     incluindo inspeções dos componentes (via SG1010).
     """
     try:
-        result = get_inspection(code, max_depth)
-        return success_response(
-            data=result,
+        result = get_inspection(code, max_depth=max_depth, raw=True)
+        return raw_success_response(
+            result,
             message=f"Inspeção de {code} retornada com sucesso."
         )
     except Exception as e:
@@ -481,14 +802,15 @@ def product_analyser(
 def customers(
     code: str,
     page: int = Query(1, ge=1),
-    page_size: int = Query(50, ge=1, le=500)
+    page_size: int = Query(50, ge=1, le=500),
+    shape: str = Query("records", pattern="^(records|columnar)$", description="records (lista de objetos) | columnar (columns + linhas como listas)")
 ):
     """
     Retorna os clientes vinculados a um produto (SA7010 — Amarração Produto x Cliente)
     com suporte a paginação.
     """
     try:
-        result = get_customers(code, page, page_size)
+        result = get_customers(code, page, page_size, shape)
         return success_response(
             data=result,
             message=f"Clientes vinculados ao produto {code} retornados com sucesso (página {page}/{result['total_pages']})."
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from app.services.system_service import (
     get_table,
     get_tables,
@@ -9,9 +9,12 @@ from app.services.system_service import (
     search_columns_in_table,
     search_table_by_description, 
     search_columns_by_description,
+    get_query_stats,
+    reset_query_stats,
 )
 from app.core.responses import success_response, error_response
 from app.core.exceptions import DatabaseConnectionError, BusinessLogicError
+from app.utils.http_cache import conditional, SX2_TABLES, SX3_TABLES, SIX_TABLES, SX9_TABLES, SCHEMA_TABLES
 from app.utils.logger import log_info, log_error
 
 from pydantic import BaseModel
@@ -29,7 +32,9 @@ router = APIRouter()
 # 🔍 4️⃣ Busca de tabelas por descrição (nova rota)
 # ----------------------------
 @router.get("/tables/search", summary="Busca tabelas por descrição (SX2)")
+@conditional(SX2_TABLES)
 def search_tables(
+    request: Request,
     description: str = Query(..., min_length=2, description="Descrição parcial ou completa da tabela"),
     page: int = Query(1, ge=1, description="Número da página"),
     limit: int = Query(20, ge=1, le=200, description="Quantidade de registros por página")
@@ -60,9 +65,14 @@ def search_tables(
 # Busca de tabela por nome
 # ----------------------------
 @router.get("/tables/{tableName}", summary="Consulta informações de tabela")
-def table(tableName: str):
+@conditional(SX2_TABLES)
+def table(
+    request: Request,
+    tableName: str,
+    fields: str | None = Query(None, description="Colunas do SX2 a retornar, separadas por vírgula (padrão: todas)")
+):
     try:
-        result = get_table(tableName)
+        result = get_table(tableName, fields)
         return success_response(
             data=result,
             message="Tabela localizada com sucesso!"
@@ -76,17 +86,20 @@ def table(tableName: str):
 # Consulta colunas de tabela
 # ----------------------------
 @router.get("/tables/{tableName}/columns", summary="Consulta colunas de tabela com paginação")
+@conditional(SX3_TABLES)
 def table_columns(
+    request: Request,
     tableName: str,
     page: int = Query(1, ge=1, description="Número da página"),
-    limit: int = Query(50, ge=1, le=200, description="Quantidade de registros por página")
+    limit: int = Query(50, ge=1, le=200, description="Quantidade de registros por página"),
+    fields: str | None = Query(None, description="Colunas do SX3 a retornar, separadas por vírgula (padrão: todas)")
 ):
     """
     Retorna colunas da tabela (SX3010) com suporte à paginação, total e totalPages.
     """
     log_info(f"Consultando colunas da tabela {tableName} (página {page}, limite {limit})")
     try:
-        result = get_columns_table(tableName, page, limit)
+        result = get_columns_table(tableName, page, limit, fields)
         return success_response(
             data=result,
             message=f"Colunas da tabela {tableName} retornadas com sucesso!"
@@ -102,7 +115,8 @@ def table_columns(
 # Consulta indices
 # ----------------------------
 @router.get("/tables/{tableName}/indexes", summary="Consulta índices (SIX010)")
-def table_indexes(tableName: str):
+@conditional(SIX_TABLES)
+def table_indexes(request: Request, tableName: str):
     try:
         result = get_table_indexes(tableName)
         return success_response(result, "Índices retornados com sucesso!")
@@ -113,7 +127,8 @@ def table_indexes(tableName: str):
 # Consulta relacionamentos
 # ----------------------------
 @router.get("/tables/{tableName}/relations", summary="Consulta relacionamentos (SX9010)")
-def table_relations(tableName: str):
+@conditional(SX9_TABLES)
+def table_relations(request: Request, tableName: str):
     try:
         result = get_table_relations(tableName)
         return success_response(result, "Relacionamentos retornados com sucesso!")
@@ -124,7 +139,8 @@ def table_relations(tableName: str):
 # Consulta schema
 # ----------------------------
 @router.get("/tables/{tableName}/schema", summary="Schema completo da tabela (SX2, SX3, SIX, SX9)")
-def table_schema(tableName: str):
+@conditional(SCHEMA_TABLES)
+def table_schema(request: Request, tableName: str):
     try:
         result = get_table_schema(tableName)
         return success_response(result, "Schema completo retornado!")
@@ -135,7 +151,8 @@ def table_schema(tableName: str):
 # Consulta schema
 # ----------------------------
 @router.get("/tables/{tableName}/columns/search", summary="Buscar colunas por texto")
-def search_columns(tableName: str, q: str = Query(..., min_length=2)):
+@conditional(SX3_TABLES)
+def search_columns(request: Request, tableName: str, q: str = Query(..., min_length=2)):
     try:
         result = search_columns_in_table(tableName, q)
         return success_response(result, f"Colunas contendo '{q}' retornadas!")
@@ -149,7 +166,9 @@ def search_columns(tableName: str, q: str = Query(..., min_length=2)):
     "/columns/search",
     summary="Busca colunas por descrição (SX3010 + ranking semântico)"
 )
+@conditional(SX3_TABLES)
 def search_columns_global(
+    request: Request,
     description: str = Query(
         ...,
         min_length=2,
@@ -189,6 +208,40 @@ def search_columns_global(
         log_error(f"Erro inesperado ao buscar colunas: {e}")
         return error_response(f"Erro inesperado: {e}")
 
+# ----------------------------
+# Estatísticas de consultas SQL
+# ----------------------------
+@router.get("/query-stats", summary="Tempo das consultas SQL por fingerprint (fases, percentis e histograma)")
+def query_stats(
+    order_by: str = Query("total_ms", pattern="^(total_ms|avg_ms|max_ms|p95_ms|count|errors|rows)$"),
+    limit: int = Query(50, ge=1, le=500)
+):
+    """
+    Cada item agrupa as execuções de uma mesma consulta (literais e listas
+    IN normalizados): métodos do repositório que a chamaram, totais,
+    média por fase (connect, execute, fetch, normalize) e p50/p95/p99 +
+    histograma das últimas execuções.
+    """
+    try:
+        result = get_query_stats(order_by, limit)
+        return success_response(
+            data=result,
+            message=f"{result['total']} consulta(s) retornada(s)."
+        )
+    except Exception as e:
+        log_error(f"Erro ao consultar estatísticas de consultas: {e}")
+        return error_response(f"Erro inesperado: {e}")
+
+
+@router.delete("/query-stats", summary="Zera as estatísticas das consultas SQL")
+def query_stats_reset():
+    try:
+        reset_query_stats()
+        return success_response(data={}, message="Estatísticas de consultas zeradas.")
+    except Exception as e:
+        log_error(f"Erro ao zerar estatísticas de consultas: {e}")
+        return error_response(f"Erro inesperado: {e}")
+
 # ----------------------------
 # Login simples
 # ----------------------------
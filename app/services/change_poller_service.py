@@ -0,0 +1,148 @@
+# app/services/change_poller_service.py
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from app.config import settings
+from app.repositories.base_repository import BaseRepository
+from app.utils.logger import log_info, log_error
+from app.utils.sql_validator import SqlValidator
+
+ChangeListener = Callable[[str], None]
+
+
+class TableChangePoller:
+    """
+    Acompanha o watermark (get_change_watermark: contagem, maior R_E_C_N_O_,
+    S_T_A_M_P_ / I_N_S_D_T_ quando existem) das tabelas que algum listener
+    registrou e avisa esses listeners quando uma delas muda. Sem listeners,
+    nenhuma tabela é consultada.
+
+    Uma consulta por tabela a cada `interval_seconds`, numa thread própria.
+    A primeira leitura de cada tabela define a referência e também é
+    publicada, para que caches que confiam nos eventos descartem o que
+    leram antes dela.
+    """
+
+    def __init__(self, interval_seconds: float = 60):
+        self.interval_seconds = interval_seconds
+        self._watermarks: dict[str, dict] = {}
+        self._listeners: dict[ChangeListener, frozenset[str]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------------------------
+    # 🔹 Listeners
+    # ---------------------------
+    def register(self, listener: ChangeListener, tables: Iterable[str]) -> None:
+        """
+        Registra `listener(table)`, chamado quando uma de `tables` mudar.
+        Tabelas fora de allowed_tables.json são ignoradas.
+        """
+        requested = {t.strip().upper() for t in tables if t.strip()}
+        allowed = requested & SqlValidator().allowed_tables
+        if requested - allowed:
+            log_error(
+                f"[CHANGE_POLLER] Tabelas fora da whitelist ignoradas: "
+                f"{', '.join(sorted(requested - allowed))}"
+            )
+        with self._lock:
+            self._listeners[listener] = frozenset(allowed)
+
+    def unregister(self, listener: ChangeListener) -> None:
+        with self._lock:
+            self._listeners.pop(listener, None)
+
+    @property
+    def tables(self) -> list[str]:
+        """
+        Tabelas monitoradas: a união das tabelas dos listeners registrados.
+        """
+        with self._lock:
+            return sorted(set().union(*self._listeners.values()))
+
+    def publish(self, table: str) -> None:
+        """
+        Avisa os listeners interessados em `table` de que ela mudou. Falha
+        de um listener não impede os demais.
+        """
+        with self._lock:
+            listeners = [l for l, tables in self._listeners.items() if table in tables]
+
+        for listener in listeners:
+            try:
+                listener(table)
+            except Exception as e:
+                log_error(f"[CHANGE_POLLER] Falha ao invalidar cache de {table}: {e}")
+
+    # ---------------------------
+    # 🔹 Polling
+    # ---------------------------
+    def poll_once(self) -> list[str]:
+        """
+        Lê o watermark de cada tabela e publica as que mudaram desde a
+        leitura anterior (e as lidas pela primeira vez). Retorna a lista
+        de tabelas alteradas.
+        """
+        changed = []
+        for table in self.tables:
+            if self._stop.is_set():
+                break
+            try:
+                watermark = BaseRepository().get_change_watermark(table)
+            except Exception as e:
+                log_error(f"[CHANGE_POLLER] Falha ao ler watermark de {table}: {e}")
+                continue
+
+            watermark["checked_at"] = time.time()
+            with self._lock:
+                previous = self._watermarks.get(table)
+                self._watermarks[table] = watermark
+
+            if previous is None:
+                self.publish(table)
+            elif previous["token"] != watermark["token"]:
+                changed.append(table)
+                self.publish(table)
+
+        if changed:
+            log_info(f"[CHANGE_POLLER] Tabelas alteradas: {', '.join(changed)}")
+        return changed
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.poll_once()
+            self._stop.wait(self.interval_seconds)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="change-poller", daemon=True)
+        self._thread.start()
+        log_info(f"[CHANGE_POLLER] Monitorando {len(self.tables)} tabela(s) a cada {self.interval_seconds}s")
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def snapshot(self) -> dict[str, dict]:
+        """
+        Último watermark lido de cada tabela.
+        """
+        with self._lock:
+            return {table: dict(wm) for table, wm in self._watermarks.items()}
+
+
+change_poller = TableChangePoller(settings.CHANGE_POLLER_INTERVAL_SECONDS)
+
+
+def register_change_listener(listener: ChangeListener, tables: Iterable[str]) -> None:
+    change_poller.register(listener, tables)
+
+
+def publish_table_change(table: str) -> None:
+    change_poller.publish(table.strip().upper())
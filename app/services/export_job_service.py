@@ -0,0 +1,312 @@
+# app/services/export_job_service.py
+import csv
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
+
+import orjson
+
+from app.config import settings
+from app.core.exceptions import BusinessLogicError
+from app.core.responses import dumps
+from app.repositories.product_repository import ProductRepository
+from app.services.product_service import get_bom_cycles, get_structure_excel_cached
+from app.utils.logger import log_info, log_error
+
+
+class ExportJob:
+    """
+    Estado de um job de exportação. Os campos são atualizados pela thread
+    de trabalho e lidos pelas rotas de status.
+    """
+
+    def __init__(self, kind: str, filename: str, media_type: str, path: Path, params: dict):
+        self.id = path.stem
+        self.kind = kind
+        self.filename = filename
+        self.media_type = media_type
+        self.path = path
+        self.params = params
+        self.status = "queued"
+        self.progress = 0.0
+        self.rows = 0
+        self.total_rows: Optional[int] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        expires_at = None
+        if self.finished_at is not None:
+            expires_at = self.finished_at + settings.EXPORT_JOB_TTL_MINUTES * 60
+
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": round(self.progress, 4),
+            "rows": self.rows,
+            "total_rows": self.total_rows,
+            "filename": self.filename,
+            "params": self.params,
+            "error": self.error,
+            "created_at": _iso(self.created_at),
+            "finished_at": _iso(self.finished_at),
+            "expires_at": _iso(expires_at),
+        }
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(timestamp))
+
+
+class ExportJobManager:
+    """
+    Registro de jobs de exportação executados em um pool de threads
+    limitado. Novos jobs são recusados quando já há `max_pending` jobs
+    na fila ou em execução. Jobs finalizados (e seus arquivos) expiram
+    após `ttl_minutes`.
+    """
+
+    def __init__(
+        self,
+        base_dir: str,
+        max_workers: int = 2,
+        max_pending: int = 20,
+        ttl_minutes: int = 60
+    ):
+        self.base_dir = Path(base_dir)
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_minutes * 60
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export-job")
+        self._jobs: dict[str, ExportJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        kind: str,
+        filename: str,
+        media_type: str,
+        suffix: str,
+        params: dict,
+        work: Callable[[ExportJob], None]
+    ) -> ExportJob:
+        self.cleanup_expired()
+
+        with self._lock:
+            active = sum(1 for j in self._jobs.values() if j.status in ("queued", "running"))
+            if active >= self.max_pending:
+                raise BusinessLogicError(
+                    f"Limite de {self.max_pending} exportações simultâneas atingido. Tente novamente em instantes."
+                )
+
+            self.base_dir.mkdir(parents=True, exist_ok=True)
+            path = self.base_dir / f"{uuid.uuid4().hex}{suffix}"
+            job = ExportJob(kind, filename, media_type, path, params)
+            self._jobs[job.id] = job
+
+        self._executor.submit(self._run, job, work)
+        log_info(f"[EXPORT_JOB] Job {job.id} ({kind}) enfileirado")
+        return job
+
+    def _run(self, job: ExportJob, work: Callable[[ExportJob], None]) -> None:
+        job.status = "running"
+        try:
+            work(job)
+            job.progress = 1.0
+            job.status = "done"
+            log_info(f"[EXPORT_JOB] Job {job.id} concluído ({job.rows} linha(s))")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(getattr(e, "detail", e))
+            log_error(f"[EXPORT_JOB] Job {job.id} falhou: {e}")
+            for path in (job.path, job.path.with_suffix(".tmp")):
+                if path.exists():
+                    path.unlink()
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        self.cleanup_expired()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def latest(self, kind: str) -> Optional[ExportJob]:
+        """
+        Job de `kind` criado por último (ainda não expirado), se houver.
+        """
+        self.cleanup_expired()
+        with self._lock:
+            jobs = [j for j in self._jobs.values() if j.kind == kind]
+        return max(jobs, key=lambda j: j.created_at, default=None)
+
+    def find_active(self, kind: str) -> Optional[ExportJob]:
+        """
+        Job de `kind` ainda na fila ou em execução, se houver.
+        """
+        with self._lock:
+            return next(
+                (j for j in self._jobs.values() if j.kind == kind and j.status in ("queued", "running")),
+                None
+            )
+
+    def cleanup_expired(self) -> None:
+        """
+        Remove jobs finalizados há mais de `ttl_minutes` e seus arquivos.
+        """
+        now = time.time()
+        with self._lock:
+            expired = [
+                job for job in self._jobs.values()
+                if job.finished_at is not None and now - job.finished_at > self.ttl_seconds
+            ]
+            for job in expired:
+                del self._jobs[job.id]
+
+        for job in expired:
+            try:
+                if job.path.exists():
+                    job.path.unlink()
+            except OSError as e:
+                log_error(f"[EXPORT_JOB] Falha ao remover {job.path.name}: {e}")
+
+
+job_manager = ExportJobManager(
+    settings.EXPORT_JOBS_DIR,
+    max_workers=settings.EXPORT_JOB_WORKERS,
+    max_pending=settings.EXPORT_JOB_MAX_PENDING,
+    ttl_minutes=settings.EXPORT_JOB_TTL_MINUTES
+)
+
+
+# --------------------------------------------------------------------
+# Jobs disponíveis
+# --------------------------------------------------------------------
+def start_structure_excel_job(code: str) -> dict:
+    """
+    Gera a planilha de estrutura (get_structure_excel, com cache em disco)
+    em segundo plano.
+    """
+    def work(job: ExportJob) -> None:
+        cached_path, _ = get_structure_excel_cached(code)
+        shutil.copyfile(cached_path, job.path)
+
+    job = job_manager.submit(
+        "structure-excel",
+        f"Estrutura_{code}.xlsx",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        ".xlsx",
+        {"code": code},
+        work
+    )
+    return job.to_dict()
+
+
+def start_bom_cycles_job() -> dict:
+    """
+    Audita os ciclos da estrutura (list_bom_cycles lê toda a SG1010) em
+    segundo plano e grava o resultado em JSON. Se já houver uma auditoria
+    na fila ou em execução, devolve esse job em vez de criar outro.
+    """
+    active = job_manager.find_active("bom-cycles")
+    if active is not None:
+        return active.to_dict()
+
+    def work(job: ExportJob) -> None:
+        result = get_bom_cycles()
+        job.rows = result["total"]
+
+        tmp_path = job.path.with_suffix(".tmp")
+        tmp_path.write_bytes(dumps(result))
+        os.replace(tmp_path, job.path)
+
+    job = job_manager.submit(
+        "bom-cycles",
+        "Ciclos_Estrutura.json",
+        "application/json",
+        ".json",
+        {},
+        work
+    )
+    return job.to_dict()
+
+
+def get_latest_bom_cycles_audit() -> Optional[dict]:
+    """
+    Status da última auditoria de ciclos e, se concluída, o resultado.
+    Não inicia uma nova auditoria.
+    """
+    job = job_manager.latest("bom-cycles")
+    if job is None:
+        return None
+
+    audit = {"job": job.to_dict(), "result": None}
+    if job.status == "done" and job.path.exists():
+        audit["result"] = orjson.loads(job.path.read_bytes())
+    return audit
+
+
+INTERNAL_MOVEMENTS_COLUMNS = [
+    "branch", "location", "document", "issue_date",
+    "product_code", "product_description", "unit",
+    "movement_type", "cf", "quantity", "production_order", "user_name",
+]
+
+
+def start_internal_movements_job(
+    code: str,
+    date_start: Optional[str] = None,
+    date_end: Optional[str] = None,
+    branch: Optional[str] = None,
+    location: Optional[str] = None,
+    tm: Optional[str] = None,
+    op: Optional[str] = None
+) -> dict:
+    """
+    Exporta as movimentações internas (SD3010) para CSV em segundo plano,
+    lendo o resultado em blocos e atualizando o progresso por linha gravada.
+    """
+    filters = {
+        "date_start": date_start,
+        "date_end": date_end,
+        "branch": branch,
+        "location": location,
+        "tm": tm,
+        "op": op,
+    }
+
+    def work(job: ExportJob) -> None:
+        repo = ProductRepository()
+        job.total_rows = repo.list_internal_movements(code, 1, 1, **filters)["total"]
+
+        tmp_path = job.path.with_suffix(".tmp")
+        with open(tmp_path, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.DictWriter(f, fieldnames=INTERNAL_MOVEMENTS_COLUMNS, delimiter=";", extrasaction="ignore")
+            writer.writeheader()
+            for row in repo.iter_internal_movements(code, **filters):
+                writer.writerow(row)
+                job.rows += 1
+                if job.total_rows:
+                    job.progress = min(job.rows / job.total_rows, 0.99)
+        os.replace(tmp_path, job.path)
+
+    job = job_manager.submit(
+        "internal-movements",
+        f"Movimentacoes_{code}.csv",
+        "text/csv",
+        ".csv",
+        {"code": code, **filters},
+        work
+    )
+    return job.to_dict()
+
+
+def get_export_job(job_id: str) -> Optional[ExportJob]:
+    return job_manager.get(job_id)
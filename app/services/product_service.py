@@ -3,24 +3,35 @@ from app.repositories.product_repository import ProductRepository
 from app.models.product_model import Product
 from app.utils.logger import log_info, log_error
 from app.core.exceptions import BusinessLogicError, DatabaseConnectionError
-from typing import Optional
+from app.utils.export_cache import export_cache
+from app.utils.http_cache import STRUCTURE_TABLES, watermarks
+from typing import IO, Optional, Union
 
 import io
+import tempfile
+from datetime import datetime
+from pathlib import Path
 import pandas as pd
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Border, Side, Alignment
 from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.cell_range import CellRange, MultiCellRange
 
 
-def get_product(code: str) -> Product:
+def get_product(code: str, fields: Optional[str] = None) -> Product:
     """
     Busca um produto no Protheus via repositório e retorna um modelo Pydantic.
+    Com `fields`, só as colunas pedidas são lidas e o modelo é montado sem
+    validação (campos obrigatórios podem ter ficado de fora da projeção).
     """
     repo = ProductRepository()
     log_info(f"Iniciando consulta do produto {code} via repositório")
 
     try:
-        result = repo.get_product_by_code(code)
+        result = repo.get_product_by_code(code, fields)
+        if fields:
+            return Product.model_construct(**result["data"])
         return Product(**result["data"])
 
     except BusinessLogicError as e:
@@ -35,25 +46,123 @@ def get_product(code: str) -> Product:
 def search_products_by_description(
     description: str,
     page: int = 1,
-    page_size: int = 50
+    page_size: int = 50,
+    fields: Optional[str] = None,
+    shape: str = "records"
 ) -> dict:
     repo = ProductRepository()
     log_info(f"Search only by description (page={page})")
     try:
-        return repo.search_by_description(description, page, page_size)
+        return repo.search_by_description(description, page, page_size, fields, shape)
+    except BusinessLogicError as e:
+        log_error(str(e))
+        raise
     except Exception as e:
         log_error(f"Erro ao pesquisar produtos por descrição: {e}")
         raise DatabaseConnectionError(str(e))
 
-def get_structure(code: str, max_depth: int = 10, page: int = 1, page_size: int = 50) -> dict:
+def get_structure(code: str, max_depth: int = 10, page: int = 1, page_size: int = 50, mode: str = "tree", fields: Optional[str] = None) -> dict:
     repo = ProductRepository()
-    log_info(f"Buscando estrutura (CTE) paginada para {code}")
+    log_info(f"Buscando estrutura (CTE) paginada para {code} (modo {mode})")
     try:
-        return repo.list_structure(code, max_depth, page, page_size)
+        if mode == "graph":
+            return repo.list_structure_graph(code, max_depth)
+        return repo.list_structure(code, max_depth, page, page_size, fields)
+    except BusinessLogicError as e:
+        log_error(str(e))
+        raise
     except Exception as e:
         log_error(f"Erro ao listar estrutura do produto {code}: {e}")
         raise DatabaseConnectionError(str(e))
 
+def get_structure_bulk(codes: list[str], max_depth: int = 10) -> dict:
+    repo = ProductRepository()
+    log_info(f"Buscando estrutura em lote para {len(codes)} produto(s)")
+    try:
+        return repo.list_structure_bulk(codes, max_depth)
+    except Exception as e:
+        log_error(f"Erro ao listar estrutura em lote: {e}")
+        raise DatabaseConnectionError(str(e))
+
+def get_structure_diff(code: str, date_from: str, date_to: Optional[str] = None, max_depth: int = 50) -> dict:
+    repo = ProductRepository()
+    log_info(f"Comparando estrutura de {code} entre {date_from} e {date_to or 'hoje'}")
+    try:
+        return repo.list_structure_diff(code, date_from, date_to, max_depth)
+    except Exception as e:
+        log_error(f"Erro ao comparar estrutura do produto {code}: {e}")
+        raise DatabaseConnectionError(str(e))
+
+def get_structure_children(
+    code: str,
+    node: Optional[str] = None,
+    page: int = 1,
+    page_size: int = 100
+) -> dict:
+    repo = ProductRepository()
+    log_info(f"Buscando componentes diretos de {node or code} (raiz {code}, página {page})")
+    try:
+        return repo.list_structure_children(code, node, page, page_size)
+    except Exception as e:
+        log_error(f"Erro ao listar componentes de {node or code}: {e}")
+        raise DatabaseConnectionError(str(e))
+
+def get_structure_explosion(code: str, quantity: float = 1.0, include_intermediate: bool = False) -> dict:
+    repo = ProductRepository()
+    log_info(f"Explodindo estrutura de {code} para {quantity} unidade(s)")
+    try:
+        return repo.explode_structure(code, quantity, include_intermediate)
+    except Exception as e:
+        log_error(f"Erro ao explodir estrutura do produto {code}: {e}")
+        raise DatabaseConnectionError(str(e))
+
+def get_material_requirements(
+    code: str,
+    quantity: float,
+    branch: Optional[str] = None,
+    location: Optional[str] = None,
+    only_shortages: bool = False
+) -> dict:
+    repo = ProductRepository()
+    log_info(f"Calculando necessidades de material de {code} para {quantity} unidade(s)")
+    try:
+        return repo.get_material_requirements(code, quantity, branch, location, only_shortages)
+    except Exception as e:
+        log_error(f"Erro ao calcular necessidades de material do produto {code}: {e}")
+        raise DatabaseConnectionError(str(e))
+
+def get_lead_time_critical_path(
+    code: str,
+    quantity: float = 1.0,
+    branch: Optional[str] = None,
+    hours_per_day: float = 8.0
+) -> dict:
+    repo = ProductRepository()
+    log_info(f"Buscando caminho crítico de lead time de {code}")
+    try:
+        return repo.get_lead_time_critical_path(code, quantity, branch, hours_per_day)
+    except Exception as e:
+        log_error(f"Erro ao calcular caminho crítico do produto {code}: {e}")
+        raise DatabaseConnectionError(str(e))
+
+def get_cost_rollup(code: str, quantity: float = 1.0) -> dict:
+    repo = ProductRepository()
+    log_info(f"Buscando custo acumulado da estrutura de {code}")
+    try:
+        return repo.get_cost_rollup(code, quantity)
+    except Exception as e:
+        log_error(f"Erro ao calcular custo acumulado do produto {code}: {e}")
+        raise DatabaseConnectionError(str(e))
+
+def get_bom_cycles() -> dict:
+    repo = ProductRepository()
+    log_info("Auditando ciclos na estrutura (SG1010)")
+    try:
+        return repo.list_bom_cycles()
+    except Exception as e:
+        log_error(f"Erro ao auditar ciclos da estrutura: {e}")
+        raise DatabaseConnectionError(str(e))
+
 def get_parents(code: str, max_depth: int = 10, page: int = 1, page_size: int = 50) -> dict:
     repo = ProductRepository()
     log_info(f"Buscando pais (CTE) paginados para {code}")
@@ -63,6 +172,15 @@ def get_parents(code: str, max_depth: int = 10, page: int = 1, page_size: int =
         log_error(f"Erro ao listar produtos pai do item {code}: {e}")
         raise DatabaseConnectionError(str(e))
 
+def get_where_used_impact(code: str, max_depth: int = 50, include_intermediate: bool = False) -> dict:
+    repo = ProductRepository()
+    log_info(f"Buscando impacto (onde-usado) do produto {code}")
+    try:
+        return repo.get_where_used_impact(code, max_depth, include_intermediate)
+    except Exception as e:
+        log_error(f"Erro ao calcular impacto do produto {code}: {e}")
+        raise DatabaseConnectionError(str(e))
+
 def get_exclusive_materials(code: str, max_depth: int = 15) -> dict:
     repo = ProductRepository()
     log_info(f"Buscando estrutura com flag de exclusividade para {code}")
@@ -72,11 +190,11 @@ def get_exclusive_materials(code: str, max_depth: int = 15) -> dict:
         log_error(f"Erro ao listar matérias-primas exclusivas do item {code}: {e}")
         raise DatabaseConnectionError(str(e))
 
-def get_suppliers(code: str, page: int = 1, page_size: int = 50) -> dict:
+def get_suppliers(code: str, page: int = 1, page_size: int = 50, shape: str = "records") -> dict:
     repo = ProductRepository()
     log_info(f"Buscando fornecedores para {code} (página {page})")
     try:
-        return repo.list_suppliers(code, page, page_size)
+        return repo.list_suppliers(code, page, page_size, shape)
     except Exception as e:
         log_error(f"Erro ao listar fornecedores para {code}: {e}")
         raise DatabaseConnectionError(str(e))
@@ -88,16 +206,33 @@ def get_inbound_invoice_items(
     issue_date_start: Optional[str] = None,
     issue_date_end: Optional[str] = None,
     supplier: Optional[str] = None,
-    branch: Optional[str] = None
+    branch: Optional[str] = None,
+    fields: Optional[str] = None,
+    shape: str = "records"
 ) -> dict:
     repo = ProductRepository()
     log_info(f"Buscando NF-es de entrada de {code} (página {page})")
     try:
-        return repo.list_inbound_invoice_items(code, page, page_size, issue_date_start, issue_date_end, supplier, branch)
+        return repo.list_inbound_invoice_items(code, page, page_size, issue_date_start, issue_date_end, supplier, branch, fields, shape)
+    except BusinessLogicError as e:
+        log_error(str(e))
+        raise
     except Exception as e:
         log_error(f"Erro ao listar NF-es de entrada para {code}: {e}")
         raise DatabaseConnectionError(str(e))
 
+def iter_inbound_invoice_items_batches(
+    code: str,
+    issue_date_start: Optional[str] = None,
+    issue_date_end: Optional[str] = None,
+    supplier: Optional[str] = None,
+    branch: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    repo = ProductRepository()
+    log_info(f"Exportando NF-es de entrada de {code}")
+    return repo.iter_inbound_invoice_items_batches(code, issue_date_start, issue_date_end, supplier, branch, fields)
+
 def get_outbound_invoice_items(
     code: str,
     page: int = 1,
@@ -120,17 +255,55 @@ def get_stock(
     page: int = 1,
     page_size: int = 50,
     branch: Optional[str] = None,
-    location: Optional[str] = None
+    location: Optional[str] = None,
+    fields: Optional[str] = None,
+    shape: str = "records"
 ) -> dict:
     repo = ProductRepository()
     log_info(f"Buscando estoque para {code} (página {page})")
 
     try:
-        return repo.list_stock(code, page, page_size, branch, location)
+        return repo.list_stock(code, page, page_size, branch, location, fields, shape)
+    except BusinessLogicError as e:
+        log_error(str(e))
+        raise
     except Exception as e:
         log_error(f"Erro ao listar estoque para {code}: {e}")
         raise DatabaseConnectionError(str(e))
 
+def iter_stock_batches(
+    code: str,
+    branch: Optional[str] = None,
+    location: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    repo = ProductRepository()
+    log_info(f"Exportando estoque de {code}")
+    return repo.iter_stock_batches(code, branch, location, fields)
+
+def get_stock_bulk(
+    codes: list[str],
+    branch: Optional[str] = None,
+    location: Optional[str] = None
+) -> dict:
+    repo = ProductRepository()
+    log_info(f"Buscando estoque em lote para {len(codes)} produto(s)")
+
+    try:
+        return repo.list_stock_bulk(codes, branch, location)
+    except Exception as e:
+        log_error(f"Erro ao listar estoque em lote: {e}")
+        raise DatabaseConnectionError(str(e))
+
+def iter_stock_bulk(
+    codes: list[str],
+    branch: Optional[str] = None,
+    location: Optional[str] = None
+):
+    repo = ProductRepository()
+    log_info(f"Transmitindo estoque em lote para {len(codes)} produto(s)")
+    return repo.iter_stock_bulk(codes, branch, location)
+
 def get_guide(
     code: str,
     page: int = 1,
@@ -151,14 +324,19 @@ def get_inspection(
     code: str,
     page: int = 1,
     page_size: int = 50,
-    max_depth: int = 10
-) -> dict:
-
+    max_depth: int = 10,
+    raw: bool = False
+) -> Union[dict, bytes]:
+    """
+    Definição de inspeção (QP6/QP7/QP8) do produto e componentes.
+    Com raw=True devolve o JSON montado pelo SQL Server como bytes,
+    sem decodificar (ver raw_success_response).
+    """
     repo = ProductRepository()
     log_info(f"Buscando inspeções de processo para {code} (página {page})")
 
     try:
-        return repo.list_inspection_definition(code, max_depth)
+        return repo.list_inspection_definition(code, max_depth, raw=raw)
     except Exception as e:
         log_error(f"Erro ao listar inspeções para {code}: {e}")
         raise DatabaseConnectionError(str(e))
@@ -197,11 +375,11 @@ def get_product_analyser(
         log_error(f"Erro ao montar análise completa do produto {code}: {e}")
         raise DatabaseConnectionError(str(e))
 
-def get_customers(code: str, page: int = 1, page_size: int = 50) -> dict:
+def get_customers(code: str, page: int = 1, page_size: int = 50, shape: str = "records") -> dict:
     repo = ProductRepository()
     log_info(f"Buscando clientes amarrados ao produto {code} (página {page})")
     try:
-        return repo.list_customers(code, page, page_size)
+        return repo.list_customers(code, page, page_size, shape)
     except Exception as e:
         log_error(f"Erro ao listar clientes para o produto {code}: {e}")
         raise DatabaseConnectionError(str(e))
@@ -419,18 +597,17 @@ def get_structure_excel2(code: str) -> io.BytesIO:
 # --------------------------------------------------------------------
 # ESTRUTURA EM TABELA DE EXCEL (COM PARENT_FACTOR ACUMULATIVO)
 # --------------------------------------------------------------------
-def get_structure_excel(code: str) -> io.BytesIO:
+def get_structure_excel(code: str) -> IO[bytes]:
     """
     Gera a planilha Excel no formato oficial DELPI:
     - Produto acabado no topo
     - Intermediários agrupados
     - Matérias-primas com quantidade final acumulada
     - parent_factor acumulativo: PA(1) → PI → MP
+
+    Usa workbook write-only com estilos pré-computados; o arquivo é
+    devolvido posicionado no início, pronto para ser lido em blocos.
     """
-    import io
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, Border, Side
-    from openpyxl.utils import get_column_letter
     from string import ascii_uppercase
 
     repo = ProductRepository()
@@ -534,14 +711,38 @@ def get_structure_excel(code: str) -> io.BytesIO:
             r[2] = item_map[comp_code]
 
     # ------------------------------------------------------------------
-    # Criação da planilha Excel
+    # Quantidade final (MP + parent_factor) e destaque por linha
     # ------------------------------------------------------------------
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Estrutura DELPI"
+    for r in rows:
+        comp_meta = meta_map.get(str(r[4] or "").strip())
+        if not comp_meta:
+            r.append(False)
+            continue
+
+        try:
+            qtd = float(str(r[3]).replace(",", "."))
+        except Exception:
+            qtd = 0
+
+        if comp_meta["unit"] == "PC":
+            qtd = qtd / 1000 if qtd % 1000 == 0 else 1
+        else:
+            qtd = 1
+
+        r[3] = qtd * r[8]
+        r.append(r[3] >= 2)  # 🔴 Destaque: MP + QTD >= 2
+
+    # ------------------------------------------------------------------
+    # Criação da planilha Excel (write-only: linhas gravadas em sequência)
+    # ------------------------------------------------------------------
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Estrutura DELPI")
 
     headers = ["Código", "Descrição", "Item", "QTD", "Componente", "Descrição"]
-    ws.append(headers)
+
+    # Em modo write-only as larguras precisam ser definidas antes das linhas
+    for col in range(1, len(headers) + 1):
+        ws.column_dimensions[get_column_letter(col)].width = 50 if col in [2, 6] else 14
 
     font_name = "Arial Narrow"
     font_size = 10
@@ -553,106 +754,111 @@ def get_structure_excel(code: str) -> io.BytesIO:
     align_left = Alignment(horizontal="left", vertical="center", wrap_text=True)
 
     header_font = Font(bold=True, color="0000FF", name=font_name, size=font_size)
-    normal_font = Font(color="000000", name=font_name, size=font_size)
     red_font = Font(color="FF0000", name=font_name, size=font_size)
     blue_font = Font(color="0000FF", name=font_name, size=font_size)
 
-    for col in range(1, len(headers) + 1):
-        c = ws.cell(row=1, column=col)
-        c.font = header_font
-        c.alignment = align_center
-        c.border = border
-        ws.column_dimensions[get_column_letter(col)].width = 50 if col in [2, 6] else 14
-
-    for r in rows:
-        ws.append(r[:6])
-
-    for row in ws.iter_rows(min_row=2, max_row=ws.max_row, max_col=len(headers)):
-        for c in row:
-            c.border = border
-            c.alignment = align_left if c.column in [2, 6] else align_center
-            c.font = normal_font
-
-    # ------------------------------------------------------------------
-    # Mesclar Código / Descrição por agrupamento
-    # ------------------------------------------------------------------
-    current_parent = None
-    start_row = 2
-
-    for i in range(2, ws.max_row + 1):
-        parent = ws.cell(row=i, column=1).value
-        if parent != current_parent:
-            if current_parent is not None and start_row < i - 1:
-                ws.merge_cells(start_row=start_row, start_column=1, end_row=i - 1, end_column=1)
-                ws.merge_cells(start_row=start_row, start_column=2, end_row=i - 1, end_column=2)
-            start_row = i
-            current_parent = parent
-
-    if current_parent and start_row < ws.max_row:
-        ws.merge_cells(start_row=start_row, start_column=1, end_row=ws.max_row, end_column=1)
-        ws.merge_cells(start_row=start_row, start_column=2, end_row=ws.max_row, end_column=2)
+    # Fontes/alinhamentos por coluna montados uma única vez: as linhas só
+    # reaproveitam os mesmos objetos, sem criar Font/Alignment por célula
+    def column_styles(font_for_col) -> list[tuple[Font, Alignment]]:
+        return [
+            (font_for_col(col), align_left if col in [2, 6] else align_center)
+            for col in range(1, len(headers) + 1)
+        ]
+
+    header_styles = [(header_font, align_center)] * len(headers)
+    blue_styles = column_styles(lambda col: blue_font)
+    red_styles = column_styles(lambda col: red_font if 3 <= col <= 6 else blue_font)
+
+    def styled_row(values: list, styles: list[tuple[Font, Alignment]]) -> list:
+        cells = []
+        for value, (font, alignment) in zip(values, styles):
+            cell = WriteOnlyCell(ws, value=value)
+            cell.font = font
+            cell.alignment = alignment
+            cell.border = border
+            cells.append(cell)
+        return cells
+
+    ws.append(styled_row(headers, header_styles))
 
     # ------------------------------------------------------------------
-    # Ajuste FINAL da quantidade (MP + parent_factor)
+    # Linhas + mesclagem de Código / Descrição por agrupamento
+    # (somente a 1ª linha do grupo recebe os valores)
     # ------------------------------------------------------------------
-    for idx, row in enumerate(
-        ws.iter_rows(min_row=2, max_row=ws.max_row, max_col=len(headers)),
-        start=0
-    ):
-        qtd_cell = row[3].value
-        comp_code = str(row[4].value or "").strip()
+    # Os grupos não se sobrepõem, então os intervalos são montados de uma
+    # vez (MultiCellRange.add verifica sobreposição contra todos os demais)
+    merges: list[CellRange] = []
 
-        comp_meta = meta_map.get(comp_code)
-        if not comp_meta:
-            for c in row:
-                c.font = blue_font
-            continue
+    def merge_group(first: int, last: int):
+        merges.append(CellRange(min_col=1, min_row=first, max_col=1, max_row=last))
+        merges.append(CellRange(min_col=2, min_row=first, max_col=2, max_row=last))
 
-        comp_unit = comp_meta["unit"]
-
-        try:
-            qtd = float(str(qtd_cell).replace(",", "."))
-        except Exception:
-            qtd = 0
-
-        parent_factor = rows[idx][8] if len(rows[idx]) > 8 else 1
+    start_row = 2
+    for i, r in enumerate(rows):
+        excel_row = i + 2
+        first_of_group = i == 0 or r[0] != rows[i - 1][0]
 
-        if comp_unit == "PC":
-            qtd = qtd / 1000 if qtd % 1000 == 0 else 1
-        else:
-            qtd = 1
+        if first_of_group:
+            if i > 0 and start_row < excel_row - 1:
+                merge_group(start_row, excel_row - 1)
+            start_row = excel_row
 
-        qtd_final = qtd * parent_factor
-        row[3].value = qtd_final
+        values = r[:6] if first_of_group else [None, None, *r[2:6]]
+        ws.append(styled_row(values, red_styles if r[9] else blue_styles))
 
-        # 🔵 Cor base azul
-        for c in row:
-            c.font = blue_font
+    last_row = len(rows) + 1
+    if rows and rows[-1][0] and start_row < last_row:
+        merge_group(start_row, last_row)
 
-        # 🔴 Destaque: MP + PC + QTD >= 2
-        if qtd_final >= 2:
-            for c in row[2:6]:
-                c.font = red_font
+    ws.merged_cells = MultiCellRange(merges)
 
     # ------------------------------------------------------------------
-    # Retorno do Excel
+    # Retorno do Excel (em memória até 16 MB, depois em disco)
     # ------------------------------------------------------------------
-    stream = io.BytesIO()
+    stream = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
     wb.save(stream)
     stream.seek(0)
     return stream
 
 
+def get_structure_excel_cached(code: str) -> tuple[Path, str]:
+    """
+    Devolve (arquivo, ETag) da planilha de estrutura, gerando-a somente
+    quando a versão em cache não corresponde mais aos dados.
+
+    A versão combina o watermark de SG1010 (estrutura) e SB1010 (tipo,
+    unidade e descrição) com a data atual, já que a vigência (G1_FIM)
+    muda a estrutura visível de um dia para o outro. Os tokens vêm do
+    cache de watermarks (TTL + eventos do monitor de alterações), então
+    downloads seguidos não consultam as tabelas a cada vez.
+    """
+    try:
+        version = "|".join([
+            datetime.now().strftime("%Y%m%d"),
+            watermarks.version(STRUCTURE_TABLES),
+        ])
+    except Exception as e:
+        log_error(f"Erro ao consultar watermark da estrutura de {code}: {e}")
+        raise DatabaseConnectionError(str(e))
+
+    path = export_cache.get_or_create(
+        "structure", code, version, ".xlsx",
+        lambda: get_structure_excel(code)
+    )
+    return path, export_cache.etag("structure", code, version)
+
+
 def get_purchases(
     code: str,
     page: int = 1,
-    page_size: int = 50
+    page_size: int = 50,
+    shape: str = "records"
 ) -> dict:
     repo = ProductRepository()
     log_info(f"Buscando histórico de compras do produto {code}")
 
     try:
-        return repo.list_purchases(code, page, page_size)
+        return repo.list_purchases(code, page, page_size, shape)
     except Exception as e:
         log_error(f"Erro ao listar compras do produto {code}: {e}")
         raise DatabaseConnectionError(str(e))
@@ -736,7 +942,9 @@ def get_internal_movements(
     branch: Optional[str] = None,
     location: Optional[str] = None,
     tm: Optional[str] = None,
-    op: Optional[str] = None
+    op: Optional[str] = None,
+    fields: Optional[str] = None,
+    shape: str = "records"
 ) -> dict:
 
     repo = ProductRepository()
@@ -752,8 +960,37 @@ def get_internal_movements(
             branch,
             location,
             tm,
-            op
+            op,
+            fields,
+            shape
         )
+    except BusinessLogicError as e:
+        log_error(str(e))
+        raise
     except Exception as e:
         log_error(f"Erro ao buscar movimentações internas do produto {code}: {e}")
         raise DatabaseConnectionError(str(e))
+
+
+def iter_internal_movements_batches(
+    code: str,
+    date_start: Optional[str] = None,
+    date_end: Optional[str] = None,
+    branch: Optional[str] = None,
+    location: Optional[str] = None,
+    tm: Optional[str] = None,
+    op: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    repo = ProductRepository()
+    log_info(f"Exportando movimentações internas do produto {code}")
+    return repo.iter_internal_movements_batches(
+        code,
+        date_start=date_start,
+        date_end=date_end,
+        branch=branch,
+        location=location,
+        tm=tm,
+        op=op,
+        fields=fields
+    )
@@ -3,16 +3,17 @@
 from app.repositories.system_repository import SystemRepository
 from app.models.product_model import Product
 from app.utils.logger import log_info, log_error
+from app.utils.query_stats import query_stats
 from app.core.exceptions import BusinessLogicError, DatabaseConnectionError
 
-def get_columns_table(tableName: str, page: int = 1, limit: int = 50) -> dict:
+def get_columns_table(tableName: str, page: int = 1, limit: int = 50, fields: str | None = None) -> dict:
     """
     Busca as colunas de uma tabela com paginação e totalização.
     """
     repo = SystemRepository()
     log_info(f"Iniciando consulta às colunas da tabela {tableName} (página {page}, limite {limit}) via repositório")
     try:
-        result = repo.get_columns_table(tableName, page, limit)
+        result = repo.get_columns_table(tableName, page, limit, fields)
         return result
     except BusinessLogicError as e:
         log_error(str(e))
@@ -21,14 +22,14 @@ def get_columns_table(tableName: str, page: int = 1, limit: int = 50) -> dict:
         log_error(f"Erro inesperado ao buscar colunas da tabela {tableName}: {e}")
         raise DatabaseConnectionError(str(e))
 
-def get_table(tableName: str) ->dict:
+def get_table(tableName: str, fields: str | None = None) ->dict:
     """
     Busca uma tabela no Protheus via repositório.
     """
     repo = SystemRepository()
     log_info(f"Iniciando consulta a tabela {tableName} via repositório")
     try:
-        result = repo.get_table(tableName)
+        result = repo.get_table(tableName, fields)
         return result
     except BusinessLogicError as e:
         log_error(str(e))
@@ -149,3 +150,20 @@ def get_table_schema(tableName: str):
     repo = SystemRepository()
     log_info(f"Service: montando schema completo da tabela {tableName}")
     return repo.get_table_schema(tableName)
+
+def get_query_stats(order_by: str = "total_ms", limit: int = 50) -> dict:
+    """
+    Estatísticas de execução das consultas (por fingerprint), das mais
+    custosas para as menos custosas segundo `order_by`.
+    """
+    data = query_stats.snapshot(order_by, limit)
+    return {
+        "slow_query_ms": query_stats.slow_query_ms,
+        "window": query_stats.window,
+        "total": len(data),
+        "data": data,
+    }
+
+def reset_query_stats() -> None:
+    log_info("Service: zerando estatísticas de consultas")
+    query_stats.reset()
@@ -0,0 +1,460 @@
+# app/utils/bom_graph.py
+from collections import deque
+from typing import Iterable, Iterator
+
+import numpy as np
+
+
+class BomGraph:
+    """
+    Grafo dirigido da estrutura (SG1010): pai → componente, com a
+    quantidade do componente por unidade do pai.
+
+    Os nós são indexados uma única vez e as arestas ficam em arrays numpy,
+    de modo que as propagações (explosão, roll-ups) rodam nível a nível
+    com operações vetorizadas em vez de percorrer a árvore por caminho.
+    Arestas repetidas (mesmo pai/componente) têm as quantidades somadas.
+    `nodes` garante a presença de nós sem arestas (ex.: raiz sem estrutura).
+    """
+
+    def __init__(self, edges: Iterable[tuple[str, str, float]], nodes: Iterable[str] = ()):
+        self.index: dict[str, int] = {}
+        self.codes: list[str] = []
+
+        for code in nodes:
+            self._node(code)
+
+        merged: dict[tuple[int, int], float] = {}
+        for parent, child, quantity in edges:
+            key = (self._node(parent), self._node(child))
+            merged[key] = merged.get(key, 0.0) + float(quantity or 0)
+
+        self.src = np.fromiter((k[0] for k in merged), dtype=np.int64, count=len(merged))
+        self.dst = np.fromiter((k[1] for k in merged), dtype=np.int64, count=len(merged))
+        self.qty = np.fromiter(merged.values(), dtype=np.float64, count=len(merged))
+
+        self.cycles: list[list[str]] = []
+        self._index_children()
+
+    def _index_children(self) -> None:
+        self.children: list[list[int]] = [[] for _ in self.codes]
+        self.parents: list[list[int]] = [[] for _ in self.codes]
+        for e, (s, d) in enumerate(zip(self.src.tolist(), self.dst.tolist())):
+            self.children[s].append(e)
+            self.parents[d].append(e)
+
+    def _adjacent(self, node: int, upward: bool = False) -> Iterator[tuple[int, int]]:
+        """
+        Pares (aresta, vizinho) de `node`: componentes, ou pais se `upward`.
+        """
+        if upward:
+            return ((e, int(self.src[e])) for e in self.parents[node])
+        return ((e, int(self.dst[e])) for e in self.children[node])
+
+    def _node(self, code: str) -> int:
+        idx = self.index.get(code)
+        if idx is None:
+            idx = len(self.codes)
+            self.index[code] = idx
+            self.codes.append(code)
+        return idx
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    # ---------------------------
+    # 🔹 Travessia
+    # ---------------------------
+    def reachable(self, root: str, upward: bool = False) -> np.ndarray:
+        """
+        Máscara booleana dos nós alcançáveis a partir de `root` (inclusive),
+        descendo pelos componentes ou, com `upward`, subindo pelos pais.
+        """
+        mask = np.zeros(len(self.codes), dtype=bool)
+        start = self.index.get(root)
+        if start is None:
+            return mask
+
+        mask[start] = True
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            for _, child in self._adjacent(node, upward):
+                if not mask[child]:
+                    mask[child] = True
+                    queue.append(child)
+        return mask
+
+    def distances(self, root: str, upward: bool = False) -> np.ndarray:
+        """
+        Menor distância em arestas de `root` até cada nó (-1 para nós fora
+        do escopo). É o nível em que uma CTE cortada por profundidade
+        alcança o nó pela primeira vez.
+        """
+        distance = np.full(len(self.codes), -1, dtype=np.int64)
+        start = self.index.get(root)
+        if start is None:
+            return distance
+
+        distance[start] = 0
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            for _, child in self._adjacent(node, upward):
+                if distance[child] < 0:
+                    distance[child] = distance[node] + 1
+                    queue.append(child)
+        return distance
+
+    def drop_back_edges(self, root: str, upward: bool = False) -> list[list[str]]:
+        """
+        Remove as arestas que fecham ciclos (back edges) alcançáveis a partir
+        de `root`, via DFS iterativa, e devolve cada ciclo como lista de
+        códigos no sentido pai → componente (o primeiro código se repete
+        no final). Com `upward` a busca sobe pelos pais (onde-usado).
+
+        Depois disso o escopo de `root` é acíclico e os demais métodos podem
+        ser usados normalmente; os ciclos ficam em `self.cycles`.
+        """
+        start = self.index.get(root)
+        if start is None:
+            return []
+
+        # 0 = não visitado, 1 = na pilha, 2 = finalizado
+        state = np.zeros(len(self.codes), dtype=np.int8)
+        back_edges: list[int] = []
+        cycles: list[list[str]] = []
+
+        path = [start]
+        stack = [(start, self._adjacent(start, upward))]
+        state[start] = 1
+        while stack:
+            node, pending = stack[-1]
+            step = next(pending, None)
+            if step is None:
+                state[node] = 2
+                stack.pop()
+                path.pop()
+                continue
+
+            e, child = step
+            if state[child] == 1:
+                back_edges.append(e)
+                loop = path[path.index(child):] + [child]
+                if upward:
+                    loop.reverse()
+                cycles.append([self.codes[i] for i in loop])
+            elif state[child] == 0:
+                state[child] = 1
+                path.append(child)
+                stack.append((child, self._adjacent(child, upward)))
+
+        if back_edges:
+            keep = np.ones(self.src.size, dtype=bool)
+            keep[back_edges] = False
+            self.src, self.dst, self.qty = self.src[keep], self.dst[keep], self.qty[keep]
+            self._index_children()
+
+        self.cycles.extend(cycles)
+        return cycles
+
+    def strongly_connected_components(self) -> list[list[str]]:
+        """
+        Componentes fortemente conexas com mais de um nó (ou com laço
+        próprio), ou seja, os grupos de produtos que formam ciclos na
+        estrutura. Tarjan iterativo, O(V + E).
+        """
+        n = len(self.codes)
+        order = np.full(n, -1, dtype=np.int64)
+        low = np.zeros(n, dtype=np.int64)
+        on_stack = np.zeros(n, dtype=bool)
+        self_loop = np.zeros(n, dtype=bool)
+        self_loop[self.src[self.src == self.dst]] = True
+
+        stack: list[int] = []
+        components: list[list[str]] = []
+        counter = 0
+
+        for root in range(n):
+            if order[root] >= 0:
+                continue
+
+            work = [(root, iter(self.children[root]))]
+            order[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+
+            while work:
+                node, pending = work[-1]
+                e = next(pending, None)
+                if e is not None:
+                    child = int(self.dst[e])
+                    if order[child] < 0:
+                        order[child] = low[child] = counter
+                        counter += 1
+                        stack.append(child)
+                        on_stack[child] = True
+                        work.append((child, iter(self.children[child])))
+                    elif on_stack[child]:
+                        low[node] = min(low[node], order[child])
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+
+                if low[node] == order[node]:
+                    members = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        members.append(member)
+                        if member == node:
+                            break
+                    if len(members) > 1 or self_loop[node]:
+                        components.append(sorted(self.codes[m] for m in members))
+
+        return components
+
+    def cycle_path(self, codes: Iterable[str]) -> list[str]:
+        """
+        Um ciclo de exemplo dentro do grupo `codes` (uma componente
+        fortemente conexa), começando e terminando no menor código.
+        """
+        members = {self.index[c] for c in codes if c in self.index}
+        if not members:
+            return []
+
+        start = self.index[min(self.codes[m] for m in members)]
+        parent: dict[int, int] = {start: -1}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            for e in self.children[node]:
+                child = int(self.dst[e])
+                if child == start:
+                    path = [start]
+                    while node != -1:
+                        path.append(node)
+                        node = parent[node]
+                    return [self.codes[i] for i in reversed(path)]
+                if child in members and child not in parent:
+                    parent[child] = node
+                    queue.append(child)
+        return []
+
+    def levels(self, root: str, upward: bool = False) -> np.ndarray:
+        """
+        Nível mais profundo de cada nó alcançável a partir de `root`
+        (maior distância em arestas; -1 para nós fora do escopo).
+
+        Todo pai fica em nível menor que seus componentes, então
+        processar as arestas por nível do pai respeita a ordem topológica.
+        Com `upward` os níveis são contados subindo pelos pais.
+        """
+        scope = self.reachable(root, upward)
+        level = np.full(len(self.codes), -1, dtype=np.int64)
+        if not scope.any():
+            return level
+
+        in_scope = scope[self.src] & scope[self.dst]
+        targets = self.src if upward else self.dst
+        indegree = np.bincount(targets[in_scope], minlength=len(self.codes))
+
+        start = self.index[root]
+        level[start] = 0
+        queue = deque([start])
+        processed = 0
+        while queue:
+            node = queue.popleft()
+            processed += 1
+            for _, child in self._adjacent(node, upward):
+                level[child] = max(level[child], level[node] + 1)
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    queue.append(child)
+
+        if processed < int(scope.sum()):
+            raise ValueError(f"Estrutura de {root} contém ciclo.")
+
+        return level
+
+    def _edge_layers(self, level: np.ndarray, upward: bool = False):
+        """
+        Arestas do escopo agrupadas pelo nível do pai (ou do componente,
+        se `upward`), em ordem crescente.
+        """
+        edge_level = level[self.dst if upward else self.src]
+        valid = np.nonzero(edge_level >= 0)[0]
+        order = valid[np.argsort(edge_level[valid], kind="stable")]
+        if order.size == 0:
+            return
+
+        sorted_levels = edge_level[order]
+        bounds = np.flatnonzero(np.diff(sorted_levels)) + 1
+        for chunk in np.split(order, bounds):
+            yield chunk
+
+    # ---------------------------
+    # 🔹 Explosão
+    # ---------------------------
+    def explode(self, root: str, quantity: float = 1.0) -> np.ndarray:
+        """
+        Quantidade total requerida de cada nó para `quantity` unidades de
+        `root`, somando todos os caminhos (sub-conjuntos compartilhados
+        são agregados).
+        """
+        level = self.levels(root)
+        required = np.zeros(len(self.codes), dtype=np.float64)
+        if root not in self.index:
+            return required
+
+        required[self.index[root]] = quantity
+        for layer in self._edge_layers(level):
+            np.add.at(required, self.dst[layer], required[self.src[layer]] * self.qty[layer])
+
+        return required
+
+    def leaves(self, root: str) -> list[int]:
+        """
+        Índices dos nós alcançáveis sem componentes (folhas da estrutura).
+        """
+        scope = self.reachable(root)
+        return [i for i in np.flatnonzero(scope).tolist() if not self.children[i]]
+
+    def net_requirements(
+        self,
+        root: str,
+        quantity: float,
+        available: np.ndarray,
+        on_order: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Explosão com netting nível a nível (estilo MRP): a necessidade bruta
+        de cada nó é abatida do saldo disponível e das compras em aberto, e
+        somente a necessidade líquida desce para os componentes.
+
+        O produto raiz não é abatido: `quantity` é o que se quer produzir.
+        Retorna (bruta, líquida) por nó.
+        """
+        level = self.levels(root)
+        gross = np.zeros(len(self.codes), dtype=np.float64)
+        net = np.zeros(len(self.codes), dtype=np.float64)
+        if root not in self.index:
+            return gross, net
+
+        layers = {int(level[self.src[chunk[0]]]): chunk for chunk in self._edge_layers(level)}
+        gross[self.index[root]] = quantity
+
+        for current in range(int(level.max()) + 1):
+            nodes = level == current
+            net[nodes] = np.maximum(gross[nodes] - available[nodes] - on_order[nodes], 0.0)
+            if current == 0:
+                net[self.index[root]] = quantity
+
+            layer = layers.get(current)
+            if layer is not None:
+                np.add.at(gross, self.dst[layer], net[self.src[layer]] * self.qty[layer])
+
+        return gross, net
+
+    # ---------------------------
+    # 🔹 Onde-usado (impacto)
+    # ---------------------------
+    def where_used(self, code: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Propaga `code` para cima pela adjacência reversa: para cada
+        ancestral, quantas unidades de `code` são consumidas por unidade
+        dele (Σ por caminho do produto das quantidades) e por quantos
+        caminhos distintos ele chega ao item.
+
+        Retorna (multiplicador, caminhos, nível) por nó; nível -1 indica
+        nó fora do escopo.
+        """
+        level = self.levels(code, upward=True)
+        multiplier = np.zeros(len(self.codes), dtype=np.float64)
+        paths = np.zeros(len(self.codes), dtype=np.int64)
+        if code not in self.index:
+            return multiplier, paths, level
+
+        start = self.index[code]
+        multiplier[start] = 1.0
+        paths[start] = 1
+        for layer in self._edge_layers(level, upward=True):
+            np.add.at(multiplier, self.src[layer], multiplier[self.dst[layer]] * self.qty[layer])
+            np.add.at(paths, self.src[layer], paths[self.dst[layer]])
+
+        return multiplier, paths, level
+
+    # ---------------------------
+    # 🔹 Roll-up de custo
+    # ---------------------------
+    def rollup(self, root: str, leaf_value: np.ndarray) -> np.ndarray:
+        """
+        Valor unitário de cada nó somado de baixo para cima: folhas valem
+        `leaf_value`, demais nós valem Σ quantidade × valor do componente.
+
+        Cada nó é calculado uma única vez (memoização por nível), então
+        sub-conjuntos compartilhados não são recalculados por caminho.
+        """
+        level = self.levels(root)
+        value = np.zeros(len(self.codes), dtype=np.float64)
+        subtotal = np.zeros(len(self.codes), dtype=np.float64)
+        if root not in self.index:
+            return value
+
+        has_children = np.array([bool(c) for c in self.children], dtype=bool)
+        dst_level = level[self.dst]
+        in_scope = level[self.src] >= 0
+
+        for current in range(int(level.max()), -1, -1):
+            nodes = level == current
+            value[nodes] = np.where(has_children[nodes], subtotal[nodes], leaf_value[nodes])
+
+            edges = np.flatnonzero(in_scope & (dst_level == current))
+            if edges.size:
+                np.add.at(subtotal, self.src[edges], self.qty[edges] * value[self.dst[edges]])
+
+        return value
+
+    # ---------------------------
+    # 🔹 Caminho crítico
+    # ---------------------------
+    def longest_path(self, root: str, weight: np.ndarray) -> tuple[np.ndarray, list[int]]:
+        """
+        Caminho mais longo (soma de `weight` por nó) de `root` até uma folha.
+
+        `total[i]` é o tempo acumulado do nó i até o fim da sua sub-estrutura
+        (peso próprio + maior total entre os componentes). Os nós são
+        finalizados do nível mais profundo para o raiz, e cada nível propaga
+        seu total para os pais com np.maximum.at.
+        Retorna (total por nó, índices do caminho crítico a partir do raiz).
+        """
+        level = self.levels(root)
+        total = np.zeros(len(self.codes), dtype=np.float64)
+        best = np.zeros(len(self.codes), dtype=np.float64)
+        if root not in self.index:
+            return total, []
+
+        dst_level = level[self.dst]
+        in_scope = level[self.src] >= 0
+
+        for current in range(int(level.max()), -1, -1):
+            nodes = level == current
+            total[nodes] = weight[nodes] + best[nodes]
+
+            edges = np.flatnonzero(in_scope & (dst_level == current))
+            if edges.size:
+                np.maximum.at(best, self.src[edges], total[self.dst[edges]])
+
+        path = [self.index[root]]
+        while self.children[path[-1]]:
+            node = path[-1]
+            path.append(max(
+                (int(self.dst[e]) for e in self.children[node]),
+                key=lambda child: total[child]
+            ))
+
+        return total, path
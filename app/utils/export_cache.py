@@ -0,0 +1,114 @@
+# app/utils/export_cache.py
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from email.utils import formatdate
+from pathlib import Path
+from typing import IO, Callable, Optional
+
+from app.config import settings
+from app.utils.logger import log_info, log_error
+
+
+class ExportCache:
+    """
+    Cache em disco de arquivos exportados (xlsx/csv).
+
+    Cada arquivo é identificado por tipo + chave (ex.: código do produto)
+    + versão (watermark das tabelas de origem). Ao gravar uma nova versão,
+    as versões anteriores da mesma chave são removidas.
+    """
+
+    def __init__(self, base_dir: Optional[str] = None):
+        self.base_dir = Path(base_dir or settings.EXPORT_CACHE_DIR)
+
+    @staticmethod
+    def _safe(value: str) -> str:
+        return re.sub(r"[^A-Za-z0-9_.-]", "_", str(value).strip()) or "_"
+
+    @staticmethod
+    def etag(kind: str, key: str, version: str) -> str:
+        digest = hashlib.sha1(f"{kind}|{key}|{version}".encode("utf-8")).hexdigest()
+        return f'"{digest}"'
+
+    def _prefix(self, kind: str, key: str) -> str:
+        """
+        `_safe(key)` deixa o nome legível, mas não é injetivo ("12/3" e
+        "12_3" viram o mesmo texto): o hash da chave original separa as chaves.
+        """
+        key_digest = hashlib.sha1(str(key).encode("utf-8")).hexdigest()[:12]
+        return f"{self._safe(kind)}_{self._safe(key)}_{key_digest}_"
+
+    def path_for(self, kind: str, key: str, version: str, suffix: str) -> Path:
+        digest = hashlib.sha1(version.encode("utf-8")).hexdigest()[:16]
+        return self.base_dir / f"{self._prefix(kind, key)}{digest}{suffix}"
+
+    def _versions_of(self, kind: str, key: str, suffix: str) -> list[Path]:
+        """
+        Arquivos de todas as versões desta chave (prefixo exato + digest
+        de 16 hex), sem pegar chaves que apenas começam igual.
+        """
+        pattern = re.compile(re.escape(self._prefix(kind, key)) + r"[0-9a-f]{16}" + re.escape(suffix))
+        return [p for p in self.base_dir.iterdir() if pattern.fullmatch(p.name)]
+
+    def get(self, kind: str, key: str, version: str, suffix: str) -> Optional[Path]:
+        path = self.path_for(kind, key, version, suffix)
+        return path if path.is_file() else None
+
+    def store(self, kind: str, key: str, version: str, suffix: str, file: IO[bytes]) -> Path:
+        """
+        Grava o conteúdo de `file` de forma atômica (arquivo temporário +
+        os.replace) e remove versões antigas da mesma chave.
+        """
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        path = self.path_for(kind, key, version, suffix)
+
+        fd, tmp_name = tempfile.mkstemp(dir=self.base_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(file, out, 1024 * 1024)
+            os.replace(tmp_name, path)
+        except Exception:
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+            raise
+
+        for old in self._versions_of(kind, key, suffix):
+            if old != path:
+                try:
+                    old.unlink()
+                except OSError as e:
+                    log_error(f"[EXPORT_CACHE] Falha ao remover {old.name}: {e}")
+
+        return path
+
+    def get_or_create(
+        self,
+        kind: str,
+        key: str,
+        version: str,
+        suffix: str,
+        build: Callable[[], IO[bytes]]
+    ) -> Path:
+        """
+        Devolve o arquivo em cache ou gera com `build()` e grava.
+        """
+        path = self.get(kind, key, version, suffix)
+        if path is not None:
+            log_info(f"[EXPORT_CACHE] Servindo {path.name} do cache")
+            return path
+
+        file = build()
+        try:
+            return self.store(kind, key, version, suffix, file)
+        finally:
+            file.close()
+
+    @staticmethod
+    def last_modified(path: Path) -> str:
+        return formatdate(path.stat().st_mtime, usegmt=True)
+
+
+export_cache = ExportCache()
@@ -0,0 +1,157 @@
+# app/utils/http_cache.py
+import hashlib
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+from typing import Callable, Iterable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.config import settings
+from app.repositories.base_repository import BaseRepository
+from app.utils.logger import log_error
+
+# Tabelas de origem de cada grupo de rotas: todas precisam estar em
+# allowed_tables.json (get_table_watermark só consulta tabelas permitidas).
+PRODUCT_TABLES = ("SB1010",)
+STRUCTURE_TABLES = ("SG1010", "SB1010")
+INSPECTION_TABLES = ("SG1010", "QP6010", "QP7010", "QP8010")
+SUPPLIER_TABLES = ("SA5010", "SA2010", "SB1010", "SC7010", "SD1010")
+SX2_TABLES = ("SX2010",)
+SX3_TABLES = ("SX3010", "SX2010")
+SIX_TABLES = ("SIX010", "SX2010")
+SX9_TABLES = ("SX9010", "SX2010")
+SCHEMA_TABLES = ("SX2010", "SX3010", "SIX010", "SX9010")
+
+
+class WatermarkCache:
+    """
+    Guarda o token de `get_change_watermark` de cada tabela por alguns
+    segundos, para que rajadas de requisições (ex.: várias chamadas do
+    agente na mesma conversa) não consultem o watermark a cada vez.
+
+    Tabelas acompanhadas pelo monitor de alterações (`follow`) guardam o
+    token por `followed_ttl_seconds`: quem as mantém atualizadas são os
+    eventos (`invalidate`), e o TTL longo fica só como rede de segurança.
+    """
+
+    def __init__(self, ttl_seconds: float, followed_ttl_seconds: float = 600):
+        self.ttl_seconds = ttl_seconds
+        self.followed_ttl_seconds = followed_ttl_seconds
+        self._tokens: dict[str, tuple[float, str]] = {}  # tabela -> (expira em, token)
+        self._followed: frozenset[str] = frozenset()
+        self._lock = threading.Lock()
+
+    def follow(self, tables: Iterable[str]) -> None:
+        """
+        Marca `tables` como invalidadas por eventos (TTL longo).
+        """
+        with self._lock:
+            self._followed = frozenset(tables)
+
+    def unfollow(self) -> None:
+        with self._lock:
+            self._followed = frozenset()
+            self._tokens.clear()
+
+    def token(self, table: str) -> str:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._tokens.get(table)
+            ttl = self.followed_ttl_seconds if table in self._followed else self.ttl_seconds
+        if cached and cached[0] > now:
+            return cached[1]
+
+        watermark = BaseRepository().get_change_watermark(table)
+        with self._lock:
+            self._tokens[table] = (now + ttl, watermark["token"])
+        return watermark["token"]
+
+    def version(self, tables: Iterable[str]) -> str:
+        return "|".join(f"{table}:{self.token(table)}" for table in tables)
+
+    def invalidate(self, table: Optional[str] = None) -> None:
+        with self._lock:
+            if table is None:
+                self._tokens.clear()
+            else:
+                self._tokens.pop(table, None)
+
+
+watermarks = WatermarkCache(
+    settings.HTTP_CACHE_WATERMARK_TTL,
+    followed_ttl_seconds=settings.HTTP_CACHE_FOLLOWED_TTL
+)
+
+
+def request_etag(request: Request, tables: Iterable[str], daily: bool = False) -> str:
+    """
+    ETag da requisição: caminho + parâmetros (em ordem canônica) + versão
+    das tabelas de origem. Com `daily=True` a data entra na versão, para
+    consultas que dependem de vigência (G1_INI/G1_FIM).
+    """
+    params = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    version = watermarks.version(tables)
+    if daily:
+        version += "|" + datetime.now().strftime("%Y%m%d")
+
+    digest = hashlib.sha1(f"{request.url.path}?{params}|{version}".encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Comparação fraca (RFC 9110): ignora o prefixo W/, que o
+    CompressionMiddleware adiciona às respostas comprimidas.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    candidates = (value.strip() for value in if_none_match.split(","))
+    return etag in (value[2:] if value.startswith("W/") else value for value in candidates)
+
+
+def conditional_response(
+    request: Request,
+    tables: Iterable[str],
+    build: Callable[[], Response],
+    daily: bool = False
+) -> Response:
+    """
+    Responde 304 quando o If-None-Match ainda corresponde ao ETag (sem
+    executar a consulta principal); caso contrário chama `build()` e
+    anexa o ETag à resposta de sucesso.
+
+    Se o watermark não puder ser consultado, a resposta segue sem ETag.
+    """
+    try:
+        etag = request_etag(request, tables, daily)
+    except Exception as e:
+        log_error(f"[HTTP_CACHE] Falha ao calcular ETag de {request.url.path}: {e}")
+        return build()
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    response = build()
+    if response.status_code == 200:
+        response.headers.update(headers)
+    return response
+
+
+def conditional(tables: Iterable[str], daily: bool = False):
+    """
+    Decorator de rota GET para `conditional_response`. A rota precisa
+    declarar `request: Request` entre os parâmetros.
+    """
+    def decorator(func: Callable[..., Response]):
+        @wraps(func)
+        def wrapper(**kwargs):
+            return conditional_response(kwargs["request"], tables, lambda: func(**kwargs), daily)
+        return wrapper
+    return decorator
@@ -1,18 +1,101 @@
 # app/utils/logger.py
+import atexit
+import copy
+import json
 import logging
 import os
+import queue
+from contextvars import ContextVar
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 
-# Garante que a pasta 'logs' exista
-LOG_DIR = "logs"
+from app.config import settings
+
+# Id de correlação da requisição atual (preenchido pelo RequestIdMiddleware)
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+
+def get_request_id() -> str | None:
+    return request_id_var.get()
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Anexa o request_id ao registro ainda na thread/contexto de quem logou,
+    antes de o registro entrar na fila.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Uma linha JSON por registro: timestamp, level, logger, request_id,
+    message e, quando houver, exception.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", None),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RecordQueueHandler(QueueHandler):
+    """
+    QueueHandler que resolve a mensagem (msg % args) e o traceback em texto
+    antes de enfileirar, mas mantém o traceback separado da mensagem para
+    o JsonFormatter.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# ---------------------------
+# 🔹 Pipeline: QueueHandler → fila → QueueListener → arquivo
+# ---------------------------
+# Quem loga (rotas, repositórios) só enfileira o registro; a escrita em
+# disco e a rotação diária acontecem na thread do QueueListener.
+LOG_DIR = settings.LOG_DIR
 os.makedirs(LOG_DIR, exist_ok=True)
 
-# Configuração básica
-logging.basicConfig(
-    filename=os.path.join(LOG_DIR, f"api_{datetime.now().strftime('%Y%m%d')}.log"),
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    level=logging.INFO,
+file_handler = TimedRotatingFileHandler(
+    os.path.join(LOG_DIR, "api.log"),
+    when="midnight",
+    backupCount=settings.LOG_BACKUP_DAYS,
+    encoding="utf-8",
 )
+file_handler.setFormatter(JsonFormatter())
+
+log_queue: queue.SimpleQueue = queue.SimpleQueue()
+queue_handler = RecordQueueHandler(log_queue)
+queue_handler.addFilter(RequestIdFilter())
+
+listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+listener.start()
+atexit.register(listener.stop)  # esvazia a fila antes de encerrar
+
+root_logger = logging.getLogger()
+root_logger.setLevel(settings.LOG_LEVEL.upper())
+root_logger.addHandler(queue_handler)
 
 logger = logging.getLogger("api-totvs")
 
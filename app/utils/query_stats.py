@@ -0,0 +1,190 @@
+# app/utils/query_stats.py
+import bisect
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+from typing import Optional
+
+from app.config import settings
+from app.utils.logger import log_warning
+
+PHASES = ("connect", "execute", "fetch", "normalize")
+
+# Limites (ms) das faixas do histograma; a última faixa é "acima de 10000"
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRINGS = re.compile(r"N?'(?:[^']|'')*'")
+_NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(query: str) -> str:
+    """
+    Forma canônica da consulta: sem comentários, literais e números
+    viram `?`, listas IN (?, ?, ...) de qualquer tamanho viram `(?+)`
+    e espaços são colapsados.
+    """
+    sql = _COMMENTS.sub(" ", query)
+    sql = _STRINGS.sub("?", sql)
+    sql = _NUMBERS.sub("?", sql)
+    sql = _PARAM_LISTS.sub("(?+)", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+def fingerprint(query: str) -> str:
+    return hashlib.sha1(normalize_sql(query).encode("utf-8")).hexdigest()[:12]
+
+
+class QueryTiming:
+    """
+    Cronômetro de uma execução: `mark(fase)` soma à fase o tempo desde a
+    marca anterior; `skip()` descarta o intervalo (ex.: tempo em que um
+    gerador ficou parado no consumidor). `finish()` registra o resultado
+    em `query_stats`. `rows` fica None até a consulta terminar com sucesso.
+    """
+
+    def __init__(self, query: str, params: tuple, caller: str):
+        self.query = query
+        self.params = params
+        self.caller = caller
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.rows: Optional[int] = None
+        self._last = time.perf_counter()
+
+    def mark(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.phases[phase] += (now - self._last) * 1000
+        self._last = now
+
+    def skip(self) -> None:
+        self._last = time.perf_counter()
+
+    def finish(self) -> None:
+        query_stats.record(self)
+
+
+class _FingerprintStats:
+    def __init__(self, key: str, sql: str, window: int):
+        self.fingerprint = key
+        self.sql = sql
+        self.callers: set[str] = set()
+        self.count = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.phases_ms = dict.fromkeys(PHASES, 0.0)
+        self.recent_ms: deque[float] = deque(maxlen=window)
+        self.last_seen = 0.0
+
+    def to_dict(self) -> dict:
+        recent = sorted(self.recent_ms)
+        histogram = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        for value in recent:
+            histogram[bisect.bisect_left(HISTOGRAM_BUCKETS_MS, value)] += 1
+
+        def percentile(p: float) -> float:
+            if not recent:
+                return 0.0
+            return round(recent[min(len(recent) - 1, int(p * len(recent)))], 2)
+
+        labels = [f"<={b}ms" for b in HISTOGRAM_BUCKETS_MS] + [f">{HISTOGRAM_BUCKETS_MS[-1]}ms"]
+        return {
+            "fingerprint": self.fingerprint,
+            "sql": self.sql,
+            "callers": sorted(self.callers),
+            "count": self.count,
+            "errors": self.errors,
+            "rows": self.rows,
+            "total_ms": round(self.total_ms, 2),
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 2),
+            "phases_avg_ms": {
+                phase: round(ms / self.count, 2) if self.count else 0.0
+                for phase, ms in self.phases_ms.items()
+            },
+            "window": len(recent),
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "histogram": dict(zip(labels, histogram)),
+            "last_seen": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.last_seen)),
+        }
+
+
+class QueryStats:
+    """
+    Estatísticas em memória por fingerprint de consulta: totais desde a
+    subida (ou do último reset) e janela das últimas `window` durações
+    para percentis e histograma. Guarda no máximo `max_fingerprints`
+    consultas (descarta as usadas há mais tempo).
+
+    Consultas acima de `slow_query_ms` são logadas com SQL e parâmetros.
+    """
+
+    ORDER_FIELDS = ("total_ms", "avg_ms", "max_ms", "p95_ms", "count", "errors", "rows")
+
+    def __init__(self, slow_query_ms: float, window: int = 200, max_fingerprints: int = 500):
+        self.slow_query_ms = slow_query_ms
+        self.window = window
+        self.max_fingerprints = max_fingerprints
+        self._stats: OrderedDict[str, _FingerprintStats] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, timing: QueryTiming) -> None:
+        elapsed_ms = sum(timing.phases.values())
+        failed = timing.rows is None
+        key = fingerprint(timing.query)
+
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = _FingerprintStats(key, normalize_sql(timing.query), self.window)
+                self._stats[key] = stats
+                while len(self._stats) > self.max_fingerprints:
+                    self._stats.popitem(last=False)
+            self._stats.move_to_end(key)
+
+            stats.callers.add(timing.caller)
+            stats.count += 1
+            stats.errors += failed
+            stats.rows += timing.rows or 0
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            for phase, ms in timing.phases.items():
+                stats.phases_ms[phase] += ms
+            stats.recent_ms.append(elapsed_ms)
+            stats.last_seen = time.time()
+
+        if elapsed_ms >= self.slow_query_ms:
+            phases = ", ".join(f"{phase}={ms:.1f}ms" for phase, ms in timing.phases.items())
+            log_warning(
+                f"[SLOW_QUERY] {timing.caller} {elapsed_ms:.1f}ms ({phases}) "
+                f"rows={timing.rows if not failed else 'erro'} fingerprint={key}\n"
+                f"SQL: {timing.query.strip()}\nParams: {timing.params!r}"
+            )
+
+    def snapshot(self, order_by: str = "total_ms", limit: int = 50) -> list[dict]:
+        if order_by not in self.ORDER_FIELDS:
+            order_by = "total_ms"
+        with self._lock:
+            entries = [stats.to_dict() for stats in self._stats.values()]
+        entries.sort(key=lambda entry: entry[order_by], reverse=True)
+        return entries[:limit]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+query_stats = QueryStats(
+    settings.SLOW_QUERY_MS,
+    window=settings.QUERY_STATS_WINDOW,
+    max_fingerprints=settings.QUERY_STATS_MAX_FINGERPRINTS
+)
@@ -0,0 +1,165 @@
+# app/utils/tabular_export.py
+import csv
+import io
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import chain
+from typing import IO, Iterable, Iterator
+
+from fastapi.responses import StreamingResponse
+
+from app.core.exceptions import BusinessLogicError
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow é opcional (somente format=parquet)
+    pa = None
+    pq = None
+
+Batches = Iterable[tuple[tuple, list]]
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _clean(value):
+    # Campos CHAR do Protheus vêm completados com espaços
+    return value.strip() if isinstance(value, str) else value
+
+
+# ---------------------------
+# 🔹 CSV
+# ---------------------------
+def csv_chunks(batches: Batches, delimiter: str = ";") -> Iterator[bytes]:
+    """
+    Converte os blocos de `iter_batches` em CSV (UTF-8 com BOM, para abrir
+    direto no Excel), um bloco de bytes por bloco de linhas.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter)
+    header_written = False
+
+    for description, rows in batches:
+        if not header_written:
+            buffer.write("\ufeff")
+            writer.writerow([col[0] for col in description])
+            header_written = True
+
+        writer.writerows([_clean(v) for v in row] for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+
+# ---------------------------
+# 🔹 Parquet
+# ---------------------------
+def _arrow_type(column: tuple):
+    """
+    Tipo Arrow a partir do cursor.description do pyodbc
+    (name, type_code, display_size, internal_size, precision, scale, null_ok).
+    """
+    type_code, precision, scale = column[1], column[4], column[5]
+
+    if type_code is bool:
+        return pa.bool_()
+    if type_code is int:
+        return pa.int64()
+    if type_code is float:
+        return pa.float64()
+    if type_code is Decimal:
+        if precision and precision <= 38:
+            return pa.decimal128(precision, scale or 0)
+        return pa.float64()
+    if type_code is datetime:
+        return pa.timestamp("ms")
+    if type_code is date:
+        return pa.date32()
+    if type_code in (bytes, bytearray):
+        return pa.binary()
+    return pa.string()
+
+
+def parquet_file(batches: Batches) -> IO[bytes]:
+    """
+    Grava os blocos de `iter_batches` em Parquet (um row group por bloco)
+    e devolve o arquivo posicionado no início.
+    """
+    if pa is None:
+        raise BusinessLogicError("Formato parquet indisponível: instale o pacote pyarrow.")
+
+    output = tempfile.SpooledTemporaryFile(max_size=32 * 1024 * 1024)
+    writer = None
+    try:
+        for description, rows in batches:
+            if writer is None:
+                schema = pa.schema([(col[0], _arrow_type(col)) for col in description])
+                writer = pq.ParquetWriter(output, schema, compression="snappy")
+
+            if not rows:
+                continue
+
+            columns = list(zip(*rows))
+            arrays = [
+                pa.array([_clean(v) for v in values] if field.type == pa.string() else values, type=field.type)
+                for values, field in zip(columns, schema)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+        if writer is not None:
+            writer.close()  # grava o rodapé do arquivo
+    except Exception:
+        # Fecha o writer antes do arquivo; um erro ao fechar não pode
+        # esconder a exceção original
+        if writer is not None and writer.is_open:
+            try:
+                writer.close()
+            except Exception:
+                pass
+        output.close()
+        raise
+
+    output.seek(0)
+    return output
+
+
+def _file_chunks(file: IO[bytes], chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    try:
+        while chunk := file.read(chunk_size):
+            yield chunk
+    finally:
+        file.close()
+
+
+# ---------------------------
+# 🔹 Resposta HTTP
+# ---------------------------
+def tabular_response(batches: Batches, fmt: str, filename: str) -> StreamingResponse:
+    """
+    Devolve os blocos como download CSV (em streaming) ou Parquet.
+
+    O primeiro bloco é lido antes de montar a resposta, para que erros
+    de consulta ainda virem uma resposta de erro normal.
+    """
+    fmt = fmt.lower()
+    if fmt not in MEDIA_TYPES:
+        raise BusinessLogicError(f"Formato não suportado: {fmt}")
+
+    iterator = iter(batches)
+    first = next(iterator, None)
+    batches = chain([first], iterator) if first is not None else iter(())
+
+    if fmt == "csv":
+        content = csv_chunks(batches)
+    else:
+        content = _file_chunks(parquet_file(batches))
+
+    return StreamingResponse(
+        content,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    )
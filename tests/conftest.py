@@ -0,0 +1,11 @@
+"""Configuração comum dos testes."""
+
+import os
+import tempfile
+
+# Logs e arquivos gerados nos testes vão para diretórios temporários, não
+# para logs/ e cache/ do repositório (app.utils.logger abre LOG_DIR/api.log
+# na importação).
+os.environ["LOG_DIR"] = tempfile.mkdtemp(prefix="api-totvs-logs-")
+os.environ["EXPORT_CACHE_DIR"] = tempfile.mkdtemp(prefix="api-totvs-exports-")
+os.environ["EXPORT_JOBS_DIR"] = tempfile.mkdtemp(prefix="api-totvs-jobs-")
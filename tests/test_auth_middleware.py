@@ -3,18 +3,19 @@
 from __future__ import annotations
 
 import os
+import time
 from unittest.mock import patch
 
 import jwt
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
 
-from app.middleware.auth_middleware import jwt_middleware
+from app.middleware.auth_middleware import JWTAuthMiddleware
 
 
 def _build_test_app() -> FastAPI:
     app = FastAPI()
-    app.middleware("http")(jwt_middleware)
+    app.add_middleware(JWTAuthMiddleware)
 
     @app.get("/")
     def root():
@@ -82,3 +83,31 @@ def test_wrong_gpt_token_rejected():
             headers={"Authorization": "Bearer wrong-token"},
         )
         assert response.status_code == 401
+
+
+def test_verified_jwt_is_cached():
+    with patch.dict(os.environ, {"JWT_SECRET": "test-secret"}, clear=False):
+        token = jwt.encode({"sub": "user", "exp": int(time.time()) + 60}, "test-secret", algorithm="HS256")
+        client = TestClient(_build_test_app())
+
+        with patch("app.middleware.auth_middleware.jwt.decode", wraps=jwt.decode) as decode:
+            for _ in range(3):
+                response = client.get("/protected", headers={"Authorization": f"Bearer {token}"})
+                assert response.status_code == 200
+
+        assert decode.call_count == 1
+
+
+def test_cached_jwt_is_verified_again_after_exp():
+    with patch.dict(os.environ, {"JWT_SECRET": "test-secret"}, clear=False):
+        now = time.time()
+        token = jwt.encode({"sub": "user", "exp": int(now) + 60}, "test-secret", algorithm="HS256")
+        client = TestClient(_build_test_app())
+        headers = {"Authorization": f"Bearer {token}"}
+
+        with patch("app.middleware.auth_middleware.jwt.decode", wraps=jwt.decode) as decode:
+            client.get("/protected", headers=headers)
+            with patch("app.middleware.auth_middleware.time.time", return_value=now + 120):
+                client.get("/protected", headers=headers)
+
+        assert decode.call_count == 2
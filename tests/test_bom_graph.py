@@ -0,0 +1,152 @@
+"""BomGraph — explosão vetorizada da estrutura (SG1010)."""
+
+import numpy as np
+import pytest
+
+from app.utils.bom_graph import BomGraph
+
+
+def _graph() -> BomGraph:
+    # PA → 2x PI1, 1x PI2 ; PI1 → 3x MP1 ; PI2 → 1x PI1, 4x MP2
+    return BomGraph([
+        ("PA", "PI1", 2),
+        ("PA", "PI2", 1),
+        ("PI1", "MP1", 3),
+        ("PI2", "PI1", 1),
+        ("PI2", "MP2", 4),
+    ])
+
+
+def test_explode_aggregates_shared_subassemblies():
+    graph = _graph()
+    required = graph.explode("PA", 10)
+
+    assert required[graph.index["PI1"]] == pytest.approx(30)
+    assert required[graph.index["MP1"]] == pytest.approx(90)
+    assert required[graph.index["MP2"]] == pytest.approx(40)
+
+
+def test_levels_use_longest_path():
+    graph = _graph()
+    level = graph.levels("PA")
+
+    assert level[graph.index["PI1"]] == 2
+    assert level[graph.index["MP1"]] == 3
+
+
+def test_leaves_and_duplicate_edges():
+    graph = BomGraph([("PA", "MP1", 1), ("PA", "MP1", 2), ("X", "Y", 1)])
+
+    assert [graph.codes[i] for i in graph.leaves("PA")] == ["MP1"]
+    assert graph.explode("PA")[graph.index["MP1"]] == pytest.approx(3)
+    assert graph.explode("PA")[graph.index["Y"]] == 0
+
+
+def test_unknown_root_returns_empty_explosion():
+    graph = _graph()
+    assert not graph.explode("NOPE").any()
+
+
+def test_net_requirements_nets_intermediates_before_components():
+    graph = _graph()
+    available = np.zeros(len(graph))
+    on_order = np.zeros(len(graph))
+    available[graph.index["PI1"]] = 25
+    on_order[graph.index["MP2"]] = 15
+
+    gross, net = graph.net_requirements("PA", 10, available, on_order)
+
+    # PI1: 20 (PA) + 10 (PI2) = 30 bruto, 25 em estoque → 5 a produzir
+    assert gross[graph.index["PI1"]] == pytest.approx(30)
+    assert net[graph.index["PI1"]] == pytest.approx(5)
+    assert gross[graph.index["MP1"]] == pytest.approx(15)
+    assert net[graph.index["MP2"]] == pytest.approx(25)
+    assert net[graph.index["PA"]] == pytest.approx(10)
+
+
+def test_longest_path_follows_slowest_branch():
+    graph = _graph()
+    weight = np.zeros(len(graph))
+    weight[graph.index["PA"]] = 1
+    weight[graph.index["PI1"]] = 2
+    weight[graph.index["PI2"]] = 1
+    weight[graph.index["MP1"]] = 10
+    weight[graph.index["MP2"]] = 20
+
+    total, path = graph.longest_path("PA", weight)
+
+    assert total[graph.index["PA"]] == pytest.approx(22)
+    assert [graph.codes[i] for i in path] == ["PA", "PI2", "MP2"]
+
+
+def test_rollup_sums_components_once_per_node():
+    graph = _graph()
+    price = np.zeros(len(graph))
+    price[graph.index["MP1"]] = 1.5
+    price[graph.index["MP2"]] = 2.0
+
+    cost = graph.rollup("PA", price)
+
+    assert cost[graph.index["PI1"]] == pytest.approx(4.5)
+    assert cost[graph.index["PI2"]] == pytest.approx(12.5)
+    assert cost[graph.index["PA"]] == pytest.approx(21.5)
+
+
+def test_drop_back_edges_reports_cycle_and_keeps_dag():
+    graph = BomGraph([
+        ("A", "B", 2),
+        ("B", "C", 1),
+        ("C", "B", 1),
+        ("C", "D", 3),
+    ])
+
+    cycles = graph.drop_back_edges("A")
+
+    assert cycles == [["B", "C", "B"]]
+    assert graph.cycles == cycles
+    required = graph.explode("A", 1)
+    assert required[graph.index["D"]] == pytest.approx(6.0)
+
+
+def test_strongly_connected_components_and_cycle_path():
+    graph = BomGraph([
+        ("A", "B", 1),
+        ("B", "C", 1),
+        ("C", "A", 1),
+        ("X", "X", 1),
+        ("P", "Q", 1),
+    ])
+
+    components = sorted(graph.strongly_connected_components())
+
+    assert components == [["A", "B", "C"], ["X"]]
+    assert graph.cycle_path(["A", "B", "C"]) == ["A", "B", "C", "A"]
+    assert graph.cycle_path(["X"]) == ["X", "X"]
+
+
+def test_where_used_accumulates_multipliers_and_paths():
+    graph = BomGraph([
+        ("S1", "X", 2),
+        ("S2", "X", 1),
+        ("F1", "S1", 3),
+        ("F1", "S2", 4),
+        ("F2", "S1", 1),
+    ])
+
+    multiplier, paths, level = graph.where_used("X")
+
+    assert multiplier[graph.index["F1"]] == pytest.approx(10.0)
+    assert paths[graph.index["F1"]] == 2
+    assert multiplier[graph.index["F2"]] == pytest.approx(2.0)
+    assert level[graph.index["F1"]] == 2
+    assert not graph.parents[graph.index["F1"]]
+
+
+def test_distances_are_shortest_not_deepest():
+    graph = _graph()
+    distance = graph.distances("PA")
+    level = graph.levels("PA")
+    assert distance[graph.index["PI1"]] == 1
+    assert level[graph.index["PI1"]] == 2
+    assert graph.distances("MP1", upward=True)[graph.index["PA"]] == 2
+    assert graph.distances("NAO_EXISTE").tolist() == [-1] * len(graph)
@@ -0,0 +1,93 @@
+"""Monitor de alterações — watermark por tabela e eventos de invalidação."""
+
+from __future__ import annotations
+
+from unittest.mock import patch
+
+from app.repositories.base_repository import BaseRepository
+from app.services.change_poller_service import TableChangePoller
+from app.utils.http_cache import WatermarkCache
+
+
+def _watermarks(tokens: dict):
+    def fake(self, table):
+        token = tokens[table]
+        if isinstance(token, Exception):
+            raise token
+        return {"table": table, "token": token}
+    return patch.object(BaseRepository, "get_change_watermark", fake)
+
+
+def test_only_tables_with_listeners_are_polled():
+    poller = TableChangePoller()
+    assert poller.tables == []
+    assert poller.poll_once() == []
+
+    poller.register(lambda table: None, ["sg1010", "TABELA_FORA"])
+    poller.register(lambda table: None, ["SB1010", "SG1010"])
+    assert poller.tables == ["SB1010", "SG1010"]
+
+
+def test_first_poll_sets_baseline_and_publishes_it():
+    poller = TableChangePoller()
+    events = []
+    poller.register(events.append, ["SB1010", "SG1010"])
+
+    with _watermarks({"SB1010": "1-10-0", "SG1010": "5-50-0"}):
+        assert poller.poll_once() == []
+        assert poller.poll_once() == []
+
+    assert events == ["SB1010", "SG1010"]
+    assert set(poller.snapshot()) == {"SB1010", "SG1010"}
+
+
+def test_changed_table_is_published_to_its_listeners():
+    poller = TableChangePoller()
+    structure, product = [], []
+    poller.register(structure.append, ["SG1010"])
+    poller.register(product.append, ["SB1010"])
+
+    with _watermarks({"SB1010": "1-10-0", "SG1010": "5-50-0"}):
+        poller.poll_once()
+    structure.clear()
+    product.clear()
+    with _watermarks({"SB1010": "1-10-0", "SG1010": "6-51-0-2026-01-01T10:00:00"}):
+        assert poller.poll_once() == ["SG1010"]
+
+    assert structure == ["SG1010"]
+    assert product == []
+
+
+def test_failing_listener_or_table_does_not_stop_polling():
+    poller = TableChangePoller()
+    events = []
+
+    def broken(table):
+        raise RuntimeError("cache indisponível")
+
+    poller.register(broken, ["SB1010", "SG1010"])
+    poller.register(events.append, ["SB1010", "SG1010"])
+
+    with _watermarks({"SB1010": "1-10-0", "SG1010": "5-50-0"}):
+        poller.poll_once()
+    events.clear()
+    with _watermarks({"SB1010": RuntimeError("timeout"), "SG1010": "6-51-0"}):
+        assert poller.poll_once() == ["SG1010"]
+
+    assert events == ["SG1010"]
+    assert poller.snapshot()["SB1010"]["token"] == "1-10-0"
+
+
+def test_followed_tables_keep_token_until_invalidated():
+    cache = WatermarkCache(ttl_seconds=0, followed_ttl_seconds=600)
+    cache.follow(["SG1010"])
+    tokens = {"SB1010": "1", "SG1010": "1"}
+
+    with _watermarks(tokens):
+        assert cache.token("SG1010") == "1"
+        assert cache.token("SB1010") == "1"
+        tokens.update(SB1010="2", SG1010="2")
+        assert cache.token("SB1010") == "2"
+        assert cache.token("SG1010") == "1"
+        cache.invalidate("SG1010")
+        assert cache.token("SG1010") == "2"
@@ -0,0 +1,88 @@
+"""Compressão de respostas — negociação, tipos binários, streaming e cache."""
+
+from __future__ import annotations
+
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.middleware import compression_middleware
+from app.middleware.compression_middleware import CompressionMiddleware, negotiate_encoding
+
+PAYLOAD = b'{"rows":[' + b",".join(b'{"code":"P%06d","qty":%d}' % (i, i) for i in range(2000)) + b"]}"
+
+
+def _build_test_app(**options) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, **options)
+
+    @app.get("/json")
+    def json_payload():
+        return Response(PAYLOAD, media_type="application/json")
+
+    @app.get("/xlsx")
+    def xlsx_payload():
+        return Response(
+            PAYLOAD,
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+
+    @app.get("/stream")
+    def stream_payload():
+        def lines():
+            for i in range(10):
+                yield b'{"i":%d}\n' % i
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    return app
+
+
+def test_negotiate_encoding_respects_q_and_server_order():
+    supported = ["br", "zstd", "gzip"]
+    assert negotiate_encoding("gzip, br", supported) == "br"
+    assert negotiate_encoding("gzip;q=1, br;q=0.5", supported) == "gzip"
+    assert negotiate_encoding("br;q=0, *", supported) == "zstd"
+    assert negotiate_encoding("identity", supported) is None
+
+
+def test_json_is_gzipped():
+    client = TestClient(_build_test_app())
+    response = client.get("/json", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.content == PAYLOAD
+
+
+def test_xlsx_is_not_recompressed():
+    client = TestClient(_build_test_app())
+    response = client.get("/xlsx", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.content == PAYLOAD
+
+
+def test_stream_is_compressed_incrementally():
+    client = TestClient(_build_test_app())
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text.count("\n") == 10
+
+
+def test_repeated_payload_is_compressed_once():
+    client = TestClient(_build_test_app(cache_min_size=0))
+    calls = []
+    original = compression_middleware.compress
+
+    def counting(body, encoding, level):
+        calls.append(encoding)
+        return original(body, encoding, level)
+
+    with patch.object(compression_middleware, "compress", counting):
+        first = client.get("/json", headers={"Accept-Encoding": "gzip"})
+        second = client.get("/json", headers={"Accept-Encoding": "gzip"})
+
+    assert first.content == second.content == PAYLOAD
+    assert calls == ["gzip"]
@@ -0,0 +1,23 @@
+"""Cache em disco das exportações — nomes por chave e limpeza de versões."""
+
+from __future__ import annotations
+
+import io
+
+from app.utils.export_cache import ExportCache
+
+
+def test_keys_that_sanitize_alike_get_different_files(tmp_path):
+    cache = ExportCache(str(tmp_path))
+    assert cache.path_for("structure", "12/3", "v1", ".xlsx") != cache.path_for("structure", "12_3", "v1", ".xlsx")
+
+
+def test_new_version_removes_only_versions_of_the_same_key(tmp_path):
+    cache = ExportCache(str(tmp_path))
+    other = cache.store("structure", "123_A", "v1", ".xlsx", io.BytesIO(b"a"))
+    old = cache.store("structure", "123", "v1", ".xlsx", io.BytesIO(b"b"))
+    new = cache.store("structure", "123", "v2", ".xlsx", io.BytesIO(b"c"))
+
+    assert other.exists()
+    assert new.exists()
+    assert not old.exists()
@@ -0,0 +1,72 @@
+"""Projeção de campos (fields) — validação, SELECT montado e poda de árvores."""
+
+from __future__ import annotations
+
+from unittest.mock import patch
+
+import pytest
+
+from app.core.exceptions import BusinessLogicError
+from app.repositories.base_repository import BaseRepository
+from app.repositories.product_repository import ProductRepository
+from app.services import product_service
+
+COLUMNS = {
+    "code": "B1.B1_COD",
+    "description": "B1.B1_DESC",
+    "unit": "B1.B1_UM",
+}
+
+
+def test_select_list_keeps_column_order_and_required_aliases():
+    sql = BaseRepository()._select_list(COLUMNS, "unit, description", required=("code",))
+    assert [line.strip() for line in sql.split(",\n")] == [
+        "B1.B1_COD AS code",
+        "B1.B1_DESC AS description",
+        "B1.B1_UM AS unit",
+    ]
+    assert BaseRepository()._select_list(COLUMNS, "unit") == "B1.B1_UM AS unit"
+
+
+def test_select_list_rejects_unknown_fields():
+    with pytest.raises(BusinessLogicError, match="price"):
+        BaseRepository()._select_list(COLUMNS, "code,price")
+
+
+def test_select_columns_validates_identifier_and_prefix():
+    repo = BaseRepository()
+    assert repo._select_columns("X3", None, prefix="X3_") == "X3.*"
+    assert repo._select_columns("X3", "x3_campo,X3_TIPO", prefix="X3_") == "X3.[X3_CAMPO], X3.[X3_TIPO]"
+
+    with pytest.raises(BusinessLogicError, match="X3_"):
+        repo._select_columns("X3", "X2_NOME", prefix="X3_")
+    with pytest.raises(BusinessLogicError):
+        repo._select_columns("X3", "X3_CAMPO];DROP TABLE SX3010--", prefix="X3_")
+
+
+def test_prune_nodes_keeps_children_and_cycle_markers():
+    tree = {
+        "code": "PA", "description": "PRODUTO", "quantity": 1,
+        "components": [
+            {"code": "PI", "description": "INTERMEDIARIO", "quantity": 2, "components": []},
+            {"code": "PA", "description": "PRODUTO", "quantity": 1, "cycle": True},
+        ],
+    }
+
+    pruned = BaseRepository._prune_nodes(tree, {"code"}, "components")
+
+    assert pruned == {
+        "code": "PA",
+        "components": [
+            {"code": "PI", "components": []},
+            {"code": "PA", "cycle": True},
+        ],
+    }
+    assert BaseRepository._prune_nodes({"code": "A", "x": 1}, None, "components") == {"code": "A", "x": 1}
+
+
+def test_service_keeps_business_errors_from_fields():
+    error = BusinessLogicError("Campo(s) inválido(s) em fields: price.")
+    with patch.object(ProductRepository, "list_stock", side_effect=error):
+        with pytest.raises(BusinessLogicError):
+            product_service.get_stock("PA", fields="price")
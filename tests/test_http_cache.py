@@ -0,0 +1,147 @@
+"""GET condicional — ETag a partir do watermark das tabelas."""
+
+from __future__ import annotations
+
+import io
+from unittest.mock import patch
+
+from fastapi import FastAPI, Query, Request
+from fastapi.testclient import TestClient
+
+from app.core.responses import error_response, success_response
+from app.repositories.base_repository import BaseRepository
+from app.routes import product_routes
+from app.utils.export_cache import ExportCache
+from app.utils.http_cache import conditional, etag_matches, watermarks
+
+
+def _build_test_app(calls: list) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/products/{code}")
+    @conditional(("SB1010",))
+    def product(request: Request, code: str, fields: str | None = Query(None)):
+        calls.append(code)
+        if code == "MISSING":
+            return error_response("Produto não encontrado.")
+        return success_response({"code": code, "fields": fields})
+
+    return app
+
+
+def _watermark(tokens: dict):
+    def fake(self, table):
+        return {"table": table, "token": tokens[table]}
+    return patch.object(BaseRepository, "get_change_watermark", fake)
+
+
+def test_etag_matches_ignores_weak_prefix_and_lists():
+    assert etag_matches('W/"abc"', '"abc"')
+    assert etag_matches('"x", W/"abc"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+def test_if_none_match_returns_304_without_running_the_query():
+    calls = []
+    client = TestClient(_build_test_app(calls))
+    watermarks.invalidate()
+
+    with _watermark({"SB1010": "10-500-0"}):
+        first = client.get("/products/A")
+        etag = first.headers["etag"]
+        second = client.get("/products/A", headers={"If-None-Match": etag})
+
+    assert first.status_code == 200
+    assert second.status_code == 304
+    assert calls == ["A"]
+
+
+def test_etag_changes_with_params_and_watermark():
+    client = TestClient(_build_test_app([]))
+    watermarks.invalidate()
+
+    with _watermark({"SB1010": "10-500-0"}):
+        base = client.get("/products/A").headers["etag"]
+        other_params = client.get("/products/A", params={"fields": "code"}).headers["etag"]
+
+    watermarks.invalidate("SB1010")
+    with _watermark({"SB1010": "11-501-0"}):
+        changed = client.get("/products/A", headers={"If-None-Match": base})
+
+    assert base != other_params
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != base
+
+
+def test_error_response_has_no_etag():
+    client = TestClient(_build_test_app([]))
+    watermarks.invalidate()
+
+    with _watermark({"SB1010": "10-500-0"}):
+        response = client.get("/products/MISSING")
+
+    assert response.status_code == 400
+    assert "etag" not in response.headers
+
+
+def test_checksum_only_when_table_has_no_row_stamp():
+    seen = []
+
+    def fake(self, table, checksum=False):
+        seen.append((table, checksum))
+        return {"table": table, "token": "1"}
+
+    repo = BaseRepository()
+    with patch.object(BaseRepository, "get_table_watermark", fake):
+        with patch.object(BaseRepository, "get_stamp_columns", lambda self, table: ("S_T_A_M_P_",)):
+            repo.get_change_watermark("SG1010")
+        with patch.object(BaseRepository, "get_stamp_columns", lambda self, table: ("I_N_S_D_T_",)):
+            repo.get_change_watermark("SB1010")
+        with patch.object(BaseRepository, "get_stamp_columns", lambda self, table: ()):
+            repo.get_change_watermark("SC7010")
+
+    assert seen == [("SG1010", False), ("SB1010", True), ("SC7010", True)]
+
+
+def test_in_place_update_without_stamp_changes_etag():
+    # Alteração no próprio registro: contagem, R_E_C_N_O_ e deletados iguais
+    table_state = {"row_checksum": 111}
+
+    def fake_execute_one(self, query, params=()):
+        row = {"total_rows": 10, "max_recno": 10, "deleted_rows": 0}
+        if "CHECKSUM_AGG" in query:
+            row["row_checksum"] = table_state["row_checksum"]
+        return row
+
+    client = TestClient(_build_test_app([]))
+    watermarks.invalidate()
+
+    with patch.object(BaseRepository, "get_stamp_columns", lambda self, table: ()), \
+            patch.object(BaseRepository, "execute_one", fake_execute_one):
+        etag = client.get("/products/A").headers["etag"]
+
+        table_state["row_checksum"] = 222
+        watermarks.invalidate("SB1010")
+        response = client.get("/products/A", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_structure_excel_honours_weak_and_listed_if_none_match(tmp_path):
+    cache = ExportCache(str(tmp_path))
+    path = cache.store("structure", "PA", "v1", ".xlsx", io.BytesIO(b"xlsx"))
+    etag = cache.etag("structure", "PA", "v1")
+
+    app = FastAPI()
+    app.include_router(product_routes.router, prefix="/products")
+    client = TestClient(app)
+
+    with patch.object(product_routes, "get_structure_excel_cached", lambda code: (path, etag)):
+        url = "/products/PA/structure/excel?format=xlsx"
+        assert client.get(url).status_code == 200
+        assert client.get(url, headers={"If-None-Match": f'"outro", W/{etag}'}).status_code == 304
+        assert client.get(url, headers={"If-None-Match": "*"}).status_code == 304
+        assert client.get(url, headers={"If-None-Match": '"outro"'}).status_code == 200
@@ -0,0 +1,79 @@
+"""Logs — registros JSON e id de correlação por requisição."""
+
+from __future__ import annotations
+
+import json
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.middleware.request_id_middleware import RequestIdMiddleware
+from app.utils.logger import JsonFormatter, RecordQueueHandler, RequestIdFilter, get_request_id, request_id_var
+
+
+def _build_test_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(RequestIdMiddleware)
+
+    @app.get("/sync")
+    def sync_route():
+        return {"request_id": get_request_id()}
+
+    @app.get("/async")
+    async def async_route():
+        return {"request_id": get_request_id()}
+
+    return app
+
+
+def test_request_id_is_generated_and_returned():
+    client = TestClient(_build_test_app())
+    response = client.get("/sync")
+    request_id = response.headers["x-request-id"]
+    assert len(request_id) == 32
+    assert response.json()["request_id"] == request_id
+
+
+def test_valid_incoming_request_id_is_kept():
+    client = TestClient(_build_test_app())
+    response = client.get("/async", headers={"X-Request-ID": "agent-call.42"})
+    assert response.headers["x-request-id"] == "agent-call.42"
+    assert response.json()["request_id"] == "agent-call.42"
+
+
+def test_invalid_incoming_request_id_is_replaced():
+    client = TestClient(_build_test_app())
+    response = client.get("/sync", headers={"X-Request-ID": "x" * 100})
+    assert response.headers["x-request-id"] != "x" * 100
+    assert get_request_id() is None
+
+
+def test_queued_record_is_formatted_as_json_with_request_id():
+    records = []
+
+    class ListQueue:
+        def put_nowait(self, record):
+            records.append(record)
+
+    handler = RecordQueueHandler(ListQueue())
+    handler.addFilter(RequestIdFilter())
+    test_logger = logging.getLogger("test-json-log")
+    test_logger.propagate = False
+    test_logger.addHandler(handler)
+
+    token = request_id_var.set("abc123")
+    try:
+        try:
+            raise ValueError("falhou")
+        except ValueError:
+            test_logger.exception("Erro ao consultar %s", "SB1010")
+    finally:
+        request_id_var.reset(token)
+        test_logger.removeHandler(handler)
+
+    entry = json.loads(JsonFormatter().format(records[0]))
+    assert entry["request_id"] == "abc123"
+    assert entry["message"] == "Erro ao consultar SB1010"
+    assert entry["level"] == "ERROR"
+    assert "ValueError: falhou" in entry["exception"]
@@ -0,0 +1,247 @@
+"""ProductRepository — montagem das consultas e pós-processamento em memória."""
+
+from __future__ import annotations
+
+from decimal import Decimal
+from unittest.mock import patch
+
+from app.repositories import base_repository
+from app.repositories.product_repository import ProductRepository
+
+BOM = {
+    "A": ["B", "C"],
+    "B": ["D"],
+    "C": ["D"],
+    "D": ["E", "B"],  # D → B fecha um ciclo
+    "E": ["F"],
+}
+
+
+def _edge(parent: str, component: str, quantity: float = 1) -> dict:
+    row = {"parent_code": parent, "component_code": component, "quantity": quantity}
+    for side, code in (("parent", parent), ("component", component)):
+        row.update({f"{side}_description": code, f"{side}_type": "PI", f"{side}_unit": "UN"})
+    return row
+
+
+class FakeCursor:
+    def __init__(self, description, rows):
+        self.description = [(name,) for name in description]
+        self.rows = rows
+
+    def execute(self, query, params=()):
+        pass
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Devolve um resultset (colunas, linhas) por cursor, na ordem das consultas."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+
+    def cursor(self):
+        return FakeCursor(*self.results.pop(0))
+
+    def close(self):
+        pass
+
+
+def _database(*results):
+    connection = FakeConnection(*results)
+    return patch.object(base_repository, "get_connection", lambda: connection)
+
+
+def _fake_edges(calls: list):
+    def fake(self, parents):
+        calls.append(sorted(parents))
+        return [_edge(p, c) for p in parents for c in BOM.get(p, [])]
+    return patch.object(ProductRepository, "_bom_edges_of", fake)
+
+
+def test_bom_edges_expand_each_code_once_per_level():
+    calls = []
+    with _fake_edges(calls):
+        edges = ProductRepository().list_bom_edges("A")
+
+    assert calls == [["A"], ["B", "C"], ["D"], ["E"], ["F"]]
+    pairs = [(r["parent_code"], r["component_code"]) for r in edges]
+    assert pairs == sorted({(p, c) for p, cs in BOM.items() for c in cs})
+
+
+def test_bom_edges_stop_at_max_depth_and_chunk_the_frontier():
+    calls = []
+    with _fake_edges(calls), patch.object(ProductRepository, "MAX_IN_PARAMS", 1):
+        edges = ProductRepository().list_bom_edges_bulk(["A", "A", "C"], max_depth=2)
+
+    assert calls == [["A"], ["C"], ["B"], ["D"]]
+    assert {(r["parent_code"], r["component_code"]) for r in edges} == {
+        ("A", "B"), ("A", "C"), ("C", "D"), ("B", "D"), ("D", "E"), ("D", "B"),
+    }
+
+
+def test_where_used_edges_walk_up_each_parent_once():
+    calls = []
+
+    def fake(self, codes, upward=False):
+        assert upward
+        calls.append(sorted(codes))
+        return [_edge(p, c) for p, cs in BOM.items() for c in cs if c in codes]
+
+    with patch.object(ProductRepository, "_bom_edges_of", fake):
+        edges = ProductRepository().list_where_used_edges("D")
+
+    # D ← B, C; B ← A, D (ciclo); C ← A
+    assert calls == [["D"], ["B", "C"], ["A"]]
+    assert [(r["parent_code"], r["component_code"]) for r in edges] == [
+        ("A", "B"), ("A", "C"), ("B", "D"), ("C", "D"), ("D", "B"),
+    ]
+
+
+def test_where_used_impact_flags_ancestors_cut_by_max_depth():
+    # MP → PI → PA e MP → PA2; PA e PA2 não têm pai
+    edges = [_edge("PI", "MP", 2), _edge("PA", "PI", 3), _edge("PA2", "MP", 1)]
+    repo = ProductRepository()
+
+    with patch.object(ProductRepository, "list_where_used_edges", lambda self, code, depth: edges):
+        full = repo.get_where_used_impact("MP", max_depth=3)
+        cut = repo.get_where_used_impact("MP", max_depth=2)
+
+    assert {n["code"]: n["quantity_per_unit"] for n in full["data"]} == {"PA": 6, "PA2": 1}
+    assert (full["total_top_level"], full["total_truncated"]) == (2, 0)
+
+    # Com max_depth=2 os pais de PA (nível 2) não foram lidos
+    by_code = {n["code"]: n for n in cut["data"]}
+    assert by_code["PA"]["truncated"] and not by_code["PA"]["top_level"]
+    assert by_code["PA2"]["top_level"] and not by_code["PA2"]["truncated"]
+    assert (cut["total_top_level"], cut["total_truncated"]) == (1, 1)
+
+
+def test_structure_diff_expands_edges_valid_at_either_date():
+    # PA → PI só vale na data A; PA → PN só na data B; PI e PN → MP nas duas
+    rows = {
+        ("PA", "PI"): (1, 2, 0, 0),
+        ("PA", "PN"): (0, 0, 1, 2),
+        ("PI", "MP"): (1, 1, 1, 1),
+        ("PN", "MP"): (1, 3, 1, 4),
+    }
+    calls = []
+
+    def fake(self, parents, date_a, date_b):
+        calls.append(sorted(parents))
+        return [
+            {
+                "parent_code": p, "component_code": c,
+                "component_description": c, "component_type": "PI", "component_unit": "UN",
+                "rows_a": ra, "quantity_a": qa, "rows_b": rb, "quantity_b": qb,
+            }
+            for (p, c), (ra, qa, rb, qb) in rows.items() if p in parents
+        ]
+
+    with patch.object(ProductRepository, "_diff_edges_of", fake):
+        diff = ProductRepository().list_structure_diff("PA", "20260101", "20260601")
+
+    assert calls == [["PA"], ["PI", "PN"], ["MP"]]
+    assert [(e["parent"], e["component"]) for e in diff["removed"]] == [("PA", "PI"), ("PI", "MP")]
+    assert [(e["parent"], e["component"]) for e in diff["added"]] == [("PA", "PN"), ("PN", "MP")]
+    assert diff["changed"] == []
+
+
+STOCK_COLUMNS = (
+    "product_code", "branch", "warehouse",
+    "current_quantity", "committed_quantity", "reserved_quantity", "available_quantity",
+    "total_current_quantity", "total_committed_quantity",
+    "total_reserved_quantity", "total_available_quantity",
+)
+
+
+def _stock(code, branch, warehouse, current, totals):
+    return (f"{code}   ", branch, warehouse, Decimal(current), Decimal(0), Decimal(0), Decimal(current), *totals)
+
+
+def test_stock_bulk_groups_warehouses_and_fills_missing_products():
+    totals = (Decimal(15), Decimal(0), Decimal(0), Decimal(15))
+    rows = [
+        _stock("PA001", "01", "01", 10, totals),
+        _stock("PA001", "01", "02", 5, totals),
+        _stock("PA003", "02", "01", 7, (Decimal(7), None, None, Decimal(7))),
+    ]
+
+    with _database((STOCK_COLUMNS, rows)):
+        stock = list(ProductRepository().iter_stock_bulk([" PA001", "PA002", "PA003", "PA001"]))
+
+    assert [s["product_code"] for s in stock] == ["PA001", "PA003", "PA002"]
+
+    pa001, pa003, pa002 = stock
+    assert pa001["total_current_quantity"] == 15.0
+    assert [(w["warehouse"], w["current_quantity"]) for w in pa001["warehouses"]] == [("01", 10.0), ("02", 5.0)]
+    assert pa003["total_committed_quantity"] == 0.0
+    assert len(pa003["warehouses"]) == 1
+
+    # Sem linha na SB2010: estoque zerado, sem armazéns
+    assert pa002 == {
+        "product_code": "PA002",
+        "total_current_quantity": 0.0,
+        "total_committed_quantity": 0.0,
+        "total_reserved_quantity": 0.0,
+        "total_available_quantity": 0.0,
+        "warehouses": [],
+    }
+
+
+def test_stock_bulk_reads_one_query_per_block_of_codes():
+    results = [
+        (STOCK_COLUMNS, [_stock("A", "01", "01", 1, (1, 0, 0, 1))]),
+        (STOCK_COLUMNS, []),
+    ]
+
+    with _database(*results), patch.object(ProductRepository, "MAX_IN_PARAMS", 1):
+        stock = list(ProductRepository().iter_stock_bulk(["A", "B"]))
+
+    assert [(s["product_code"], s["total_current_quantity"]) for s in stock] == [("A", 1.0), ("B", 0.0)]
+
+
+def test_structure_children_lists_one_level_with_has_children():
+    columns = ("parent_code", "code", "description", "type", "unit", "sequence", "quantity", "has_children")
+    rows = [
+        ("PI      ", "MP001   ", "CHAPA   ", "MP", "KG", "001", Decimal("1.5"), 0),
+        ("PI      ", "PI002   ", "SUBCONJ ", "PI", "UN", "002", Decimal("2"), 1),
+    ]
+
+    with _database((("total",), [(3,)]), (columns, rows)):
+        result = ProductRepository().list_structure_children("PA", node=" PI ", page=1, page_size=2)
+
+    assert (result["root"], result["node"], result["total"], result["total_pages"]) == ("PA", "PI", 3, 2)
+    assert [(c["code"], c["quantity"], c["has_children"]) for c in result["data"]] == [
+        ("MP001", 1.5, False), ("PI002", 2.0, True),
+    ]
+
+
+def test_structure_graph_lists_shared_nodes_once():
+    calls = []
+    with _fake_edges(calls):
+        graph = ProductRepository().list_structure_graph("A")
+
+    codes = [n["code"] for n in graph["nodes"]]
+    assert sorted(codes) == ["A", "B", "C", "D", "E", "F"]  # D aparece uma vez, embora tenha dois pais
+    assert graph["mode"] == "graph"
+    assert graph["total_edges"] == len(graph["edges"]) == 7
+    assert graph["cycles"] == [["B", "D", "B"]]  # D → B fecha o ciclo
+
+    by_code = {n["code"]: n for n in graph["nodes"]}
+    assert by_code["A"]["bom_level"] == 0
+    assert by_code["D"]["bom_level"] == 2
+    assert by_code["F"]["has_children"] is False
+    assert {"parent": "A", "component": "B", "quantity": 1.0} in graph["edges"]
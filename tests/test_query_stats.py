@@ -0,0 +1,127 @@
+"""Instrumentação das consultas — fingerprint, fases, slow query e histograma."""
+
+from __future__ import annotations
+
+from itertools import chain, repeat
+from unittest.mock import patch
+
+from app.repositories import base_repository
+from app.repositories.base_repository import BaseRepository
+from app.utils import query_stats as query_stats_module
+from app.utils.query_stats import QueryStats, QueryTiming, fingerprint, normalize_sql
+
+
+class FakeCursor:
+    description = [("B1_COD",), ("B1_DESC",)]
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, query, params=()):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return FakeCursor(list(self.rows))
+
+    def close(self):
+        pass
+
+
+class ProductLookup(BaseRepository):
+    def list_products(self):
+        return self.execute_query("SELECT B1_COD, B1_DESC FROM SB1010 WHERE B1_TIPO = 'PA'")
+
+    def iter_products(self):
+        return self.iter_query("SELECT B1_COD, B1_DESC FROM SB1010", batch_size=2)
+
+
+def test_fingerprint_ignores_literals_and_in_list_size():
+    a = "SELECT * FROM SB1010 WHERE B1_COD IN (?, ?) AND B1_TIPO = 'PA' -- filtro\n"
+    b = "SELECT *  FROM SB1010\nWHERE B1_COD IN (?,?,?,?) AND B1_TIPO = 'MP'"
+    assert normalize_sql(a) == "SELECT * FROM SB1010 WHERE B1_COD IN (?+) AND B1_TIPO = ?"
+    assert fingerprint(a) == fingerprint(b)
+    assert fingerprint(a) != fingerprint("SELECT * FROM SG1010")
+
+
+def test_stats_aggregate_phases_and_percentiles():
+    stats = QueryStats(slow_query_ms=10_000, window=10)
+    for ms in (1, 2, 3, 4, 100):
+        timing = QueryTiming("SELECT 1", (), "Repo.method")
+        timing.phases["execute"] = ms
+        timing.rows = 1
+        stats.record(timing)
+
+    failed = QueryTiming("SELECT * FROM SB1010", (), "Repo.other")
+    stats.record(failed)
+
+    entries = {entry["sql"]: entry for entry in stats.snapshot()}
+    entry = entries["SELECT ?"]
+    assert entry["count"] == 5
+    assert entry["rows"] == 5
+    assert entry["max_ms"] == 100
+    assert entry["p50_ms"] == 3
+    assert entry["phases_avg_ms"]["execute"] == 22
+    assert entry["histogram"]["<=5ms"] == 4
+    assert entry["histogram"]["<=100ms"] == 1
+    assert entry["callers"] == ["Repo.method"]
+    assert entry["errors"] == 0
+    assert stats.snapshot(order_by="errors")[0]["callers"] == ["Repo.other"]
+
+
+def test_slow_query_logs_sql_and_params():
+    stats = QueryStats(slow_query_ms=50)
+    timing = QueryTiming("SELECT * FROM SB1010 WHERE B1_COD = ?", ("ABC",), "Repo.slow")
+    timing.phases["execute"] = 75
+    timing.rows = 3
+
+    with patch.object(query_stats_module, "log_warning") as warning:
+        stats.record(timing)
+
+    message = warning.call_args.args[0]
+    assert "[SLOW_QUERY] Repo.slow" in message
+    assert "WHERE B1_COD = ?" in message
+    assert "('ABC',)" in message
+
+
+def test_repository_calls_are_recorded_with_caller_and_rows():
+    stats = QueryStats(slow_query_ms=10_000)
+    rows = [("P1", "PARAFUSO"), ("P2", "PORCA"), ("P3", "ARRUELA")]
+
+    with patch.object(query_stats_module, "query_stats", stats), \
+            patch.object(base_repository, "get_connection", lambda: FakeConnection(rows)):
+        repo = ProductLookup()
+        assert len(repo.list_products()) == 3
+        assert [r["B1_COD"] for r in repo.iter_products()] == ["P1", "P2", "P3"]
+
+    entries = {tuple(entry["callers"]): entry for entry in stats.snapshot()}
+    assert entries[("ProductLookup.list_products",)]["rows"] == 3
+    assert entries[("ProductLookup.iter_products",)]["rows"] == 3
+    assert set(entries[("ProductLookup.list_products",)]["phases_avg_ms"]) == {"connect", "execute", "fetch", "normalize"}
+
+
+def test_iterator_ignores_time_before_consumption():
+    # O cronômetro nasce em t=0 e o gerador só é consumido em t=10s
+    stats = QueryStats(slow_query_ms=10_000)
+    rows = [("P1", "PARAFUSO")]
+
+    with patch.object(query_stats_module, "query_stats", stats), \
+            patch.object(base_repository, "get_connection", lambda: FakeConnection(rows)), \
+            patch.object(query_stats_module.time, "perf_counter", side_effect=chain([0.0], repeat(10.0))):
+        list(ProductLookup().iter_products())
+
+    assert stats.snapshot()[0]["total_ms"] == 0
@@ -0,0 +1,136 @@
+"""Formatos de resposta — envelope com JSON pronto (raw) e shape=columnar."""
+
+from __future__ import annotations
+
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import patch
+
+import orjson
+import pytest
+
+from app.core.exceptions import BusinessLogicError
+from app.core.responses import raw_success_response, success_response
+from app.repositories import base_repository
+from app.repositories.base_repository import BaseRepository
+from app.repositories.product_repository import ProductRepository
+
+
+class FakeCursor:
+    def __init__(self, description, rows):
+        self.description = description
+        self.rows = rows
+
+    def execute(self, query, params=()):
+        pass
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Devolve um resultset por cursor, na ordem das consultas."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+
+    def cursor(self):
+        description, rows = self.results.pop(0)
+        return FakeCursor([(name,) for name in description], rows)
+
+    def close(self):
+        pass
+
+
+def _database(*results):
+    connection = FakeConnection(*results)
+    return patch.object(base_repository, "get_connection", lambda: connection)
+
+
+# ---------------------------------------------------------------------
+# 🔹 raw_success_response
+# ---------------------------------------------------------------------
+def test_raw_envelope_embeds_bytes_without_reencoding():
+    raw = '[{"code":"PA001","description":"Inspeção visual"}]'.encode("utf-8")
+
+    response = raw_success_response(raw, message="Inspeção de PA001 retornada com sucesso.")
+
+    assert response.status_code == 200
+    assert response.media_type == "application/json"
+    assert raw in response.body  # entra no envelope como veio do SQL Server
+    assert "Inspeção de PA001".encode("utf-8") in response.body  # acentos sem \u escapes
+    assert orjson.loads(response.body) == {
+        "success": True,
+        "message": "Inspeção de PA001 retornada com sucesso.",
+        "data": [{"code": "PA001", "description": "Inspeção visual"}],
+    }
+
+
+def test_raw_envelope_matches_success_response():
+    data = {"code": "PA001", "levels": [1, 2]}
+
+    raw = raw_success_response(orjson.dumps(data), message='com "aspas"')
+    decoded = success_response(data, message='com "aspas"')
+
+    assert orjson.loads(raw.body) == orjson.loads(decoded.body)
+
+
+# ---------------------------------------------------------------------
+# 🔹 shape=columnar
+# ---------------------------------------------------------------------
+ROWS = [
+    ("PA001   ", Decimal("2.50"), datetime(2024, 5, 1)),
+    ("PA002   ", None, None),
+]
+COLUMNS = ("code", "quantity", "date")
+
+
+def test_records_shape_returns_one_dict_per_row():
+    with _database((COLUMNS, ROWS)):
+        result = BaseRepository().execute_shaped("SELECT 1", shape="records")
+
+    assert result == {
+        "data": [
+            {"code": "PA001", "quantity": Decimal("2.50"), "date": datetime(2024, 5, 1)},
+            {"code": "PA002", "quantity": "", "date": ""},
+        ]
+    }
+
+
+def test_columnar_shape_returns_columns_once_and_rows_as_lists():
+    with _database((COLUMNS, ROWS)):
+        result = BaseRepository().execute_shaped("SELECT 1", shape="columnar", key="items")
+
+    assert result == {
+        "shape": "columnar",
+        "columns": ["code", "quantity", "date"],
+        "items": [
+            ["PA001", Decimal("2.50"), datetime(2024, 5, 1)],
+            ["PA002", "", ""],
+        ],
+    }
+
+
+def test_unknown_shape_is_rejected():
+    with pytest.raises(BusinessLogicError, match="columnar"):
+        BaseRepository().execute_shaped("SELECT 1", shape="matrix")
+
+
+def test_columnar_listing_keeps_pagination_envelope():
+    with _database((("total",), [(2,)]), (COLUMNS, ROWS)):
+        result = ProductRepository().list_customers("PA001", page=1, page_size=1, shape="columnar")
+
+    assert result["total"] == 2
+    assert result["total_pages"] == 2
+    assert result["shape"] == "columnar"
+    assert result["columns"] == ["code", "quantity", "date"]
+    assert result["data"][0] == ["PA001", Decimal("2.50"), datetime(2024, 5, 1)]
+
+    body = orjson.loads(success_response(result).body)
+    assert body["data"]["data"][0] == ["PA001", 2.5, "2024-05-01T00:00:00"]
@@ -0,0 +1,131 @@
+"""Exportação tabular — CSV (cabeçalho/BOM), Parquet vazio e resposta HTTP."""
+
+from __future__ import annotations
+
+import io
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.repositories import base_repository
+from app.repositories.base_repository import BaseRepository
+from app.utils.tabular_export import csv_chunks, parquet_file, tabular_response
+
+DESCRIPTION = (
+    ("B2_COD", str, None, 15, 15, 0, False),
+    ("B2_QATU", Decimal, None, 14, 14, 2, True),
+    ("B2_DINVENT", datetime, None, 23, 23, 3, True),
+)
+
+
+class FakeCursor:
+    description = DESCRIPTION
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, query, params=()):
+        pass
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return FakeCursor(list(self.rows))
+
+    def close(self):
+        pass
+
+
+def _batches(rows, batch_size=2):
+    with patch.object(base_repository, "get_connection", lambda: FakeConnection(rows)):
+        yield from BaseRepository().iter_batches("SELECT * FROM SB2010", batch_size=batch_size)
+
+
+def test_csv_writes_bom_and_header_once_and_strips_char_padding():
+    rows = [
+        ("PA001          ", Decimal("10.50"), None),
+        ("PA002          ", Decimal("0.00"), None),
+        ("MP001          ", Decimal("3.25"), None),
+    ]
+
+    chunks = list(csv_chunks(_batches(rows)))
+
+    assert len(chunks) == 2  # um bloco de bytes por bloco de linhas
+    text = b"".join(chunks).decode("utf-8")
+    assert text.startswith("\ufeffB2_COD;B2_QATU;B2_DINVENT\r\n")
+    assert text.count("\ufeff") == 1
+    assert text.count("B2_COD") == 1
+    assert text.splitlines()[1:] == ["PA001;10.50;", "PA002;0.00;", "MP001;3.25;"]
+
+
+def test_csv_of_empty_result_still_has_header():
+    text = b"".join(csv_chunks(_batches([]))).decode("utf-8")
+    assert text == "\ufeffB2_COD;B2_QATU;B2_DINVENT\r\n"
+
+
+def test_parquet_of_empty_result_keeps_typed_schema():
+    pq = pytest.importorskip("pyarrow.parquet")
+    pa = pytest.importorskip("pyarrow")
+
+    table = pq.read_table(parquet_file(_batches([])))
+
+    assert table.num_rows == 0
+    assert table.schema.names == ["B2_COD", "B2_QATU", "B2_DINVENT"]
+    assert table.schema.field("B2_COD").type == pa.string()
+    assert table.schema.field("B2_QATU").type == pa.decimal128(14, 2)
+    assert table.schema.field("B2_DINVENT").type == pa.timestamp("ms")
+
+
+def test_parquet_writes_every_batch():
+    pq = pytest.importorskip("pyarrow.parquet")
+    rows = [("PA001   ", Decimal("1.00"), datetime(2024, 1, 2)), ("PA002   ", Decimal("2.00"), None)] * 3
+
+    table = pq.read_table(parquet_file(_batches(rows)))
+
+    assert table.num_rows == 6
+    assert table.column("B2_COD").to_pylist()[:2] == ["PA001", "PA002"]
+    assert table.column("B2_DINVENT").to_pylist()[1] is None
+
+
+def _client(rows, fmt):
+    app = FastAPI()
+
+    @app.get("/export")
+    def export():
+        return tabular_response(_batches(rows), fmt, "estoque_PA001")
+
+    return TestClient(app)
+
+
+def test_tabular_response_streams_csv_download():
+    response = _client([("PA001   ", Decimal("1.00"), None)], "CSV").get("/export")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "text/csv; charset=utf-8"
+    assert response.headers["content-disposition"] == 'attachment; filename="estoque_PA001.csv"'
+    assert response.content.decode("utf-8") == "\ufeffB2_COD;B2_QATU;B2_DINVENT\r\nPA001;1.00;\r\n"
+
+
+def test_tabular_response_parquet_download():
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    response = _client([], "parquet").get("/export")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.parquet"
+    assert response.headers["content-disposition"] == 'attachment; filename="estoque_PA001.parquet"'
+    assert pq.read_table(io.BytesIO(response.content)).schema.names == ["B2_COD", "B2_QATU", "B2_DINVENT"]